@@ -0,0 +1,225 @@
+"""
+API Request Tracing
+Per-request phase timings (routing, cache lookup, KPI load, compute,
+serialization), CloudWatch Embedded Metric Format (EMF) log lines and
+in-process latency histograms served on /metrics
+"""
+
+import bisect
+import json
+import os
+import time
+
+PHASES = ['routing', 'cache_lookup', 'kpi_load', 'compute', 'serialize']
+EMF_NAMESPACE = os.getenv('API_METRICS_NAMESPACE', 'UrbanMobilityAPI')
+
+# EMF lines go to stdout, which Lambda ships to CloudWatch Logs; off by default
+# outside Lambda so local tests and benchmarks stay readable
+EMF_ENABLED = os.getenv('API_EMF_LOGS', '1' if os.getenv('AWS_LAMBDA_FUNCTION_NAME') else '0') == '1'
+
+# Log-spaced bucket upper bounds: 10 µs to ~40 s, sqrt(2) apart (≤ 41% relative error)
+BUCKET_BOUNDS_MS = [0.01 * 2 ** (i / 2) for i in range(45)]
+
+
+class RequestTrace:
+    """
+    Phase timings for one request; spans of the same phase accumulate
+    """
+
+    def __init__(self, route, request_id=None):
+        self.route = route
+        self.request_id = request_id
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.total_ms = None
+
+    def span(self, phase):
+        return _Span(self, phase)
+
+    def add(self, phase, ms):
+        self.phases[phase] = self.phases.get(phase, 0.0) + ms
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.start) * 1000
+        return self.total_ms
+
+    def server_timing(self):
+        """Server-Timing header value (visible in browser devtools)"""
+        parts = [f"{phase};dur={self.phases[phase]:.3f}" for phase in PHASES if phase in self.phases]
+        parts.append(f"total;dur={self.total_ms:.3f}")
+        return ", ".join(parts)
+
+
+class _Span:
+    __slots__ = ('trace', 'phase', 'start')
+
+    def __init__(self, trace, phase):
+        self.trace = trace
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.phase, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class _NoTrace:
+    """Stand-in when handlers run outside lambda_handler (direct calls, benchmarks)"""
+
+    def span(self, phase):
+        return _NULL_SPAN
+
+    def add(self, phase, ms):
+        pass
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+_NO_TRACE = _NoTrace()
+
+# One request at a time per container (like the module-level API instance)
+_current = None
+
+
+def start_trace(route, request_id=None):
+    global _current
+    _current = RequestTrace(route, request_id)
+    return _current
+
+
+def current_trace():
+    """Active request trace, or a no-op trace outside a request"""
+    return _current or _NO_TRACE
+
+
+def end_trace():
+    global _current
+    trace, _current = _current, None
+    return trace
+
+
+# ============================================================================
+# HISTOGRAMS
+# ============================================================================
+
+class LatencyHistogram:
+    """
+    Fixed log-bucket histogram; O(1) memory per route/phase, mergeable and
+    cheap enough to update on every request
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.sum += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the pct-th observation (capped at max)"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(self.count * pct / 100)))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(BUCKET_BOUNDS_MS[i] if i < len(BUCKET_BOUNDS_MS) else self.max, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': round(self.sum / self.count, 4) if self.count else 0.0,
+            'p50': round(self.percentile(50), 4),
+            'p90': round(self.percentile(90), 4),
+            'p99': round(self.percentile(99), 4),
+            'max': round(self.max, 4),
+        }
+
+
+class MetricsRegistry:
+    """
+    Per-route latency histograms (total and per phase), status and cache
+    outcome counts for the life of the container
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.routes = {}
+
+    def observe(self, trace, status_code, cache=None):
+        route = self.routes.get(trace.route)
+        if route is None:
+            route = self.routes[trace.route] = {'latency': {'total': LatencyHistogram()},
+                                                'status': {}, 'cache': {}}
+        route['latency']['total'].observe(trace.total_ms)
+        for phase, ms in trace.phases.items():
+            histogram = route['latency'].get(phase)
+            if histogram is None:
+                histogram = route['latency'][phase] = LatencyHistogram()
+            histogram.observe(ms)
+        route['status'][str(status_code)] = route['status'].get(str(status_code), 0) + 1
+        if cache:
+            route['cache'][cache] = route['cache'].get(cache, 0) + 1
+
+    def snapshot(self):
+        """JSON-ready view for the /metrics route"""
+        return {
+            'uptime_s': round(time.time() - self.started, 1),
+            'requests': sum(r['latency']['total'].count for r in self.routes.values()),
+            'routes': {
+                name: {
+                    'status': route['status'],
+                    'cache': route['cache'],
+                    'latency_ms': {phase: route['latency'][phase].summary()
+                                   for phase in ['total'] + PHASES if phase in route['latency']},
+                }
+                for name, route in sorted(self.routes.items())
+            },
+        }
+
+
+# ============================================================================
+# EMBEDDED METRIC FORMAT
+# ============================================================================
+
+def emf_record(trace, status_code, cache=None, namespace=EMF_NAMESPACE):
+    """
+    CloudWatch EMF log object: CloudWatch extracts Latency and the phase
+    timings as metrics by Route; RequestId, StatusCode and Cache stay searchable
+    """
+    metrics = [{'Name': 'Latency', 'Unit': 'Milliseconds'}]
+    record = {'Route': trace.route, 'Latency': round(trace.total_ms, 3),
+              'StatusCode': status_code, 'Cache': cache, 'RequestId': trace.request_id}
+    for phase in PHASES:
+        if phase in trace.phases:
+            name = ''.join(part.capitalize() for part in phase.split('_')) + 'Latency'
+            metrics.append({'Name': name, 'Unit': 'Milliseconds'})
+            record[name] = round(trace.phases[phase], 3)
+    record['_aws'] = {
+        'Timestamp': int(time.time() * 1000),
+        'CloudWatchMetrics': [{'Namespace': namespace, 'Dimensions': [['Route']], 'Metrics': metrics}],
+    }
+    return record
+
+
+def emit_emf(trace, status_code, cache=None):
+    if EMF_ENABLED:
+        print(json.dumps(emf_record(trace, status_code, cache), separators=(',', ':')))
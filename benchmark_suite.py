@@ -0,0 +1,416 @@
+"""
+End-to-End Pipeline Benchmark Suite
+Runs every pipeline stage at several data sizes on synthetic trips and records
+wall time, peak RSS, rows per second and output sizes, with regression checks
+against a saved baseline
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_BASELINE = "benchmarks/baseline.json"
+
+# Allowed growth over the baseline before a stage counts as regressed
+DEFAULT_MAX_SLOWDOWN = 0.25
+DEFAULT_MAX_RSS_GROWTH = 0.25
+# Stages faster than this are dominated by noise and never flagged for time
+NOISE_FLOOR_SECONDS = 0.2
+
+API_ROUTES = ['/monthly-revenue', '/peak-hours', '/top-zones', '/health']
+API_REQUESTS_PER_ROUTE = 250
+
+
+# ============================================================================
+# STAGES
+# Each stage runs in a fresh process, returns (units processed, output paths)
+# ============================================================================
+
+def stage_clean(ctx):
+    """Step 1: load, clean, feature-engineer and export"""
+    from step1_data_cleaning import MobilityDataAnalyzer
+
+    analyzer = MobilityDataAnalyzer()
+    analyzer.load_data(ctx['raw_csv'])
+    analyzer.clean_data()
+    analyzer.feature_engineering()
+    analyzer.export_clean_data(ctx['clean_csv'])
+    return len(analyzer.raw_data), [ctx['clean_csv']]
+
+
+def stage_kpis(ctx):
+    """Step 2: core KPI computation on the cleaned trips"""
+    import pandas as pd
+    from step2_kpi_analysis import KPIAnalyzer
+
+    df = pd.read_csv(ctx['clean_csv'], parse_dates=['tpep_pickup_datetime', 'tpep_dropoff_datetime'])
+    KPIAnalyzer(df).compute_all_kpis()
+    return len(df), []
+
+
+def stage_charts(ctx):
+    """Step 2: chart rendering"""
+    import pandas as pd
+    from step2_kpi_analysis import KPIAnalyzer
+
+    df = pd.read_csv(ctx['clean_csv'])
+    KPIAnalyzer(df).generate_all_visualizations()
+    charts = ['monthly_revenue_trends.png', 'hourly_demand_heatmap.png', 'tip_distribution_analysis.png']
+    return len(df), charts
+
+
+def stage_sql(ctx):
+    """Step 3: SQLite load plus the ten analytical queries"""
+    from step3_sql_analytics import SQLAnalyticsEngine
+
+    engine = SQLAnalyticsEngine('taxi_analytics.db')
+    engine.connect()
+    engine.load_data_to_sql(ctx['clean_csv'])
+    rows = engine.cursor.execute("SELECT COUNT(*) FROM taxi_trips").fetchone()[0]
+    engine.run_all_analytics()
+    engine.close()
+    return rows, ['taxi_analytics.db']
+
+
+def stage_spark(ctx):
+    """Step 4: PySpark load, clean/transform and KPI Parquet outputs"""
+    from step4_pyspark_etl import PySparkETLPipeline
+
+    etl = PySparkETLPipeline(app_name="BenchmarkETL", input_path=ctx['raw_csv'])
+    try:
+        trips = etl.clean_and_transform(etl.load_data(ctx['raw_csv']))
+        etl.compute_kpis(trips)
+    finally:
+        etl.stop()
+    # The generator writes exactly ctx['rows'] raw trips; recounting the CSV here
+    # would add a full extra scan to the timed region
+    return ctx['rows'], ['output']
+
+
+def stage_genai_context(ctx):
+    """Step 5: KPI context preparation for the assistant"""
+    from step5_genai_assistant import GenAIMobilityInsights
+
+    assistant = GenAIMobilityInsights(api_key=None, use_langchain=False)
+    # Measure the projected read and aggregation, not the snapshot cache
+    assistant.load_kpi_context(ctx['clean_csv'], use_snapshot=False)
+    assistant.format_kpi_context()
+    return assistant.kpi_data['total_trips'], []
+
+
+def stage_api(ctx):
+    """Step 6: local Lambda handler throughput (units are requests)"""
+    from kpi_bundle import BUNDLE_DIR, build_payloads, write_kpi_bundle
+
+    # Serve a local bundle; without one the handler falls through to S3 and every KPI route fails
+    bundle_dir = os.path.join(ctx['work_dir'], BUNDLE_DIR)
+    write_kpi_bundle(build_payloads(
+        monthly_revenue={m: 1_000_000.0 + 25_000.0 * m for m in range(1, 13)},
+        hourly_trips={h: 5_000 + 400 * h for h in range(24)},
+        zone_trips={f"Zone {i}": 10_000 - 100 * i for i in range(40)},
+    ), bundle_dir=bundle_dir, source="benchmark")
+    os.environ['KPI_SOURCE'] = 'local'
+    os.environ['KPI_DATA_DIR'] = bundle_dir  # read at import time
+    from step6_serverless_api import lambda_handler
+
+    requests = 0
+    for _ in range(API_REQUESTS_PER_ROUTE):
+        for route in API_ROUTES:
+            response = lambda_handler({'httpMethod': 'GET', 'path': route, 'queryStringParameters': {}}, {})
+            assert response['statusCode'] == 200, f"{route} returned {response['statusCode']}"
+            requests += 1
+    return requests, []
+
+
+# name -> (function, needs cleaned CSV, scales with input rows)
+STAGES = {
+    'clean': (stage_clean, False, True),
+    'kpis': (stage_kpis, True, True),
+    'charts': (stage_charts, True, True),
+    'sql': (stage_sql, True, True),
+    'spark': (stage_spark, False, True),
+    'genai_context': (stage_genai_context, True, True),
+    'api': (stage_api, False, False),
+}
+
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+def _peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _path_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def _run_stage_in_child(stage_name, ctx, queue, verbose):
+    """Child process body: run one stage in the work dir and report its metrics"""
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    os.environ.pop('OPENAI_API_KEY', None)
+    os.chdir(ctx['work_dir'])
+
+    result = {'stage': stage_name, 'rows': ctx['rows']}
+    try:
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+            func = STAGES[stage_name][0]
+            start = time.perf_counter()
+            units, outputs = func(ctx)
+            elapsed = time.perf_counter() - start
+
+        result.update({
+            'status': 'ok',
+            'wall_seconds': round(elapsed, 4),
+            'units': int(units),
+            'units_per_second': round(units / elapsed, 1) if elapsed > 0 else None,
+            'peak_rss_bytes': _peak_rss_bytes(),
+            'output_bytes': sum(_path_size(p) for p in outputs if os.path.exists(p)),
+        })
+    except ImportError as e:
+        result.update({'status': 'skipped', 'reason': f"missing dependency: {e.name or e}"})
+    except Exception as e:
+        result.update({'status': 'failed', 'reason': f"{type(e).__name__}: {e}"})
+    queue.put(result)
+
+
+def run_stage(stage_name, ctx, verbose=False, timeout=3600):
+    """Run a stage in a fresh interpreter so peak RSS belongs to that stage alone"""
+    mp = multiprocessing.get_context('spawn')
+    queue = mp.Queue()
+    process = mp.Process(target=_run_stage_in_child, args=(stage_name, ctx, queue, verbose))
+    process.start()
+    try:
+        result = queue.get(timeout=timeout)
+    except Exception:
+        result = {'stage': stage_name, 'rows': ctx['rows'], 'status': 'failed',
+                  'reason': f"no result (exit code {process.exitcode})"}
+    process.join()
+    return result
+
+
+# ============================================================================
+# SUITE
+# ============================================================================
+
+class PipelineBenchmarkSuite:
+    """
+    Benchmarks each pipeline stage across input sizes and compares the
+    results with a stored baseline
+    """
+
+    def __init__(self, sizes=None, stages=None, work_dir="benchmarks/work", repeat=1,
+                 sample_csv='cleaned_taxi_data_10k.csv', seed=42, verbose=False):
+        self.sizes = sorted(sizes or DEFAULT_SIZES)
+        self.stages = stages or list(STAGES)
+        unknown = set(self.stages) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Unknown stages: {sorted(unknown)} (available: {list(STAGES)})")
+
+        self.work_dir = os.path.abspath(work_dir)
+        self.repeat = max(repeat, 1)
+        self.sample_csv = os.path.abspath(sample_csv)
+        self.seed = seed
+        self.verbose = verbose
+        self.results = []
+
+    def prepare_inputs(self, rows):
+        """Synthetic raw CSV for one size (generated once and reused)"""
+        from synthetic_data_generator import SyntheticTripGenerator
+
+        size_dir = os.path.join(self.work_dir, f"rows_{rows}")
+        os.makedirs(size_dir, exist_ok=True)
+        raw_csv = os.path.join(size_dir, 'yellow_tripdata.csv')
+
+        if not os.path.exists(raw_csv):
+            generator = SyntheticTripGenerator()
+            with open(os.devnull, 'w') as devnull, \
+                    contextlib.redirect_stdout(sys.stdout if self.verbose else devnull):
+                generator.fit(self.sample_csv)
+                generator.write(rows, raw_csv, seed=self.seed)
+
+        return {
+            'rows': rows,
+            'work_dir': size_dir,
+            'raw_csv': raw_csv,
+            'clean_csv': os.path.join(size_dir, 'cleaned_taxi_data.csv'),
+        }
+
+    def run(self):
+        """Run every selected stage at every size"""
+        print("="*70)
+        print("PIPELINE BENCHMARK SUITE")
+        print("="*70)
+        print(f"Sizes:  {', '.join(f'{s:,}' for s in self.sizes)} rows")
+        print(f"Stages: {', '.join(self.stages)}")
+
+        for rows in self.sizes:
+            print(f"\n--- {rows:,} rows ---")
+            ctx = self.prepare_inputs(rows)
+
+            needs_clean = any(STAGES[s][1] for s in self.stages)
+            if needs_clean and 'clean' not in self.stages and not os.path.exists(ctx['clean_csv']):
+                run_stage('clean', ctx, self.verbose)
+
+            for stage_name in self.stages:
+                if not STAGES[stage_name][2] and rows != self.sizes[0]:
+                    continue  # size-independent stage: measured once
+                attempts = [run_stage(stage_name, ctx, self.verbose) for _ in range(self.repeat)]
+                ok = [a for a in attempts if a['status'] == 'ok']
+                result = min(ok, key=lambda a: a['wall_seconds']) if ok else attempts[-1]
+                self.results.append(result)
+                self._print_progress(result)
+
+        return self.results
+
+    @staticmethod
+    def _print_progress(result):
+        if result['status'] == 'ok':
+            print(f"  ✓ {result['stage']:<15}{result['wall_seconds']:>9.2f}s"
+                  f"{result['units_per_second']:>14,.0f}/s")
+        elif result['status'] == 'skipped':
+            print(f"  ⚠ {result['stage']:<15}skipped ({result['reason']})")
+        else:
+            print(f"  ✗ {result['stage']:<15}failed ({result['reason']})")
+
+    def report(self):
+        """Result document with environment metadata"""
+        return {
+            'generated_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'sizes': self.sizes,
+            'results': self.results,
+        }
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        print(f"\n✓ Results saved to: {path}")
+
+    def cleanup(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def compare_with_baseline(results, baseline, max_slowdown=DEFAULT_MAX_SLOWDOWN,
+                          max_rss_growth=DEFAULT_MAX_RSS_GROWTH):
+    """Annotate results with baseline deltas; return the list of regressions"""
+    previous = {(r['stage'], r['rows']): r for r in baseline.get('results', []) if r['status'] == 'ok'}
+    regressions = []
+
+    for result in results:
+        base = previous.get((result['stage'], result['rows']))
+        if result['status'] != 'ok' or base is None:
+            continue
+
+        result['time_delta'] = result['wall_seconds'] / base['wall_seconds'] - 1
+        if result['peak_rss_bytes'] and base.get('peak_rss_bytes'):
+            result['rss_delta'] = result['peak_rss_bytes'] / base['peak_rss_bytes'] - 1
+
+        if result['time_delta'] > max_slowdown and result['wall_seconds'] >= NOISE_FLOOR_SECONDS:
+            regressions.append(f"{result['stage']} @ {result['rows']:,} rows: wall time "
+                               f"{base['wall_seconds']:.2f}s → {result['wall_seconds']:.2f}s "
+                               f"(+{result['time_delta']:.0%}, limit +{max_slowdown:.0%})")
+        if result.get('rss_delta', 0) > max_rss_growth:
+            regressions.append(f"{result['stage']} @ {result['rows']:,} rows: peak RSS "
+                               f"{base['peak_rss_bytes'] / 1e6:.0f} MB → {result['peak_rss_bytes'] / 1e6:.0f} MB "
+                               f"(+{result['rss_delta']:.0%}, limit +{max_rss_growth:.0%})")
+
+    return regressions
+
+
+def print_comparison_table(results):
+    """Stage x size table, with baseline deltas when available"""
+    print("\n" + "="*70)
+    print("BENCHMARK RESULTS")
+    print("="*70)
+    print(f"\n{'Stage':<15}{'Rows':>11}{'Wall s':>9}{'Rows/s':>12}{'Peak RSS MB':>13}"
+          f"{'Output MB':>11}{'Δ time':>9}{'Δ RSS':>8}")
+    print("-" * 88)
+
+    for r in results:
+        if r['status'] != 'ok':
+            print(f"{r['stage']:<15}{r['rows']:>11,}  {r['status']}: {r['reason']}")
+            continue
+        rss = f"{r['peak_rss_bytes'] / 1e6:.0f}" if r['peak_rss_bytes'] else "n/a"
+        time_delta = f"{r['time_delta']:+.0%}" if 'time_delta' in r else "-"
+        rss_delta = f"{r['rss_delta']:+.0%}" if 'rss_delta' in r else "-"
+        print(f"{r['stage']:<15}{r['rows']:>11,}{r['wall_seconds']:>9.2f}{r['units_per_second']:>12,.0f}"
+              f"{rss:>13}{r['output_bytes'] / 1e6:>11.1f}{time_delta:>9}{rss_delta:>8}")
+
+    print("\nPeak RSS is the Python process only (the Spark JVM is not included).")
+    print("The api stage reports requests/s and runs once, independent of input size.")
+
+
+# USAGE EXAMPLE
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage across data sizes")
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated row counts")
+    parser.add_argument('--stages', default=','.join(STAGES), help="Comma-separated stage names")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per stage; the fastest is kept")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Store these results as the new baseline instead of comparing")
+    parser.add_argument('--max-slowdown', type=float, default=DEFAULT_MAX_SLOWDOWN)
+    parser.add_argument('--max-rss-growth', type=float, default=DEFAULT_MAX_RSS_GROWTH)
+    parser.add_argument('--output', default=None, help="Results JSON path")
+    parser.add_argument('--keep-work-dir', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help="Show each stage's own output")
+    args = parser.parse_args()
+
+    suite = PipelineBenchmarkSuite(
+        sizes=[int(s) for s in args.sizes.split(',')],
+        stages=[s.strip() for s in args.stages.split(',')],
+        repeat=args.repeat,
+        verbose=args.verbose
+    )
+    try:
+        results = suite.run()
+    finally:
+        if not args.keep_work_dir:
+            suite.cleanup()
+
+    regressions = []
+    if args.save_baseline:
+        suite.save(args.baseline)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            regressions = compare_with_baseline(results, json.load(f),
+                                                args.max_slowdown, args.max_rss_growth)
+
+    print_comparison_table(results)
+    suite.save(args.output or f"benchmarks/results_{datetime.now():%Y%m%d_%H%M%S}.json")
+
+    if regressions:
+        print(f"\n✗ {len(regressions)} regression(s) against {args.baseline}:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("\n✓ No regressions" + ("" if os.path.exists(args.baseline) else " (no baseline to compare)"))
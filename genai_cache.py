@@ -0,0 +1,250 @@
+"""
+GenAI Response Cache
+Answers to assistant questions, keyed by a normalized question plus a hash of
+the KPI context they were generated from; paraphrased questions ("busiest
+hour?" / "what hour is busiest") are matched through a TF-IDF similarity
+index, so repeated questions skip the LLM call entirely
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import time
+
+DEFAULT_TTL_SECONDS = int(os.getenv('GENAI_CACHE_TTL', '3600'))
+DEFAULT_MAX_ENTRIES = int(os.getenv('GENAI_CACHE_SIZE', '256'))
+DEFAULT_SIMILARITY = float(os.getenv('GENAI_CACHE_SIMILARITY', '0.8'))
+
+STOPWORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'been', 'do', 'does', 'did', 'has', 'have',
+    'had', 'what', 'which', 'when', 'where', 'who', 'how', 'whats', 'of', 'in', 'on', 'at', 'for',
+    'to', 'by', 'with', 'our', 'we', 'i', 'me', 'my', 'you', 'your', 'it', 'its', 'there', 'this',
+    'that', 'these', 'those', 'can', 'could', 'would', 'should', 'please', 'tell', 'show', 'give',
+    'about', 'and', 'or',
+}
+
+# Superlatives flip or change an answer, so questions only match when they use the same ones
+SUPERLATIVES = {
+    'most', 'least', 'highest', 'lowest', 'top', 'bottom', 'best', 'worst', 'busiest', 'quietest',
+    'max', 'maximum', 'min', 'minimum', 'largest', 'smallest', 'biggest', 'fewest', 'peak',
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _stem(word):
+    """Light plural folding so 'hours' and 'hour' share a term"""
+    if len(word) > 3 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def question_terms(question):
+    """Content words of a question: lower-cased, stopwords dropped, plurals folded"""
+    words = _TOKEN.findall(question.lower().replace("'", ""))
+    return [_stem(w) for w in words if w not in STOPWORDS]
+
+
+def normalize_question(question):
+    """Exact-match cache key; word order is kept, punctuation and filler are not"""
+    return " ".join(question_terms(question))
+
+
+def kpi_context_hash(kpi_data):
+    """Stable digest of the KPI context; any change to kpi_data changes it"""
+    blob = json.dumps(kpi_data, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()[:16]
+
+
+def _features(terms):
+    """Word terms plus character trigrams, so 'busy' and 'busiest' overlap"""
+    features = {}
+    for term in terms:
+        features['w:' + term] = features.get('w:' + term, 0) + 1
+        padded = f"<{term}>"
+        for i in range(len(padded) - 2):
+            gram = 'c:' + padded[i:i + 3]
+            features[gram] = features.get(gram, 0) + 1
+    return features
+
+
+class SemanticResponseCache:
+    """
+    TTL + LRU bounded answer cache with a near-duplicate question index
+    Entries are scoped to one KPI context hash; a new context never sees old answers
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 similarity_threshold=DEFAULT_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.entries = {}            # (context_hash, normalized) -> entry; insertion order = LRU order
+        self.document_frequency = {}  # feature -> number of cached questions containing it
+        self.stats = {'hits': 0, 'similar_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0,
+                      'invalidated': 0}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, question, context_hash):
+        """
+        Cached entry for the question (exact or near-duplicate) or None;
+        the entry dict carries 'answer', 'question' and 'similarity'
+        """
+        now = time.monotonic()
+        self._expire(now)
+        key = (context_hash, normalize_question(question))
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.stats['hits'] += 1
+            return self._touch(key, entry, 1.0)
+
+        features = _features(question_terms(question))
+        best_key, best_score = None, 0.0
+        for candidate_key, candidate in self.entries.items():
+            if candidate_key[0] != context_hash or candidate['numbers'] != _numbers(question) \
+                    or candidate['superlatives'] != _superlatives(question):
+                continue  # "top 3 zones" must never answer "top 5", nor "most common" "least common"
+            score = self._cosine(features, candidate['features'])
+            if score > best_score:
+                best_key, best_score = candidate_key, score
+
+        if best_key is not None and best_score >= self.similarity_threshold:
+            self.stats['similar_hits'] += 1
+            return self._touch(best_key, self.entries[best_key], best_score)
+
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, question, context_hash, answer):
+        key = (context_hash, normalize_question(question))
+        if key in self.entries:
+            self._remove(key)
+        while len(self.entries) >= self.max_entries:
+            self._remove(next(iter(self.entries)))
+            self.stats['evictions'] += 1
+
+        features = _features(question_terms(question))
+        for feature in features:
+            self.document_frequency[feature] = self.document_frequency.get(feature, 0) + 1
+        self.entries[key] = {'question': question, 'answer': answer, 'features': features,
+                             'numbers': _numbers(question), 'superlatives': _superlatives(question),
+                             'created': time.monotonic()}
+
+    def invalidate(self, keep_context_hash=None):
+        """Drop every entry not generated from keep_context_hash (all entries when None)"""
+        stale = [k for k in self.entries if k[0] != keep_context_hash]
+        for key in stale:
+            self._remove(key)
+        self.stats['invalidated'] += len(stale)
+        return len(stale)
+
+    def _touch(self, key, entry, similarity):
+        # Re-insert to mark as most recently used
+        self.entries[key] = self.entries.pop(key)
+        return dict(entry, similarity=similarity)
+
+    def _expire(self, now):
+        # Entries are in LRU order, not creation order, so scan them all (bounded by max_entries)
+        expired = [k for k, e in self.entries.items() if now - e['created'] >= self.ttl_seconds]
+        for key in expired:
+            self._remove(key)
+        self.stats['expired'] += len(expired)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        for feature in entry['features']:
+            count = self.document_frequency[feature] - 1
+            if count:
+                self.document_frequency[feature] = count
+            else:
+                del self.document_frequency[feature]
+
+    def _cosine(self, a, b):
+        """TF-IDF cosine; IDF is smoothed over the cached questions"""
+        n = len(self.entries) + 1
+        df = self.document_frequency
+
+        def weights(features):
+            return {f: (1 + math.log(tf)) * (math.log((1 + n) / (1 + df.get(f, 0))) + 1)
+                    for f, tf in features.items()}
+
+        wa, wb = weights(a), weights(b)
+        dot = sum(w * wb[f] for f, w in wa.items() if f in wb)
+        if not dot:
+            return 0.0
+        norm = math.sqrt(sum(w * w for w in wa.values())) * math.sqrt(sum(w * w for w in wb.values()))
+        return dot / norm
+
+
+def _numbers(question):
+    return tuple(sorted(re.findall(r"\d+", question)))
+
+
+def _superlatives(question):
+    return frozenset(term for term in question_terms(question) if term in SUPERLATIVES)
+
+
+def verify_semantic_cache():
+    """Paraphrases hit, different questions miss, context changes and TTL invalidate"""
+    print("="*70)
+    print("VERIFYING SEMANTIC RESPONSE CACHE")
+    print("="*70)
+
+    cache = SemanticResponseCache(max_entries=8, ttl_seconds=3600)
+    context = kpi_context_hash({'total_trips': 1000})
+    for question in ["What is the busiest hour?", "Which zones have the most pickups?",
+                     "When is surge demand highest?", "Top 3 zones by revenue",
+                     "Which payment type is most common?"]:
+        cache.put(question, context, f"answer to: {question}")
+
+    checks = []
+    for question, expected in [
+        ("what hour is busiest", "What is the busiest hour?"),
+        ("Busiest hours?", "What is the busiest hour?"),
+        ("when is the surge demand highest", "When is surge demand highest?"),
+        ("Which zone has the most pickups", "Which zones have the most pickups?"),
+        ("What is the busiest zone?", None),
+        ("Top 5 zones by revenue", None),
+        ("Which payment type is least common?", None),
+        ("Which zones have pickups?", None),
+        ("Why did revenue drop in February?", None),
+    ]:
+        entry = cache.get(question, context)
+        got = entry['question'] if entry else None
+        ok = got == expected
+        checks.append(ok)
+        similarity = f"{entry['similarity']:.2f}" if entry else "-"
+        print(f"  {'✓' if ok else '✗'} {question!r:<40} → {got!r} (similarity {similarity})")
+
+    new_context = kpi_context_hash({'total_trips': 1001})
+    ok = cache.get("What is the busiest hour?", new_context) is None
+    checks.append(ok)
+    print(f"  {'✓' if ok else '✗'} changed KPI context misses; {cache.invalidate(new_context)} stale entries dropped")
+
+    cache.put("q1", new_context, "a1")
+    cache.ttl_seconds = 0
+    ok = cache.get("q1", new_context) is None and len(cache) == 0
+    checks.append(ok)
+    print(f"  {'✓' if ok else '✗'} expired entries are dropped")
+
+    cache = SemanticResponseCache(max_entries=2)
+    for i, question in enumerate(["busiest hour", "busiest zone", "average tip"]):
+        cache.put(question, context, i)
+    ok = len(cache) == 2 and cache.get("busiest hour", context) is None
+    checks.append(ok)
+    print(f"  {'✓' if ok else '✗'} size bound evicts the least recently used entry")
+
+    print(f"\n{'✓' if all(checks) else '✗'} {sum(checks)}/{len(checks)} checks passed")
+    return all(checks)
+
+
+# USAGE EXAMPLE
+if __name__ == "__main__":
+    verify_semantic_cache()
@@ -0,0 +1,157 @@
+"""
+Token-Budgeted KPI Context
+Builds the assistant's prompt context from only the KPI sections a question
+needs, in compact one-line tables, and degrades or drops the least relevant
+sections until the context fits a token budget
+"""
+
+import os
+
+from genai_cache import question_terms
+from llm_client import estimate_tokens
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv('GENAI_CONTEXT_TOKENS', '300'))
+
+# Question terms (after genai_cache normalization: lower-case, plurals folded)
+# that make a section relevant; the overview is always included
+SECTION_KEYWORDS = {
+    'zones': {'zone', 'pickup', 'dropoff', 'location', 'area', 'neighborhood', 'borough', 'airport',
+              'midtown', 'manhattan', 'brooklyn', 'queen', 'harlem', 'jfk', 'laguardia', 'busiest',
+              'busy', 'driver', 'deploy', 'deployment'},
+    'hourly': {'hour', 'hourly', 'time', 'rush', 'morning', 'afternoon', 'evening', 'night', 'surge',
+               'demand', 'busiest', 'busy', 'peak', 'schedule', 'shift'},
+    'monthly': {'month', 'monthly', 'january', 'february', 'march', 'april', 'may', 'june', 'july',
+                'august', 'september', 'october', 'november', 'december', 'season', 'seasonal',
+                'trend', 'growth', 'drop', 'decline', 'year', 'winter', 'summer'},
+    'peak': {'peak', 'surge', 'rush', 'off', 'pricing', 'price', 'dynamic', 'premium'},
+    'weekday': {'day', 'daily', 'week', 'weekday', 'weekend', 'monday', 'tuesday', 'wednesday',
+                'thursday', 'friday', 'saturday', 'sunday'},
+}
+SECTION_ORDER = ['overview', 'zones', 'hourly', 'monthly', 'peak', 'weekday']
+DAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MONTH_ORDER = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August',
+               'September', 'October', 'November', 'December']
+
+
+def _count(n):
+    """65700 -> '65.7K'"""
+    n = float(n)
+    for limit, suffix in ((1e9, 'B'), (1e6, 'M'), (1e3, 'K')):
+        if abs(n) >= limit:
+            return f"{n / limit:.3g}{suffix}"
+    return f"{n:.0f}"
+
+
+def _money(v):
+    return "$" + (_count(v) if abs(float(v)) >= 1000 else f"{float(v):.2f}")
+
+
+def _ordered(mapping, order):
+    rank = {k: i for i, k in enumerate(order)}
+    return sorted(mapping.items(), key=lambda kv: rank.get(kv[0], len(order)))
+
+
+# ============================================================================
+# SECTIONS: each renders 'full' or 'summary' detail, or None if there is no data
+# ============================================================================
+
+def _overview(kpi, detail):
+    return (f"Overview: {_count(kpi.get('total_trips', 0))} trips, {_money(kpi.get('total_revenue', 0))} revenue, "
+            f"avg fare {_money(kpi.get('avg_fare', 0))}, avg distance {kpi.get('avg_trip_distance', 0):.2f} mi, "
+            f"avg tip {kpi.get('avg_tip_percentage', 0):.1f}%")
+
+
+def _zones(kpi, detail):
+    zones = sorted(kpi.get('busiest_zones', {}).items(), key=lambda kv: -kv[1])
+    if not zones:
+        return None
+    total = sum(n for _, n in zones) or 1
+    shown = zones if detail == 'full' else zones[:3]
+    line = "; ".join(f"{z} {_count(n)} ({n / total:.0%})" for z, n in shown)
+    return f"Pickup zones by trips{'' if detail == 'full' else ' (top 3)'}: {line}"
+
+
+def _hourly(kpi, detail):
+    hours = {int(h): n for h, n in kpi.get('hourly_demand', {}).items()}
+    if not hours:
+        return None
+    if detail == 'full':
+        return "Trips by hour: " + " ".join(f"{h}h:{_count(hours[h])}" for h in sorted(hours))
+    ranked = sorted(hours, key=lambda h: -hours[h])
+    return (f"Trips by hour: busiest {', '.join(f'{h}h {_count(hours[h])}' for h in ranked[:3])}; "
+            f"quietest {ranked[-1]}h {_count(hours[ranked[-1]])}")
+
+
+def _monthly(kpi, detail):
+    revenue = kpi.get('monthly_revenue', {})
+    if not revenue:
+        return None
+    trips = kpi.get('monthly_trips', {})
+    months = _ordered(revenue, MONTH_ORDER)
+    if detail == 'full':
+        return "Monthly revenue (trips): " + "; ".join(
+            f"{m[:3]} {_money(v)}" + (f" ({_count(trips[m])})" if m in trips else "") for m, v in months)
+    best, worst = max(months, key=lambda kv: kv[1]), min(months, key=lambda kv: kv[1])
+    return (f"Monthly revenue: {len(months)} months, best {best[0]} {_money(best[1])}, "
+            f"lowest {worst[0]} {_money(worst[1])}")
+
+
+def _peak(kpi, detail):
+    peak, off_peak = kpi.get('peak_revenue', 0), kpi.get('off_peak_revenue', 0)
+    if not peak and not off_peak:
+        return None
+    share = peak / (peak + off_peak) if peak + off_peak else 0
+    return (f"Peak hours (7-9, 17-19) revenue {_money(peak)} ({share:.0%}) vs off-peak {_money(off_peak)}")
+
+
+def _weekday(kpi, detail):
+    days = kpi.get('dow_performance', {})
+    if not days:
+        return None
+    ordered = _ordered(days, DAY_ORDER)
+    if detail == 'full':
+        return "Avg revenue per trip by day: " + " ".join(f"{d[:3]} {_money(v)}" for d, v in ordered)
+    best, worst = max(ordered, key=lambda kv: kv[1]), min(ordered, key=lambda kv: kv[1])
+    return f"Avg revenue per trip by day: best {best[0]} {_money(best[1])}, lowest {worst[0]} {_money(worst[1])}"
+
+
+SECTIONS = {'overview': _overview, 'zones': _zones, 'hourly': _hourly, 'monthly': _monthly,
+            'peak': _peak, 'weekday': _weekday}
+
+
+def relevant_sections(question):
+    """Sections for a question, most relevant first; all of them for open questions"""
+    terms = set(question_terms(question or ""))
+    scores = {name: len(terms & keywords) for name, keywords in SECTION_KEYWORDS.items()}
+    matched = sorted((n for n in scores if scores[n]), key=lambda n: (-scores[n], SECTION_ORDER.index(n)))
+    return ['overview'] + (matched or SECTION_ORDER[1:])
+
+
+def build_kpi_context(kpi_data, question=None, max_tokens=CONTEXT_TOKEN_BUDGET):
+    """
+    Compact context for one question within max_tokens (local estimate)
+    Returns (text, report) where report lists sections, detail levels and tokens
+    """
+    sections = relevant_sections(question)
+    # Open questions start summarized; targeted ones get full tables
+    detail = {name: 'summary' if len(sections) == len(SECTION_ORDER) else 'full' for name in sections}
+
+    def render():
+        lines = [SECTIONS[name](kpi_data, detail[name]) for name in sections]
+        return "NYC taxi KPIs (K=thousand, M=million):\n" + "\n".join(f"- {l}" for l in lines if l)
+
+    text = render()
+    # Over budget: summarize, then drop, the least relevant sections first
+    for name in reversed(sections[1:]):
+        if estimate_tokens(text) <= max_tokens:
+            break
+        if detail[name] == 'full':
+            detail[name] = 'summary'
+            text = render()
+    for name in reversed(sections[1:]):
+        if estimate_tokens(text) <= max_tokens:
+            break
+        sections.remove(name)
+        text = render()
+
+    return text, {'sections': {n: detail[n] for n in sections}, 'tokens': estimate_tokens(text)}
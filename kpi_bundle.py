@@ -0,0 +1,177 @@
+"""
+API-ready KPI Bundle
+Small, precomputed per-endpoint KPI payloads written to kpi_data/ with a
+manifest, so the serverless API serves real aggregates without touching trips
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+
+from kpi_query import CUBE_FILE, kpi_cube_from_trips
+from trip_features import MONTH_NAMES
+from zone_lookup import lookup_zones
+
+BUNDLE_DIR = "kpi_data"
+MANIFEST_NAME = "manifest.json"
+BUNDLE_FORMAT_VERSION = 1
+
+# File the API loads for each endpoint (MobilityAnalyticsAPI.load_kpis_from_s3 keys)
+ENDPOINT_FILES = {
+    '/monthly-revenue': 'monthly_revenue.json',
+    '/peak-hours': 'peak_hours.json',
+    '/top-zones': 'top_zones.json',
+    '/kpis': CUBE_FILE,
+}
+
+# Cleaned-trip columns the bundle is built from
+SOURCE_COLUMNS = {
+    'date', 'year', 'month', 'hour_of_day', 'payment_type', 'pickup_zone', 'pickup_latitude',
+    'pickup_longitude', 'total_amount', 'trip_distance', 'tip_percentage',
+}
+
+
+def kpi_payloads_from_trips(df):
+    """Per-endpoint payloads from a cleaned, feature-engineered pandas DataFrame"""
+    # Older cleaned exports have no year column; their months are keyed by number alone
+    monthly = df.groupby(['year', 'month'] if 'year' in df.columns else 'month')['total_amount'].sum()
+    hourly = df.groupby('hour_of_day').size()
+    # Older cleaned exports predate the zone columns
+    pickup_zone = df['pickup_zone'] if 'pickup_zone' in df.columns else \
+        lookup_zones(df['pickup_latitude'], df['pickup_longitude'])
+    zones = df.groupby(pickup_zone).size()
+    payloads = build_payloads(
+        monthly_revenue={tuple(map(int, k)) if isinstance(k, tuple) else int(k): float(v)
+                         for k, v in monthly.items()},
+        hourly_trips={int(h): int(v) for h, v in hourly.items()},
+        zone_trips={str(z): int(v) for z, v in zones.items()},
+    )
+    payloads[CUBE_FILE] = kpi_cube_from_trips(df.assign(pickup_zone=pickup_zone))
+    return payloads
+
+
+def build_payloads(monthly_revenue, hourly_trips, zone_trips):
+    """
+    Shape aggregates the way the API handlers expect them (the /kpis cube is
+    added separately as .npy bytes)
+    monthly_revenue: {month number or (year, month): revenue}, hourly_trips: {hour: trips},
+    zone_trips: {zone: trips}; months are labelled "January 2024" once data spans years
+    """
+    years = {key[0] for key in monthly_revenue if isinstance(key, tuple)}
+
+    def month_label(key):
+        year, month = key if isinstance(key, tuple) else (None, key)
+        return MONTH_NAMES[month - 1] + (f" {year}" if len(years) > 1 else "")
+
+    return {
+        'monthly_revenue.json': {
+            month_label(key): round(monthly_revenue[key], 2) for key in sorted(monthly_revenue)
+        },
+        'peak_hours.json': {str(h): hourly_trips[h] for h in sorted(hourly_trips)},
+        'top_zones.json': dict(sorted(zone_trips.items(), key=lambda kv: (-kv[1], kv[0]))),
+    }
+
+
+def _encode(payload):
+    """Compact, deterministic JSON so identical KPIs hash identically"""
+    return json.dumps(payload, separators=(',', ':'), sort_keys=False).encode('utf-8')
+
+
+def load_manifest(bundle_dir=BUNDLE_DIR):
+    path = os.path.join(bundle_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_kpi_bundle(payloads, bundle_dir=BUNDLE_DIR, source="pandas", row_count=None):
+    """
+    Publish payloads plus a manifest; the directory is swapped in whole, and an
+    unchanged bundle is left untouched so downstream caches stay valid
+    """
+    encoded = {name: payload if isinstance(payload, bytes) else _encode(payload)
+               for name, payload in sorted(payloads.items())}
+
+    digest = hashlib.sha256()
+    files = {}
+    for name, body in encoded.items():
+        file_hash = hashlib.sha256(body).hexdigest()
+        digest.update(f"{name}\0{file_hash}\0".encode())
+        files[name] = {'sha256': file_hash, 'bytes': len(body)}
+    content_hash = digest.hexdigest()
+
+    current = load_manifest(bundle_dir)
+    if current and current.get('content_hash') == content_hash:
+        print(f"✓ KPI bundle unchanged (version {current['version']})")
+        return current
+
+    generated_at = datetime.now()
+    manifest = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'version': f"{generated_at:%Y%m%dT%H%M%S}-{content_hash[:12]}",
+        'content_hash': content_hash,
+        'generated_at': generated_at.isoformat(),
+        'source': source,
+        'row_count': row_count,
+        'endpoints': ENDPOINT_FILES,
+        'files': files,
+    }
+
+    # Stage the full bundle next to the live one, then swap directories by rename
+    parent, name = os.path.split(os.path.abspath(bundle_dir))
+    staging_dir = os.path.join(parent, f".{name}.staging")
+    old_dir = os.path.join(parent, f".{name}.old")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+    for file_name, body in encoded.items():
+        with open(os.path.join(staging_dir, file_name), 'wb') as f:
+            f.write(body)
+    with open(os.path.join(staging_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(bundle_dir):
+        os.rename(bundle_dir, old_dir)
+    os.rename(staging_dir, bundle_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    total_bytes = sum(f['bytes'] for f in files.values())
+    print(f"✓ KPI bundle published to: {bundle_dir}/")
+    print(f"  Version: {manifest['version']}")
+    print(f"  Files: {len(files)} ({total_bytes:,} bytes) from {source}")
+    return manifest
+
+
+def verify_kpi_bundle(bundle_dir=BUNDLE_DIR):
+    """Check every bundle file against the manifest hashes"""
+    manifest = load_manifest(bundle_dir)
+    if manifest is None:
+        print(f"✗ No manifest in {bundle_dir}/")
+        return False
+
+    ok = True
+    for name, meta in manifest['files'].items():
+        path = os.path.join(bundle_dir, name)
+        if not os.path.exists(path):
+            print(f"✗ Missing: {name}")
+            ok = False
+            continue
+        with open(path, 'rb') as f:
+            if hashlib.sha256(f.read()).hexdigest() != meta['sha256']:
+                print(f"✗ Hash mismatch: {name}")
+                ok = False
+    if ok:
+        print(f"✓ KPI bundle {manifest['version']} verified ({len(manifest['files'])} files)")
+    return ok
+
+
+# USAGE EXAMPLE
+if __name__ == "__main__":
+    import pandas as pd
+
+    df = pd.read_csv('cleaned_taxi_data.csv', usecols=lambda c: c in SOURCE_COLUMNS)
+    write_kpi_bundle(kpi_payloads_from_trips(df), source='cleaned_taxi_data.csv', row_count=len(df))
+    verify_kpi_bundle()
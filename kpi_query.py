@@ -0,0 +1,271 @@
+"""
+KPI Aggregate Store
+Compact date x hour x zone x payment aggregate ("KPI cube") shipped in the KPI
+bundle as a NumPy .npy file, memory-mapped by the API to answer filtered,
+grouped and paginated /kpis queries without touching trip data
+"""
+
+import io
+import json
+
+import numpy as np
+
+from zone_lookup import ZONE_NAMES
+
+CUBE_FILE = "kpi_cube.npy"
+
+# One row per (date, hour, zone, payment type); rows are sorted by date so a
+# date range is a contiguous slice found with searchsorted
+CUBE_DTYPE = np.dtype([
+    ('date', '<i4'),          # days since 1970-01-01
+    ('hour', 'u1'),
+    ('zone', 'u1'),           # index into ZONE_NAMES
+    ('payment_type', 'u1'),
+    ('trips', '<i8'),
+    ('revenue_sum', '<f8'),
+    ('distance_sum', '<f8'),
+    ('tip_pct_sum', '<f8'),
+])
+
+# TLC payment code for "Unknown"; trips with no payment type are counted under it
+UNKNOWN_PAYMENT_TYPE = 5
+
+GROUP_DIMENSIONS = ['date', 'day_of_week', 'hour', 'zone', 'payment_type']
+METRICS = ['trips', 'revenue', 'avg_revenue', 'avg_distance', 'avg_tip_pct']
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_RESPONSE_BYTES = 256 * 1024  # rows per page are capped to fit; well under Lambda's 6 MB
+
+
+# ============================================================================
+# BUILDING THE CUBE
+# ============================================================================
+
+def kpi_cube_from_trips(df):
+    """Aggregate cleaned trips (pandas) into the cube; returns .npy bytes"""
+    df = df.assign(payment_type=df['payment_type'].fillna(UNKNOWN_PAYMENT_TYPE))
+    agg = df.groupby(['date', 'hour_of_day', 'pickup_zone', 'payment_type']).agg(
+        trips=('total_amount', 'size'),
+        revenue_sum=('total_amount', 'sum'),
+        distance_sum=('trip_distance', 'sum'),
+        tip_pct_sum=('tip_percentage', 'sum'),
+    ).reset_index().rename(columns={'hour_of_day': 'hour'})
+    return kpi_cube_from_aggregates(agg)
+
+
+def kpi_cube_from_aggregates(agg):
+    """
+    Cube bytes from a pandas frame with columns date, hour, pickup_zone,
+    payment_type, trips, revenue_sum, distance_sum, tip_pct_sum
+    """
+    zone_ids = {name: i for i, name in enumerate(ZONE_NAMES)}
+    cube = np.empty(len(agg), dtype=CUBE_DTYPE)
+    cube['date'] = np.asarray(agg['date'], dtype='datetime64[D]').astype(np.int64)
+    cube['hour'] = agg['hour'].to_numpy()
+    cube['zone'] = [zone_ids.get(z, 0) for z in agg['pickup_zone']]
+    # A null would become NaN and then an arbitrary byte in the u1 column
+    cube['payment_type'] = agg['payment_type'].fillna(UNKNOWN_PAYMENT_TYPE).to_numpy()
+    for column in ('trips', 'revenue_sum', 'distance_sum', 'tip_pct_sum'):
+        cube[column] = agg[column].to_numpy()
+
+    cube.sort(order=['date', 'hour', 'zone', 'payment_type'])
+    buffer = io.BytesIO()
+    np.save(buffer, cube, allow_pickle=False)
+    return buffer.getvalue()
+
+
+# ============================================================================
+# QUERYING
+# ============================================================================
+
+def _split(value):
+    return [v.strip() for v in str(value).split(',') if v.strip()]
+
+
+def _parse_ints(value, name, low, high):
+    """'7,8' or '7-9' style integer lists"""
+    values = set()
+    for part in _split(value):
+        try:
+            first, last = (int(v) for v in part.split('-', 1)) if '-' in part else (int(part),) * 2
+        except ValueError:
+            raise ValueError(f"Invalid {name}: {part!r}")
+        # Bounds are checked before the range is expanded, so huge ranges cost nothing
+        if first < low or last > high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+        if first > last:
+            raise ValueError(f"Invalid {name} range: {part!r} (start is after end)")
+        values.update(range(first, last + 1))
+    return sorted(values)
+
+
+def _parse_date(value, name):
+    try:
+        return int(np.datetime64(value, 'D').astype(np.int64))
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value!r} (expected YYYY-MM-DD)")
+
+
+def parse_query(params):
+    """Validate /kpis query parameters; raises ValueError with a client-facing message"""
+    query = {'group_by': [], 'metrics': list(METRICS), 'sort': None}
+
+    if params.get('start_date'):
+        query['start_date'] = _parse_date(params['start_date'], 'start_date')
+    if params.get('end_date'):
+        query['end_date'] = _parse_date(params['end_date'], 'end_date')
+    if params.get('hour'):
+        query['hour'] = _parse_ints(params['hour'], 'hour', 0, 23)
+    if params.get('payment_type'):
+        query['payment_type'] = _parse_ints(params['payment_type'], 'payment_type', 0, 255)
+    if params.get('zone'):
+        lookup = {name.lower(): i for i, name in enumerate(ZONE_NAMES)}
+        unknown = [z for z in _split(params['zone']) if z.lower() not in lookup]
+        if unknown:
+            raise ValueError(f"Unknown zone(s): {unknown} (available: {ZONE_NAMES})")
+        query['zone'] = sorted(lookup[z.lower()] for z in _split(params['zone']))
+
+    if params.get('group_by'):
+        query['group_by'] = _split(params['group_by'])
+        bad = [g for g in query['group_by'] if g not in GROUP_DIMENSIONS]
+        if bad:
+            raise ValueError(f"Invalid group_by: {bad} (available: {GROUP_DIMENSIONS})")
+    if params.get('metrics'):
+        query['metrics'] = _split(params['metrics'])
+        bad = [m for m in query['metrics'] if m not in METRICS]
+        if bad:
+            raise ValueError(f"Invalid metrics: {bad} (available: {METRICS})")
+    if params.get('sort'):
+        sort = params['sort'].strip()
+        field = sort.lstrip('-')
+        if field not in query['group_by'] + query['metrics']:
+            raise ValueError("sort must be one of the group_by dimensions or requested metrics")
+        query['sort'] = sort
+
+    # The cursor is the row offset of the page; next_cursor accounts for size-capped pages
+    try:
+        query['limit'] = min(max(int(params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        query['cursor'] = max(int(params.get('cursor', 0)), 0)
+    except ValueError:
+        raise ValueError("limit and cursor must be integers")
+    return query
+
+
+class KPICube:
+    """
+    Memory-mapped KPI cube; one instance per warm container
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.cube = np.load(path, mmap_mode='r', allow_pickle=False)
+        if self.cube.dtype != CUBE_DTYPE:
+            raise ValueError(f"Unexpected KPI cube layout in {path}")
+
+    def query(self, query, max_bytes=MAX_RESPONSE_BYTES):
+        """Filter, group, sort and paginate; returns the /kpis result payload"""
+        cube = self.cube
+
+        # Date range is a contiguous slice of the date-sorted cube
+        lo = np.searchsorted(cube['date'], query['start_date'], 'left') if 'start_date' in query else 0
+        hi = np.searchsorted(cube['date'], query['end_date'], 'right') if 'end_date' in query else len(cube)
+        rows = cube[lo:hi]
+
+        mask = np.ones(len(rows), dtype=bool)
+        for dimension in ('hour', 'zone', 'payment_type'):
+            if dimension in query:
+                mask &= np.isin(rows[dimension], query[dimension])
+        rows = rows[mask]
+
+        # Group on one packed integer key (mixed radix over the requested dimensions)
+        group_by = query['group_by']
+        columns, radices = [], []
+        for g in group_by:
+            column = self._dimension(rows, g)
+            base = int(column.min()) if len(column) else 0
+            columns.append((column - base, base))
+            radices.append(int(column.max()) - base + 1 if len(column) else 1)
+        packed = np.zeros(len(rows), dtype=np.int64)
+        for (column, _), radix in zip(columns, radices):
+            packed = packed * radix + column
+        unique_keys, inverse = np.unique(packed, return_inverse=True)
+        inverse = inverse.ravel()
+        n_groups = len(unique_keys)
+
+        keys = np.empty((n_groups, len(group_by)), dtype=np.int64)
+        remainder = unique_keys
+        for j in range(len(group_by) - 1, -1, -1):
+            remainder, digit = np.divmod(remainder, radices[j])
+            keys[:, j] = digit + columns[j][1]
+
+        sums = {m: np.bincount(inverse, weights=rows[m], minlength=n_groups)[:n_groups]
+                for m in ('trips', 'revenue_sum', 'distance_sum', 'tip_pct_sum')}
+        trips = sums['trips']
+        safe_trips = np.where(trips > 0, trips, 1)
+        metric_values = {
+            'trips': trips.astype(np.int64),
+            'revenue': np.round(sums['revenue_sum'], 2),
+            'avg_revenue': np.round(sums['revenue_sum'] / safe_trips, 2),
+            'avg_distance': np.round(sums['distance_sum'] / safe_trips, 2),
+            'avg_tip_pct': np.round(sums['tip_pct_sum'] / safe_trips, 2),
+        }
+
+        order = np.arange(n_groups)
+        if query['sort']:
+            field = query['sort'].lstrip('-')
+            values = metric_values[field] if field in metric_values else keys[:, group_by.index(field)]
+            order = np.argsort(values, kind='stable')
+            if query['sort'].startswith('-'):
+                order = order[::-1]
+
+        total = int(n_groups)
+        start = query['cursor']
+        page = order[start:start + query['limit']]
+
+        # Plain Python values for the page only; numpy scalars are slow to format
+        names = group_by + query['metrics']
+        value_lists = [self._format_column(g, values) for g, values in zip(group_by, keys[page].T.tolist())]
+        value_lists += [metric_values[m][page].tolist() for m in query['metrics']]
+        result_rows = [dict(zip(names, values)) for values in zip(*value_lists)] if names else []
+
+        if result_rows:
+            # Zone names and group keys vary in length, so the page is sized from an
+            # upper bound on the widest row: every key plus each column's widest value
+            columns = [value_lists[j] if g in ('date', 'zone') else keys[page, j] for j, g in enumerate(group_by)]
+            columns += [metric_values[m][page] for m in query['metrics']]
+            widest = 2 + sum(len(name) + 4 for name in names) + sum(map(self._max_json_width, columns))
+            result_rows = result_rows[:max((max_bytes - 256) // widest, 1)]
+
+        end = start + len(result_rows)
+        return {
+            'rows': result_rows,
+            'cursor': start,
+            'limit': query['limit'],
+            'total_rows': total,
+            'next_cursor': end if end < total else None,
+            'truncated': len(result_rows) < len(page),
+            'rows_scanned': int(hi - lo),
+        }
+
+    @staticmethod
+    def _max_json_width(values):
+        """Widest JSON encoding in a column: quoted strings, or numbers rounded to 2 decimals"""
+        if isinstance(values, list):
+            return max(map(len, values)) + 2
+        width = len(str(int(np.abs(values).max()))) + int(values.min() < 0)
+        return width + 3 if values.dtype.kind == 'f' else width
+
+    @staticmethod
+    def _dimension(rows, name):
+        if name == 'day_of_week':
+            return (rows['date'].astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday; 0=Monday
+        return rows[name].astype(np.int64)
+
+    @staticmethod
+    def _format_column(name, values):
+        if name == 'date':
+            return np.array(values, dtype='datetime64[D]').astype(str).tolist()
+        if name == 'zone':
+            return [ZONE_NAMES[v] for v in values]
+        return values
@@ -0,0 +1,396 @@
+"""
+KPI Object Storage
+S3-compatible storage layer for the serverless API: tuned connection pooling,
+retries with exponential backoff, parallel multi-key fetch and ranged reads
+for large objects, plus local-filesystem and in-memory backends with the same
+semantics (ETags, 304s, ranges, injected latency/failures) for offline testing
+"""
+
+import hashlib
+import os
+import random
+import threading
+import time
+
+RANGE_CHUNK_BYTES = 8 * 1024 * 1024   # objects larger than this are read as parallel ranges
+MAX_WORKERS = 8
+MAX_ATTEMPTS = 4
+BACKOFF_BASE_SECONDS = 0.05
+BACKOFF_MAX_SECONDS = 2.0
+
+
+class StorageError(Exception):
+    """Permanent storage failure (bad credentials, access denied, ...)"""
+
+
+class TransientStorageError(StorageError):
+    """Throttling, 5xx, timeouts and dropped connections; retried with backoff"""
+
+
+class ObjectNotFound(StorageError):
+    """No object under the key"""
+
+
+class NotModified(Exception):
+    """Conditional GET matched If-None-Match (HTTP 304)"""
+
+
+class StorageObject:
+    """Object body with its ETag and full size"""
+
+    def __init__(self, body, etag, size):
+        self.body = body
+        self.etag = etag
+        self.size = size
+
+
+class KPIStorage:
+    """
+    Backend-independent GET semantics; backends implement _get_object
+    """
+
+    def __init__(self, max_attempts=MAX_ATTEMPTS, backoff_base=BACKOFF_BASE_SECONDS,
+                 backoff_max=BACKOFF_MAX_SECONDS, range_chunk_bytes=RANGE_CHUNK_BYTES,
+                 max_workers=MAX_WORKERS):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.range_chunk_bytes = range_chunk_bytes
+        self.max_workers = max_workers
+        self._pool = None
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'bytes': 0}
+
+    def _get_object(self, key, if_none_match=None, if_match=None, byte_range=None):
+        """
+        One GET; byte_range is an inclusive (first, last) pair
+        Returns StorageObject (body may be partial; size is the full size) or
+        raises NotModified / ObjectNotFound / TransientStorageError / StorageError
+        """
+        raise NotImplementedError
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _with_retries(self, key, **kwargs):
+        """_get_object with exponential backoff and full jitter on transient errors"""
+        for attempt in range(self.max_attempts):
+            self._count('requests')
+            try:
+                obj = self._get_object(key, **kwargs)
+                self._count('bytes', len(obj.body))
+                return obj
+            except TransientStorageError:
+                if attempt == self.max_attempts - 1:
+                    self._count('failures')
+                    raise
+                self._count('retries')
+                time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+            except StorageError:
+                self._count('failures')
+                raise
+
+    def _executor(self):
+        if self._pool is None:
+            # Imported on first parallel fetch; concurrent.futures pulls in logging (cold start)
+            from concurrent.futures import ThreadPoolExecutor
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='kpi-storage')
+        return self._pool
+
+    def get(self, key, if_none_match=None):
+        """
+        Full object, optionally conditional; the first request asks for one
+        range chunk, so small objects take a single round trip and large ones
+        fetch their remaining chunks in parallel
+        """
+        first = self._with_retries(key, if_none_match=if_none_match,
+                                   byte_range=(0, self.range_chunk_bytes - 1))
+        if len(first.body) >= first.size:
+            return first
+
+        ranges = [(start, min(start + self.range_chunk_bytes, first.size) - 1)
+                  for start in range(len(first.body), first.size, self.range_chunk_bytes)]
+        # If-Match pins every chunk to the first chunk's version
+        parts = self._executor().map(
+            lambda r: self._with_retries(key, if_match=first.etag, byte_range=r).body, ranges)
+        return StorageObject(first.body + b''.join(parts), first.etag, first.size)
+
+    def get_many(self, keys, if_none_match=None):
+        """
+        Fetch keys in parallel; returns {key: StorageObject or the exception
+        it raised (NotModified, StorageError)} so one failure spares the rest
+        """
+        if_none_match = if_none_match or {}
+
+        def fetch(key):
+            try:
+                return self.get(key, if_none_match.get(key))
+            except (NotModified, StorageError) as e:
+                return e
+
+        keys = list(dict.fromkeys(keys))
+        if len(keys) == 1:
+            return {keys[0]: fetch(keys[0])}
+        return dict(zip(keys, self._executor().map(fetch, keys)))
+
+
+# ============================================================================
+# S3 BACKEND
+# ============================================================================
+
+TRANSIENT_S3_CODES = {'SlowDown', 'Throttling', 'ThrottlingException', 'RequestTimeout',
+                      'RequestTimeTooSkewed', 'InternalError', 'ServiceUnavailable'}
+
+
+class S3Storage(KPIStorage):
+    """
+    S3 backend; the client's connection pool matches the fetch thread pool and
+    retries are owned by KPIStorage so every backend behaves the same
+    """
+
+    def __init__(self, bucket, prefix="", region=None, connect_timeout=2, read_timeout=5,
+                 client=None, **kwargs):
+        super().__init__(**kwargs)
+        self.bucket = bucket
+        self.prefix = prefix
+        if client is None:
+            import boto3
+            from botocore.config import Config
+            client = boto3.client('s3', region_name=region, config=Config(
+                max_pool_connections=self.max_workers * 2,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+                tcp_keepalive=True,
+                retries={'total_max_attempts': 1, 'mode': 'standard'},
+            ))
+        self.client = client
+
+    def _get_object(self, key, if_none_match=None, if_match=None, byte_range=None):
+        request = {'Bucket': self.bucket, 'Key': f"{self.prefix}{key}"}
+        if if_none_match:
+            request['IfNoneMatch'] = if_none_match
+        if if_match:
+            request['IfMatch'] = if_match
+        if byte_range:
+            request['Range'] = f"bytes={byte_range[0]}-{byte_range[1]}"
+        try:
+            response = self.client.get_object(**request)
+            body = response['Body'].read()
+        except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            status = getattr(e, 'response', {}).get('ResponseMetadata', {}).get('HTTPStatusCode')
+            if status == 304 or code == '304':
+                raise NotModified(key)
+            if code == 'InvalidRange' and byte_range:
+                # Zero-byte objects reject every range
+                return self._get_object(key, if_none_match, if_match)
+            if code in ('NoSuchKey', '404') or status == 404:
+                raise ObjectNotFound(key)
+            if code == 'PreconditionFailed':
+                raise TransientStorageError(f"{key} changed during a ranged read")
+            if code in TRANSIENT_S3_CODES or (status or 0) >= 500 or _is_connection_error(e):
+                raise TransientStorageError(f"{key}: {e}")
+            raise StorageError(f"{key}: {e}")
+
+        size = len(body)
+        content_range = response.get('ContentRange')
+        if content_range and '/' in content_range:
+            size = int(content_range.rsplit('/', 1)[1])
+        return StorageObject(body, response.get('ETag'), size)
+
+
+def _is_connection_error(e):
+    """botocore timeouts and dropped connections, without importing botocore eagerly"""
+    try:
+        from botocore.exceptions import ConnectionError as BotoConnectionError, ReadTimeoutError
+    except ImportError:
+        return False
+    return isinstance(e, (BotoConnectionError, ReadTimeoutError))
+
+
+# ============================================================================
+# OFFLINE BACKENDS
+# ============================================================================
+
+def _etag(body):
+    """S3-style ETag for a single-part upload"""
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+
+def _check_conditions(key, etag, if_none_match, if_match):
+    """Shared conditional-GET semantics for the offline backends"""
+    if if_none_match and if_none_match == etag:
+        raise NotModified(key)
+    if if_match and if_match != etag:
+        raise TransientStorageError(f"{key} changed during a ranged read")
+
+
+class InMemoryStorage(KPIStorage):
+    """
+    Dict-backed stand-in for S3 with optional per-request latency and random
+    transient failures, for throughput and failure tests
+    """
+
+    def __init__(self, objects=None, latency_ms=0.0, failure_rate=0.0, seed=None, **kwargs):
+        super().__init__(**kwargs)
+        self.objects = {}
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        for key, body in (objects or {}).items():
+            self.put(key, body)
+
+    def put(self, key, body):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.objects[key] = (body, _etag(body))
+
+    def delete(self, key):
+        self.objects.pop(key, None)
+
+    def _get_object(self, key, if_none_match=None, if_match=None, byte_range=None):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        with self._lock:
+            fail = self.failure_rate and self._random.random() < self.failure_rate
+        if fail:
+            raise TransientStorageError(f"{key}: injected failure")
+        if key not in self.objects:
+            raise ObjectNotFound(key)
+        body, etag = self.objects[key]
+        _check_conditions(key, etag, if_none_match, if_match)
+        part = body[byte_range[0]:byte_range[1] + 1] if byte_range else body
+        return StorageObject(part, etag, len(body))
+
+
+class LocalStorage(KPIStorage):
+    """
+    Filesystem backend mimicking S3 (e.g. a published kpi_data/ bundle);
+    ETags are content MD5s, recomputed only when size or mtime change
+    """
+
+    def __init__(self, root, prefix="", **kwargs):
+        super().__init__(**kwargs)
+        self.root = root
+        self.prefix = prefix
+        self._etags = {}
+
+    def _get_object(self, key, if_none_match=None, if_match=None, byte_range=None):
+        path = os.path.join(self.root, f"{self.prefix}{key}")
+        try:
+            stat = os.stat(path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            cached = self._etags.get(path)
+            with open(path, 'rb') as f:
+                if cached and cached[0] == signature:
+                    etag = cached[1]
+                    if byte_range:
+                        f.seek(byte_range[0])
+                        body = f.read(byte_range[1] - byte_range[0] + 1)
+                    else:
+                        body = f.read()
+                else:
+                    body = f.read()
+                    etag = _etag(body)
+                    self._etags[path] = (signature, etag)
+                    if byte_range:
+                        body = body[byte_range[0]:byte_range[1] + 1]
+        except FileNotFoundError:
+            raise ObjectNotFound(key)
+        except OSError as e:
+            raise TransientStorageError(f"{key}: {e}")
+
+        _check_conditions(key, etag, if_none_match, if_match)
+        return StorageObject(body, etag, stat.st_size)
+
+
+# ============================================================================
+# OFFLINE CHECKS
+# ============================================================================
+
+def verify_storage_backends():
+    """Check that the offline backends follow S3 GET semantics"""
+    import tempfile
+
+    print("="*70)
+    print("VERIFYING STORAGE BACKENDS")
+    print("="*70)
+
+    large = os.urandom(300_000)
+    objects = {'top_zones.json': b'{"Midtown":1250}', 'kpi_cube.npy': large}
+    ok = True
+    with tempfile.TemporaryDirectory() as root:
+        for name, body in objects.items():
+            with open(os.path.join(root, name), 'wb') as f:
+                f.write(body)
+        backends = {
+            'memory': InMemoryStorage(objects, range_chunk_bytes=64 * 1024),
+            'local': LocalStorage(root, range_chunk_bytes=64 * 1024),
+        }
+        for name, storage in backends.items():
+            small = storage.get('top_zones.json')
+            checks = {
+                'full read': small.body == objects['top_zones.json'] and small.etag == _etag(small.body),
+                'ranged large read': storage.get('kpi_cube.npy').body == large,
+            }
+            try:
+                storage.get('top_zones.json', if_none_match=small.etag)
+                checks['304 on matching ETag'] = False
+            except NotModified:
+                checks['304 on matching ETag'] = True
+            try:
+                storage.get('missing.json')
+                checks['404 on missing key'] = False
+            except ObjectNotFound:
+                checks['404 on missing key'] = True
+            results = storage.get_many(['top_zones.json', 'missing.json'])
+            checks['get_many isolates failures'] = isinstance(results['missing.json'], ObjectNotFound) \
+                and results['top_zones.json'].body == objects['top_zones.json']
+
+            for check, passed in checks.items():
+                print(f"  {'✓' if passed else '✗'} {name:<7} {check}")
+                ok = ok and passed
+
+    flaky = InMemoryStorage(objects, failure_rate=0.5, seed=7, max_attempts=8, backoff_base=0.001)
+    recovered = all(flaky.get('top_zones.json').body == objects['top_zones.json'] for _ in range(20))
+    print(f"  {'✓' if recovered else '✗'} retries  50% transient failures recovered "
+          f"({flaky.stats['retries']} retries over {flaky.stats['requests']} requests)")
+    return ok and recovered
+
+
+def benchmark_storage(n_keys=12, latency_ms=30.0, failure_rate=0.1):
+    """Sequential vs parallel multi-key fetch against a simulated high-latency store"""
+    print("\n" + "="*70)
+    print("STORAGE FETCH BENCHMARK")
+    print("="*70)
+
+    objects = {f"kpi_{i}.json": b'{"value":%d}' % i for i in range(n_keys)}
+    storage = InMemoryStorage(objects, latency_ms=latency_ms, failure_rate=failure_rate, seed=42)
+    keys = list(objects)
+
+    start = time.perf_counter()
+    for key in keys:
+        storage.get(key)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = storage.get_many(keys)
+    parallel = time.perf_counter() - start
+
+    failed = sum(isinstance(r, Exception) for r in results.values())
+    print(f"{n_keys} keys @ {latency_ms:.0f} ms, {failure_rate:.0%} transient failures")
+    print(f"  Sequential: {sequential * 1000:8.1f} ms")
+    print(f"  get_many:   {parallel * 1000:8.1f} ms ({sequential / parallel:.1f}x, "
+          f"{storage.max_workers} workers)")
+    print(f"  Stats: {storage.stats}, failed keys: {failed}")
+    return {'sequential_s': sequential, 'parallel_s': parallel, 'stats': dict(storage.stats)}
+
+
+# USAGE EXAMPLE
+if __name__ == "__main__":
+    verify_storage_backends()
+    benchmark_storage()
@@ -0,0 +1,464 @@
+"""
+Async LLM Client
+Concurrent OpenAI-compatible chat completions with a token-bucket rate limiter,
+bounded concurrency, jittered retries and per-call timeouts, plus a local mock
+LLM server (simulated latency and 429s) to test and benchmark against
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import ssl
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+DEFAULT_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+MOCK_HOST = "127.0.0.1"
+MOCK_PORT = 8100
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_REQUESTS_PER_SECOND = 5.0   # ~300 RPM; set to the account's tier limit
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_TIMEOUT_S = 30.0
+BACKOFF_BASE_S = 0.5
+BACKOFF_CAP_S = 20.0
+
+RETRYABLE_STATUS = {408, 409, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Non-retryable provider error (bad request, auth, ...)"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class TransientLLMError(LLMError):
+    """Server error, timeout or dropped connection; safe to retry"""
+
+
+class RateLimited(TransientLLMError):
+    """HTTP 429; retry_after is the provider's hint in seconds (None if absent)"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message, status=429)
+        self.retry_after = retry_after
+
+
+_TOKEN_PIECES = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text):
+    """
+    Local BPE-style token estimate (no tokenizer download): short words are one
+    token, long words one per ~8 letters, digits go in groups of 3, and each
+    punctuation mark is its own token; typically within ~15% of cl100k
+    """
+    tokens = 0
+    for piece in _TOKEN_PIECES.findall(text):
+        if piece[0].isalpha():
+            tokens += 1 + len(piece) // 8
+        elif piece[0].isdigit():
+            tokens += (len(piece) + 2) // 3
+        else:
+            tokens += 1
+    return max(tokens, 1)
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens per second, bursts up to `capacity`
+    Waiters are served in FIFO order; pause() drains the bucket after a 429
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1.0))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited_s = 0.0
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1.0):
+        amount = min(amount, self.capacity)
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                delay = (amount - self.tokens) / self.rate
+                self.waited_s += delay
+                await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        """Stop granting tokens for `seconds` (the bucket goes into debt)"""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+# ============================================================================
+# HTTP
+# ============================================================================
+
+async def _read_http_response(reader):
+    """Status, lower-cased headers and body of one HTTP/1.1 response"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    status_line, *header_lines = head.decode('latin-1').split("\r\n")
+    headers = {}
+    for line in header_lines:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            chunk = await reader.readexactly(size + 2)
+            if size == 0:
+                break
+            chunks.append(chunk[:-2])
+        body = b"".join(chunks)
+    else:
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return int(status_line.split(" ")[1]), headers, body
+
+
+def _retry_after(headers):
+    if 'retry-after-ms' in headers:
+        return float(headers['retry-after-ms']) / 1000
+    try:
+        return float(headers['retry-after'])
+    except (KeyError, ValueError):
+        return None
+
+
+class AsyncLLMClient:
+    """
+    Chat completions over keep-alive connections to an OpenAI-compatible API
+    One instance per event loop; use `async with` or call close()
+    """
+
+    def __init__(self, api_key, model="gpt-4", base_url=DEFAULT_BASE_URL, max_concurrency=DEFAULT_CONCURRENCY,
+                 requests_per_second=DEFAULT_REQUESTS_PER_SECOND, tokens_per_second=None,
+                 max_retries=DEFAULT_MAX_RETRIES, timeout=DEFAULT_TIMEOUT_S, temperature=0.3):
+        self.api_key = api_key
+        self.model = model
+        self.url = urlsplit(base_url.rstrip('/') + '/chat/completions')
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.temperature = temperature
+
+        self.request_bucket = TokenBucket(requests_per_second)
+        # Optional tokens-per-minute style limit, charged with the estimated prompt size
+        self.token_bucket = TokenBucket(tokens_per_second, tokens_per_second * 10) \
+            if tokens_per_second else None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._idle = []
+        self.stats = {'calls': 0, 'retries': 0, 'rate_limited': 0, 'timeouts': 0, 'failures': 0,
+                      'prompt_tokens': 0, 'completion_tokens': 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def complete(self, messages):
+        """Answer text for one chat; retries 429s, 5xx, timeouts and dropped connections"""
+        payload = {'model': self.model, 'messages': messages, 'temperature': self.temperature}
+        prompt_tokens = sum(estimate_tokens(m['content']) for m in messages)
+
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.request_bucket.acquire()
+                if self.token_bucket:
+                    await self.token_bucket.acquire(prompt_tokens)
+                self.stats['calls'] += 1
+                try:
+                    return await asyncio.wait_for(self._post(payload), self.timeout)
+                except RateLimited as e:
+                    self.stats['rate_limited'] += 1
+                    error = e
+                    # Everyone backs off, not just this call
+                    delay = e.retry_after if e.retry_after is not None else self._backoff(attempt)
+                    self.request_bucket.pause(delay)
+                except asyncio.TimeoutError:
+                    self.stats['timeouts'] += 1
+                    error = TransientLLMError(f"No response within {self.timeout}s")
+                    delay = self._backoff(attempt)
+                except TransientLLMError as e:
+                    error = e
+                    delay = self._backoff(attempt)
+                except LLMError:
+                    self.stats['failures'] += 1
+                    raise
+
+                if attempt == self.max_retries:
+                    break
+                self.stats['retries'] += 1
+                await asyncio.sleep(delay)
+
+        self.stats['failures'] += 1
+        raise error
+
+    @staticmethod
+    def _backoff(attempt):
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))
+
+    async def _connect(self):
+        if self._idle:
+            return self._idle.pop()
+        https = self.url.scheme == 'https'
+        return await asyncio.open_connection(
+            self.url.hostname, self.url.port or (443 if https else 80),
+            ssl=ssl.create_default_context() if https else None)
+
+    async def _post(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        head = (f"POST {self.url.path} HTTP/1.1\r\nHost: {self.url.netloc}\r\n"
+                f"Authorization: Bearer {self.api_key}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n")
+
+        try:
+            reader, writer = connection = await self._connect()
+        except OSError as e:
+            raise TransientLLMError(f"Connection failed: {e}") from e
+        reusable = False
+        try:
+            writer.write(head.encode('latin-1') + body)
+            await writer.drain()
+            status, headers, data = await _read_http_response(reader)
+            reusable = headers.get('connection', '').lower() != 'close'
+        except (OSError, EOFError, asyncio.LimitOverrunError, ValueError, IndexError) as e:
+            # Dropped connections, bodies cut short (IncompleteReadError is an EOFError)
+            # and garbled status lines or lengths are all worth another attempt
+            raise TransientLLMError(f"Connection failed: {type(e).__name__}: {e}") from e
+        finally:
+            # A cancelled (timed out) call may leave a half-read response: never reuse it
+            if reusable:
+                self._idle.append(connection)
+            else:
+                writer.close()
+
+        if status == 429:
+            raise RateLimited("Rate limited (429)", _retry_after(headers))
+        if status in RETRYABLE_STATUS:
+            raise TransientLLMError(f"HTTP {status}", status)
+        if status != 200:
+            raise LLMError(f"HTTP {status}: {data[:200].decode('utf-8', 'replace')}", status)
+
+        try:
+            response = json.loads(data)
+            content = response['choices'][0]['message']['content']
+            usage = response.get('usage') or {}
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+            raise LLMError(f"Malformed response: {data[:200].decode('utf-8', 'replace')}", status) from e
+        self.stats['prompt_tokens'] += usage.get('prompt_tokens', 0)
+        self.stats['completion_tokens'] += usage.get('completion_tokens', 0)
+        return content
+
+
+# ============================================================================
+# MOCK LLM SERVER
+# ============================================================================
+
+class MockLLMServer:
+    """
+    OpenAI-compatible /chat/completions stand-in with configurable latency,
+    a per-second request limit answered with 429 + Retry-After, and random 503s
+    With "stream": true, latency_ms is the time to first token and words follow
+    as server-sent events every ms_per_token
+    """
+
+    def __init__(self, host=MOCK_HOST, port=MOCK_PORT, latency_ms=200, jitter=0.25,
+                 requests_per_second=None, error_rate=0.0, answer_words=40, ms_per_token=15, seed=None):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.requests_per_second = requests_per_second
+        self.error_rate = error_rate
+        self.answer_words = answer_words
+        self.ms_per_token = ms_per_token
+        self.random = random.Random(seed)
+        self.recent = deque()
+        self.in_flight = 0
+        self.stats = {'requests': 0, 'rate_limited': 0, 'errors': 0, 'max_in_flight': 0}
+        self._server = None
+        self._handlers = set()
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # port=0 picks a free port
+        return self
+
+    async def stop(self):
+        self._server.close()
+        # Let keep-alive handlers see their clients' EOF instead of being cancelled at loop shutdown
+        if self._handlers:
+            await asyncio.wait(self._handlers, timeout=1.0)
+        await self._server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                request_line, *header_lines = head.decode('latin-1').split("\r\n")
+                headers = {k.strip().lower(): v.strip()
+                           for k, v in (line.split(':', 1) for line in header_lines if ':' in line)}
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                method, path, _ = request_line.split(" ", 2)
+
+                request = json.loads(body or b'{}')
+                if method != 'POST' or not path.endswith('/chat/completions'):
+                    status, extra, payload = 404, {}, {'error': {'message': 'Not found'}}
+                else:
+                    status, extra, payload = await self._complete(request)
+                if status == 200 and request.get('stream'):
+                    await self._write_stream(writer, payload)
+                    continue
+
+                data = json.dumps(payload).encode('utf-8')
+                lines = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}",
+                         "Content-Type: application/json", f"Content-Length: {len(data)}"]
+                lines += [f"{k}: {v}" for k, v in extra.items()]
+                writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + data)
+                await writer.drain()
+        finally:
+            writer.close()
+            self._handlers.discard(task)
+
+    async def _write_stream(self, writer, completion):
+        """Chunked text/event-stream of chat.completion.chunk objects, one word per event"""
+        def event(data):
+            line = f"data: {data}\n\n".encode('utf-8')
+            return f"{len(line):x}\r\n".encode('latin-1') + line + b"\r\n"
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+        words = completion['choices'][0]['message']['content'].split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(self.ms_per_token / 1000)
+            chunk = {'id': completion['id'], 'object': 'chat.completion.chunk', 'model': completion['model'],
+                     'choices': [{'index': 0, 'delta': {'content': word if i == 0 else " " + word},
+                                  'finish_reason': None}]}
+            writer.write(event(json.dumps(chunk)))
+            await writer.drain()
+        writer.write(event("[DONE]") + b"0\r\n\r\n")
+        await writer.drain()
+
+    def _rate_limited(self):
+        """Sliding one-second window; returns seconds until a slot frees, or None"""
+        if not self.requests_per_second:
+            return None
+        now = time.monotonic()
+        while self.recent and now - self.recent[0] >= 1.0:
+            self.recent.popleft()
+        if len(self.recent) >= self.requests_per_second:
+            return 1.0 - (now - self.recent[0])
+        self.recent.append(now)
+        return None
+
+    async def _complete(self, request):
+        self.stats['requests'] += 1
+        wait = self._rate_limited()
+        if wait is not None:
+            self.stats['rate_limited'] += 1
+            return 429, {'Retry-After': str(math.ceil(wait)), 'retry-after-ms': str(int(wait * 1000))}, \
+                {'error': {'type': 'rate_limit_exceeded', 'message': 'Rate limit reached'}}
+
+        self.in_flight += 1
+        self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.in_flight)
+        try:
+            latency = self.latency_ms * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+            await asyncio.sleep(latency / 1000)
+        finally:
+            self.in_flight -= 1
+        if self.random.random() < self.error_rate:
+            self.stats['errors'] += 1
+            return 503, {}, {'error': {'type': 'server_error', 'message': 'Overloaded'}}
+
+        messages = request.get('messages', [])
+        question = messages[-1]['content'].rsplit('Question:', 1)[-1].strip() if messages else ''
+        answer = f"(mock) Insight for: {question} " + " ".join(["detail"] * self.answer_words)
+        return 200, {}, {
+            'id': f"mock-{self.stats['requests']}",
+            'object': 'chat.completion',
+            'model': request.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer},
+                         'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': sum(estimate_tokens(m['content']) for m in messages),
+                      'completion_tokens': estimate_tokens(answer)},
+        }
+
+
+async def serve_mock_llm(**kwargs):
+    """Run the mock LLM server until cancelled"""
+    server = await MockLLMServer(**kwargs).start()
+    print(f"✓ Mock LLM serving on {server.base_url} "
+          f"(latency {server.latency_ms} ms, limit {server.requests_per_second or '∞'} req/s, "
+          f"error rate {server.error_rate:.0%})")
+    await server._server.serve_forever()
+
+
+# USAGE EXAMPLE
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of an OpenAI-compatible chat API")
+    parser.add_argument('--host', default=MOCK_HOST)
+    parser.add_argument('--port', type=int, default=MOCK_PORT)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--rps', type=float, default=None, help="Requests/s before answering 429")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of 503 responses")
+    parser.add_argument('--ms-per-token', type=float, default=15, help="Streaming pace after the first token")
+    args = parser.parse_args()
+
+    print("Point the assistant at it with OPENAI_BASE_URL=http://127.0.0.1:%d/v1 OPENAI_API_KEY=mock"
+          % args.port)
+    try:
+        asyncio.run(serve_mock_llm(host=args.host, port=args.port, latency_ms=args.latency_ms,
+                                   requests_per_second=args.rps, error_rate=args.error_rate,
+                                   ms_per_token=args.ms_per_token))
+    except KeyboardInterrupt:
+        print("\n✓ Mock LLM stopped")
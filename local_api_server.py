@@ -0,0 +1,302 @@
+"""
+Local Async HTTP Server & Load Generator
+Hosts the serverless API routes over real HTTP through lambda_handler, and
+drives them at configurable concurrency to report throughput and latency
+percentiles, so the API can be capacity-planned without deploying
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+from step6_serverless_api import lambda_handler
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_PATHS = ['/monthly-revenue', '/peak-hours', '/top-zones', '/health']
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024  # /batch bodies are a few KB; API Gateway caps payloads at 10 MB
+
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+# ============================================================================
+# SERVER
+# ============================================================================
+
+def _event_from_request(method, target, headers, body=b''):
+    """API Gateway proxy event for one HTTP request"""
+    url = urlsplit(target)
+    return {
+        'httpMethod': method,
+        'path': url.path or '/',
+        'queryStringParameters': dict(parse_qsl(url.query)) or None,
+        'headers': headers,
+        'body': base64.b64encode(body).decode('ascii') if body else None,
+        'isBase64Encoded': bool(body),
+    }
+
+
+def _http_response(response, keep_alive):
+    """Serialize a Lambda proxy response as HTTP/1.1"""
+    status = response.get('statusCode', 200)
+    body = response.get('body') or ''
+    body = base64.b64decode(body) if response.get('isBase64Encoded') else body.encode('utf-8')
+
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}"]
+    for name, value in response.get('headers', {}).items():
+        lines.append(f"{name}: {value}")
+    lines.append(f"Content-Length: {len(body)}")
+    lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body
+
+
+async def _handle_connection(reader, writer):
+    """Serve HTTP/1.1 requests on one (keep-alive) connection"""
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except asyncio.LimitOverrunError:
+                writer.write(b"HTTP/1.1 431 Request Header Fields Too Large\r\nContent-Length: 0\r\n"
+                             b"Connection: close\r\n\r\n")
+                break
+
+            request_line, *header_lines = head.decode('latin-1').split("\r\n")
+            try:
+                method, target, version = request_line.split(" ", 2)
+            except ValueError:
+                writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                break
+            headers = {}
+            for line in header_lines:
+                if ':' in line:
+                    name, value = line.split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+
+            # Request bodies are only used by POST /batch
+            try:
+                length = int(headers.get('content-length', 0) or 0)
+                if length < 0:
+                    raise ValueError(length)
+            except ValueError:
+                writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                break
+            if length > MAX_BODY_BYTES:
+                writer.write(b"HTTP/1.1 413 Content Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                break
+            try:
+                body = await reader.readexactly(length) if length else b''
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+
+            keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+            if method not in ('GET', 'HEAD', 'POST'):
+                response = {'statusCode': 405, 'headers': {'Allow': 'GET, HEAD, POST'}, 'body': ''}
+            else:
+                # Handlers run on the loop thread: like a Lambda container, the API
+                # instance and its KPI cache serve one request at a time
+                response = lambda_handler(_event_from_request(method, target, headers, body), {})
+                if method == 'HEAD':
+                    response = dict(response, body='', isBase64Encoded=False)
+
+            writer.write(_http_response(response, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Run the local API server until cancelled"""
+    server = await asyncio.start_server(_handle_connection, host, port, limit=MAX_HEADER_BYTES)
+    print(f"✓ Local API serving on http://{host}:{port} "
+          f"(routes: {', '.join(DEFAULT_PATHS + ['/kpis', '/batch'])})")
+    async with server:
+        await server.serve_forever()
+
+
+# ============================================================================
+# LOAD GENERATOR
+# ============================================================================
+
+async def _read_response(reader):
+    """Status and body length of one HTTP/1.1 response"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    status_line, *header_lines = head.decode('latin-1').split("\r\n")
+    length = 0
+    for line in header_lines:
+        if line.lower().startswith('content-length:'):
+            length = int(line.split(':', 1)[1])
+    body = await reader.readexactly(length)
+    return int(status_line.split(" ")[1]), len(body)
+
+
+async def _client(host, port, paths, extra_headers, counter, total, latencies, statuses, errors):
+    """One keep-alive connection issuing requests back to back"""
+    reader, writer = await asyncio.open_connection(host, port)
+    header_block = "".join(f"{k}: {v}\r\n" for k, v in extra_headers.items())
+    try:
+        while counter[0] < total:
+            i = counter[0]
+            counter[0] += 1
+            path = paths[i % len(paths)]
+            request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n{header_block}\r\n".encode('latin-1')
+            start = time.perf_counter()
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, _ = await _read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                errors.append(str(e))
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * pct / 100), len(sorted_values) - 1)]
+
+
+async def run_load_test(host=DEFAULT_HOST, port=DEFAULT_PORT, paths=None, concurrency=8,
+                        requests=2000, headers=None):
+    """
+    Issue `requests` GETs over `concurrency` keep-alive connections, cycling
+    through `paths`; returns throughput and latency percentiles
+    """
+    paths = paths or DEFAULT_PATHS
+    counter, latencies, statuses, errors = [0], [], {}, []
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _client(host, port, paths, headers or {}, counter, requests, latencies, statuses, errors)
+        for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': elapsed,
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 50),
+        'p90_ms': _percentile(latencies, 90),
+        'p99_ms': _percentile(latencies, 99),
+        'max_ms': latencies[-1] if latencies else 0.0,
+        'statuses': statuses,
+    }
+
+
+def print_load_report(results):
+    """Table of load-test results, one row per concurrency level"""
+    print(f"\n{'Conc':>5} {'Requests':>9} {'Req/s':>9} {'p50 ms':>8} {'p90 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}  Statuses")
+    print("-"*70)
+    for r in results:
+        print(f"{r['concurrency']:>5} {r['requests']:>9,} {r['rps']:>9,.0f} {r['p50_ms']:>8.2f} "
+              f"{r['p90_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['max_ms']:>8.2f}  {r['statuses']}"
+              + (f"  ⚠ {r['errors']} errors" if r['errors'] else ""))
+
+
+def _wait_for_port(host, port, timeout=10.0):
+    """Block until the server accepts connections"""
+    import socket
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def benchmark_local_server(concurrency_levels=(1, 4, 16, 64), requests=2000, paths=None,
+                           port=DEFAULT_PORT + 1, headers=None):
+    """
+    Start the server in a separate process and load it at each concurrency
+    level; keeps client and server from sharing one event loop
+    """
+    print("="*70)
+    print("LOCAL API LOAD TEST")
+    print("="*70)
+
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'serve', '--port', str(port)],
+                              stdout=subprocess.DEVNULL)
+    try:
+        if not _wait_for_port(DEFAULT_HOST, port):
+            print("✗ Server did not start")
+            return None
+        print(f"Paths: {', '.join(paths or DEFAULT_PATHS)}  |  {requests:,} requests per level")
+        # Warm the container (cold start, KPI loads) before measuring
+        asyncio.run(run_load_test(DEFAULT_HOST, port, paths, 1, len(paths or DEFAULT_PATHS), headers))
+        results = [asyncio.run(run_load_test(DEFAULT_HOST, port, paths, c, requests, headers))
+                   for c in concurrency_levels]
+    finally:
+        server.terminate()
+        server.wait()
+
+    print_load_report(results)
+    best = max(results, key=lambda r: r['rps'])
+    print(f"\n✓ Peak throughput {best['rps']:,.0f} req/s at concurrency {best['concurrency']} "
+          f"(single process; Lambda scales by adding containers)")
+    return results
+
+
+# USAGE EXAMPLE
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local async HTTP server and load generator for the API")
+    sub = parser.add_subparsers(dest='command')
+
+    serve_parser = sub.add_parser('serve', help="Host the API routes over HTTP")
+    serve_parser.add_argument('--host', default=DEFAULT_HOST)
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+
+    load_parser = sub.add_parser('load', help="Load an already running server")
+    bench_parser = sub.add_parser('bench', help="Start a server and load it at several concurrency levels")
+    for p in (load_parser, bench_parser):
+        p.add_argument('--requests', type=int, default=2000)
+        p.add_argument('--paths', default=",".join(DEFAULT_PATHS),
+                       help="Comma-separated request targets, cycled in order (query strings allowed)")
+        p.add_argument('--accept-encoding', default=None, help="e.g. 'gzip' or 'br'")
+    load_parser.add_argument('--host', default=DEFAULT_HOST)
+    load_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    load_parser.add_argument('--concurrency', type=int, default=8)
+    bench_parser.add_argument('--concurrency', default="1,4,16,64", help="Comma-separated levels")
+
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        try:
+            asyncio.run(serve(args.host, args.port))
+        except KeyboardInterrupt:
+            print("\n✓ Server stopped")
+    elif args.command in ('load', 'bench'):
+        paths = args.paths.split(",")
+        headers = {'Accept-Encoding': args.accept_encoding} if args.accept_encoding else {}
+        if args.command == 'load':
+            result = asyncio.run(run_load_test(args.host, args.port, paths, args.concurrency,
+                                               args.requests, headers))
+            print_load_report([result])
+        else:
+            levels = tuple(int(c) for c in args.concurrency.split(","))
+            benchmark_local_server(levels, args.requests, paths, headers=headers)
+    else:
+        benchmark_local_server()
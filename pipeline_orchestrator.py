@@ -0,0 +1,416 @@
+"""
+Pipeline Orchestrator
+Runs step1-step6 as a small DAG: each stage is fingerprinted from the content
+of its inputs, its code and its settings, and skipped when its outputs are
+already current. Independent stages run in parallel processes.
+"""
+
+import argparse
+import contextlib
+import fnmatch
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+STATE_PATH = ".pipeline_state.json"
+LOG_DIR = "pipeline_logs"
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+DEFAULT_CONFIG = {
+    'raw_csv': 'yellow_tripdata.csv',
+    'clean_csv': 'cleaned_taxi_data.csv',
+    'sql_db': 'taxi_analytics.db',
+    'kpi_dir': 'kpi_data',
+}
+
+SPARK_KPI_OUTPUTS = [
+    'output/monthly_revenue.parquet', 'output/zone_demand.parquet', 'output/peak_hour_analysis.parquet',
+    'output/high_value_segments.parquet', 'output/dow_performance.parquet'
+]
+CHART_OUTPUTS = ['monthly_revenue_trends.png', 'hourly_demand_heatmap.png', 'tip_distribution_analysis.png']
+
+
+# ============================================================================
+# STAGE BODIES (run in worker processes, so they import lazily)
+# ============================================================================
+
+def run_clean(config):
+    from step1_data_cleaning import MobilityDataAnalyzer
+
+    analyzer = MobilityDataAnalyzer()
+    if analyzer.load_data(config['raw_csv']) is None:
+        raise RuntimeError(f"Could not load {config['raw_csv']}")
+    analyzer.clean_data()
+    analyzer.feature_engineering()
+    if not analyzer.export_clean_data(config['clean_csv']):
+        raise RuntimeError(f"Could not write {config['clean_csv']}")
+    analyzer.get_summary_statistics()
+
+
+def run_kpi_charts(config):
+    import pandas as pd
+    from step2_kpi_analysis import KPIAnalyzer
+
+    df = pd.read_csv(config['clean_csv'], parse_dates=['tpep_pickup_datetime', 'tpep_dropoff_datetime'])
+    kpi_analyzer = KPIAnalyzer(df)
+    kpi_analyzer.compute_all_kpis()
+    kpi_analyzer.generate_all_visualizations()
+
+
+def run_sql(config):
+    from step3_sql_analytics import SQLAnalyticsEngine
+
+    sql_engine = SQLAnalyticsEngine(config['sql_db'])
+    if not sql_engine.connect():
+        raise RuntimeError(f"Could not open {config['sql_db']}")
+    try:
+        if not sql_engine.load_data_to_sql(config['clean_csv']):
+            raise RuntimeError(f"Could not load {config['clean_csv']} into SQL")
+        sql_engine.run_all_analytics()
+    finally:
+        sql_engine.close()
+
+
+def run_spark_kpis(config):
+    from step4_pyspark_etl import PySparkETLPipeline
+
+    etl = PySparkETLPipeline(app_name="NYC_Taxi_ETL", input_path=config['raw_csv'])
+    try:
+        with etl.track_step("load_data"):
+            df = etl.load_data(config['raw_csv'])
+        with etl.track_step("clean_and_transform"):
+            clean_df = etl.clean_and_transform(df)
+        with etl.track_step("compute_kpis"):
+            etl.compute_kpis(clean_df)
+        etl.write_run_report("output/run_report.json")
+    finally:
+        etl.stop()
+
+
+def run_kpi_bundle(config):
+    import pandas as pd
+    from kpi_bundle import SOURCE_COLUMNS, kpi_payloads_from_trips, write_kpi_bundle
+
+    df = pd.read_csv(config['clean_csv'], usecols=lambda c: c in SOURCE_COLUMNS)
+    write_kpi_bundle(kpi_payloads_from_trips(df), config['kpi_dir'], source='pandas', row_count=len(df))
+
+
+def run_genai_summary(config):
+    from step5_genai_assistant import GenAIMobilityInsights
+
+    assistant = GenAIMobilityInsights(api_key=None, model="gpt-4")
+    assistant.load_kpi_context(config['clean_csv'])
+    assistant.generate_executive_summary()
+
+
+def run_api_check(config):
+    from serverless_deploy import generate_aws_deployment_config
+    from step6_serverless_api import test_api_locally
+
+    test_api_locally()
+    generate_aws_deployment_config()
+
+
+class PipelineStage:
+    """
+    One DAG node: a top-level function plus the files it reads and writes
+    Dependencies are derived from matching inputs against other stages' outputs
+    """
+
+    def __init__(self, name, func, inputs, outputs, code):
+        self.name = name
+        self.func = func
+        self.inputs = inputs
+        self.outputs = outputs
+        self.code = code
+
+
+def default_stages(config):
+    """The step1-step6 pipeline with the file each stage reads and writes"""
+    shared = ['trip_features.py', 'zone_lookup.py']
+    return [
+        PipelineStage('clean', run_clean, [config['raw_csv']], [config['clean_csv']],
+                      ['step1_data_cleaning.py'] + shared),
+        PipelineStage('kpi_charts', run_kpi_charts, [config['clean_csv']], CHART_OUTPUTS,
+                      ['step2_kpi_analysis.py']),
+        PipelineStage('sql_analytics', run_sql, [config['clean_csv']],
+                      [config['sql_db'], 'sql_result_*.csv'], ['step3_sql_analytics.py', 'zone_lookup.py']),
+        PipelineStage('spark_kpis', run_spark_kpis, [config['raw_csv']],
+                      SPARK_KPI_OUTPUTS + ['output/run_report.json'],
+                      ['step4_pyspark_etl.py', 'spark_instrumentation.py'] + shared),
+        PipelineStage('kpi_bundle', run_kpi_bundle, [config['clean_csv']],
+                      [f"{config['kpi_dir']}/*.json", f"{config['kpi_dir']}/*.npy"],
+                      ['kpi_bundle.py', 'kpi_query.py', 'zone_lookup.py']),
+        PipelineStage('genai_summary', run_genai_summary, [config['clean_csv']], ['executive_summary.txt'],
+                      ['step5_genai_assistant.py']),
+        PipelineStage('api_check', run_api_check, [f"{config['kpi_dir']}/*.json", f"{config['kpi_dir']}/*.npy"],
+                      ['template.yaml', 'deploy_aws.sh'],
+                      ['step6_serverless_api.py', 'serverless_deploy.py', 'kpi_query.py']),
+    ]
+
+
+def _execute_stage(func, config, log_path):
+    """Worker body: run one stage with its output captured to a log file"""
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    start = time.perf_counter()
+    with open(log_path, 'w') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        func(config)
+    return time.perf_counter() - start
+
+
+class PipelineOrchestrator:
+    """
+    Content-hash cached DAG runner for the pipeline steps
+    """
+
+    def __init__(self, stages=None, config=None, state_path=STATE_PATH, max_workers=None):
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        self.stages = {s.name: s for s in (stages or default_stages(self.config))}
+        self.state_path = state_path
+        self.max_workers = max_workers or min(len(self.stages), os.cpu_count() or 1)
+        self.state = self._load_state()
+        self.dependencies = self._resolve_dependencies()
+
+    # ------------------------------------------------------------------
+    # DAG
+    # ------------------------------------------------------------------
+
+    def _resolve_dependencies(self):
+        """stage -> upstream stages whose outputs match one of its inputs"""
+        dependencies = {}
+        for stage in self.stages.values():
+            dependencies[stage.name] = sorted(
+                other.name for other in self.stages.values()
+                if other is not stage and any(
+                    fnmatch.fnmatch(i, o) or fnmatch.fnmatch(o, i)
+                    for i in stage.inputs for o in other.outputs)
+            )
+
+        # Reject cycles up front (Kahn's algorithm)
+        remaining = {name: set(deps) for name, deps in dependencies.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Stage dependency cycle among: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+        return dependencies
+
+    def _with_upstream(self, names):
+        selected, pending = set(), list(names)
+        while pending:
+            name = pending.pop()
+            if name not in selected:
+                selected.add(name)
+                pending.extend(self.dependencies[name])
+        return selected
+
+    # ------------------------------------------------------------------
+    # Fingerprints
+    # ------------------------------------------------------------------
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+            state.setdefault('stages', {})
+            state.setdefault('file_hashes', {})
+            return state
+        return {'stages': {}, 'file_hashes': {}}
+
+    def _save_state(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def _file_hash(self, path):
+        """SHA-256 of a file, reusing the previous digest when size and mtime are unchanged"""
+        stat = os.stat(path)
+        cached = self.state['file_hashes'].get(path)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha256']
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+        self.state['file_hashes'][path] = {
+            'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()
+        }
+        return digest.hexdigest()
+
+    def _files_for(self, pattern):
+        """Files behind a path or glob; directories (e.g. Parquet) are walked"""
+        files = []
+        for path in sorted(glob.glob(pattern)):
+            if os.path.isdir(path):
+                for root, dirs, names in os.walk(path):
+                    dirs.sort()
+                    files.extend(os.path.join(root, n) for n in sorted(names)
+                                 if not n.startswith('.') and not n.endswith('.crc'))
+            else:
+                files.append(path)
+        return files
+
+    def _content_hash(self, patterns):
+        """Combined hash of every file matched by the patterns, or None if one is missing"""
+        digest = hashlib.sha256()
+        for pattern in patterns:
+            files = self._files_for(pattern)
+            if not files:
+                return None
+            for path in files:
+                digest.update(f"{path}\0{self._file_hash(path)}\0".encode())
+        return digest.hexdigest()
+
+    def fingerprint(self, stage):
+        """Hash of the stage's inputs, code and settings"""
+        inputs_hash = self._content_hash(stage.inputs)
+        code_hash = self._content_hash(stage.code)
+        payload = json.dumps({
+            'inputs': inputs_hash or 'missing',
+            'code': code_hash,
+            'function': f"{stage.func.__module__}.{stage.func.__name__}",
+            'config': self.config,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def is_current(self, stage, fingerprint):
+        """Outputs exist, are unchanged since the last run, and came from this fingerprint"""
+        record = self.state['stages'].get(stage.name)
+        if not record or record.get('fingerprint') != fingerprint:
+            return False
+        return self._content_hash(stage.outputs) == record.get('outputs_hash')
+
+    # ------------------------------------------------------------------
+    # Execution
+    # ------------------------------------------------------------------
+
+    def run(self, targets=None, force=(), dry_run=False):
+        """Run the targets (default: all stages) and their upstream stages"""
+        selected = self._with_upstream(targets or list(self.stages))
+        unknown = set(force) - set(self.stages)
+        if unknown:
+            raise ValueError(f"Unknown stages: {sorted(unknown)}")
+
+        print("="*70)
+        print("PIPELINE ORCHESTRATOR" + (" (DRY RUN)" if dry_run else ""))
+        print("="*70)
+        print(f"Stages: {', '.join(n for n in self.stages if n in selected)}")
+        print(f"Workers: {self.max_workers}")
+
+        results = {}
+        running = {}
+        mp_context = multiprocessing.get_context('spawn')
+
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp_context) as pool:
+            while len(results) < len(selected):
+                for name in self.stages:
+                    if name not in selected or name in results or name in running:
+                        continue
+                    deps = self.dependencies[name]
+                    if any(d in selected and d not in results for d in deps):
+                        continue  # upstream still pending
+                    if any(results.get(d, {}).get('status') in ('failed', 'blocked') for d in deps):
+                        results[name] = {'status': 'blocked', 'seconds': 0.0}
+                        print(f"  ⚠ {name}: skipped (upstream failed)")
+                        continue
+
+                    stage = self.stages[name]
+                    fingerprint = self.fingerprint(stage)
+                    upstream_reran = any(results.get(d, {}).get('status') == 'would run' for d in deps)
+                    if name not in force and not upstream_reran and self.is_current(stage, fingerprint):
+                        results[name] = {'status': 'cached', 'seconds': 0.0}
+                        print(f"  ✓ {name}: up to date")
+                    elif dry_run:
+                        results[name] = {'status': 'would run', 'seconds': 0.0}
+                        print(f"  → {name}: would run")
+                    elif self._content_hash(stage.inputs) is None:
+                        results[name] = {'status': 'failed', 'seconds': 0.0,
+                                         'error': f"missing inputs: {stage.inputs}"}
+                        print(f"  ✗ {name}: missing inputs {stage.inputs}")
+                    else:
+                        log_path = os.path.join(LOG_DIR, f"{name}.log")
+                        future = pool.submit(_execute_stage, stage.func, self.config, log_path)
+                        running[name] = (future, fingerprint)
+                        print(f"  ▶ {name}: started (log: {log_path})")
+
+                if not running:
+                    continue
+
+                done, _ = wait([f for f, _ in running.values()], return_when=FIRST_COMPLETED)
+                for name in [n for n, (f, _) in running.items() if f in done]:
+                    future, fingerprint = running.pop(name)
+                    results[name] = self._finish(self.stages[name], future, fingerprint)
+
+        self._save_state()
+        self.print_summary(results)
+        return results
+
+    def _finish(self, stage, future, fingerprint):
+        try:
+            seconds = future.result()
+        except Exception as e:
+            print(f"  ✗ {stage.name}: failed ({type(e).__name__}: {e})")
+            return {'status': 'failed', 'seconds': 0.0, 'error': f"{type(e).__name__}: {e}"}
+
+        outputs_hash = self._content_hash(stage.outputs)
+        if outputs_hash is None:
+            print(f"  ✗ {stage.name}: finished without producing {stage.outputs}")
+            return {'status': 'failed', 'seconds': seconds, 'error': 'outputs missing'}
+
+        self.state['stages'][stage.name] = {
+            'fingerprint': fingerprint,
+            'outputs_hash': outputs_hash,
+            'completed_at': datetime.now().isoformat(),
+            'seconds': round(seconds, 2),
+        }
+        self._save_state()
+        print(f"  ✓ {stage.name}: done in {seconds:.1f}s")
+        return {'status': 'ran', 'seconds': seconds}
+
+    def print_summary(self, results):
+        print("\n" + "="*70)
+        print("PIPELINE SUMMARY")
+        print("="*70)
+        print(f"\n{'Stage':<18}{'Depends on':<26}{'Status':<12}{'Seconds':>9}")
+        print("-" * 65)
+        for name in self.stages:
+            if name in results:
+                r = results[name]
+                deps = ', '.join(self.dependencies[name]) or '-'
+                print(f"{name:<18}{deps:<26}{r['status']:<12}{r['seconds']:>9.1f}")
+        failed = [n for n, r in results.items() if r['status'] == 'failed']
+        if failed:
+            print(f"\n✗ Failed: {', '.join(failed)} (see {LOG_DIR}/)")
+        print("\n" + "="*70)
+
+
+# USAGE EXAMPLE
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the mobility pipeline with stage caching")
+    parser.add_argument('targets', nargs='*', help="Stages to bring up to date (default: all)")
+    parser.add_argument('--force', default='', help="Comma-separated stages to rerun regardless of cache")
+    parser.add_argument('--dry-run', action='store_true', help="Only report which stages would run")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--raw-csv', default=DEFAULT_CONFIG['raw_csv'])
+    args = parser.parse_args()
+
+    orchestrator = PipelineOrchestrator(config={'raw_csv': args.raw_csv}, max_workers=args.workers)
+    results = orchestrator.run(
+        targets=args.targets or None,
+        force=[s for s in args.force.split(',') if s],
+        dry_run=args.dry_run
+    )
+    sys.exit(1 if any(r['status'] == 'failed' for r in results.values()) else 0)
@@ -0,0 +1,323 @@
+"""
+Serverless API Deployment Tooling
+AWS SAM / Azure Functions config generators, the deployment guide and the
+cold-start benchmark, kept out of the handler module so they never load at cold start
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Cold-start budget for step6_serverless_api (median ms over fresh interpreters).
+# first_kpi[s3] includes the lazy boto3 import and client creation, not just the GET
+COLD_START_TARGETS_MS = {
+    'import': 60,
+    'first_health': 5,
+    'first_kpi[local]': 20,
+    'first_kpi[s3]': 600,
+}
+
+_COLD_START_PROBE = """
+import json, time
+start = time.perf_counter()
+import step6_serverless_api as api_module
+imported = time.perf_counter()
+api_module.lambda_handler({'httpMethod': 'GET', 'path': '/health', 'queryStringParameters': {}}, {})
+health = time.perf_counter()
+api_module.lambda_handler({'httpMethod': 'GET', 'path': '/top-zones', 'queryStringParameters': {}}, {})
+kpi = time.perf_counter()
+print(json.dumps({'import': (imported - start) * 1000, 'first_health': (health - imported) * 1000,
+                  'first_kpi': (kpi - health) * 1000}))
+"""
+
+
+# ============================================================================
+# DEPLOYMENT SCRIPTS
+# ============================================================================
+
+def generate_aws_deployment_config():
+    """Generate AWS SAM template for deployment"""
+    
+    template = """
+# AWS SAM Template for Taxi Analytics API
+
+AWSTemplateFormatVersion: '2010-09-09'
+Transform: AWS::Serverless-2016-10-31
+Description: Serverless Urban Mobility Analytics API
+
+# gzip/brotli bodies are returned base64-encoded (isBase64Encoded); API Gateway
+# only decodes them back to binary for declared binary media types (~1 is SAM's escape for /)
+Globals:
+  Api:
+    BinaryMediaTypes:
+      - '*~1*'
+
+Resources:
+  TaxiAnalyticsFunction:
+    Type: AWS::Serverless::Function
+    Properties:
+      CodeUri: ./
+      Handler: serverless_api.lambda_handler
+      Runtime: python3.11
+      MemorySize: 512
+      Timeout: 30
+      Environment:
+        Variables:
+          S3_BUCKET: taxi-analytics-data
+          S3_PREFIX: aggregated_kpis/
+      Policies:
+        - S3ReadPolicy:
+            BucketName: taxi-analytics-data
+      Events:
+        MonthlyRevenue:
+          Type: Api
+          Properties:
+            Path: /monthly-revenue
+            Method: GET
+        PeakHours:
+          Type: Api
+          Properties:
+            Path: /peak-hours
+            Method: GET
+        TopZones:
+          Type: Api
+          Properties:
+            Path: /top-zones
+            Method: GET
+        Kpis:
+          Type: Api
+          Properties:
+            Path: /kpis
+            Method: GET
+        Batch:
+          Type: Api
+          Properties:
+            Path: /batch
+            Method: ANY
+        Health:
+          Type: Api
+          Properties:
+            Path: /health
+            Method: GET
+        Metrics:
+          Type: Api
+          Properties:
+            Path: /metrics
+            Method: GET
+
+Outputs:
+  ApiUrl:
+    Description: "API Gateway endpoint URL"
+    Value: !Sub "https://${ServerlessRestApi}.execute-api.${AWS::Region}.amazonaws.com/Prod/"
+"""
+    
+    with open('template.yaml', 'w') as f:
+        f.write(template)
+    
+    print("\n✓ Generated: template.yaml (AWS SAM)")
+    
+    # Generate deployment script
+    deploy_script = """#!/bin/bash
+# Deploy to AWS Lambda using SAM
+
+echo "Building SAM application..."
+sam build
+
+echo "Deploying to AWS..."
+sam deploy --guided
+
+echo "Deployment complete!"
+"""
+    
+    with open('deploy_aws.sh', 'w') as f:
+        f.write(deploy_script)
+    
+    print("✓ Generated: deploy_aws.sh")
+
+
+def generate_azure_deployment_config():
+    """Generate Azure Functions configuration"""
+    
+    function_json = {
+        "scriptFile": "serverless_api.py",
+        "bindings": [
+            {
+                "authLevel": "function",
+                "type": "httpTrigger",
+                "direction": "in",
+                "name": "req",
+                "methods": ["get"],
+                "route": "{route}"
+            },
+            {
+                "type": "http",
+                "direction": "out",
+                "name": "$return"
+            }
+        ]
+    }
+    
+    with open('function.json', 'w') as f:
+        json.dump(function_json, f, indent=2)
+    
+    print("\n✓ Generated: function.json (Azure Functions)")
+    
+    # Generate requirements
+    requirements = """
+azure-functions
+boto3
+numpy
+"""
+    
+    with open('requirements.txt', 'w') as f:
+        f.write(requirements)
+    
+    print("✓ Generated: requirements.txt")
+
+
+def print_deployment_guide():
+    """Print deployment instructions"""
+    
+    guide = """
+╔══════════════════════════════════════════════════════════════════════════╗
+║                     CLOUD DEPLOYMENT GUIDE                               ║
+╚══════════════════════════════════════════════════════════════════════════╝
+
+AWS LAMBDA DEPLOYMENT
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Prerequisites:
+1. Install AWS CLI: https://aws.amazon.com/cli/
+2. Install AWS SAM CLI: https://aws.amazon.com/serverless/sam/
+3. Configure AWS credentials: aws configure
+
+Steps:
+1. Upload aggregated KPIs to S3:
+   aws s3 cp kpi_data/ s3://taxi-analytics-data/aggregated_kpis/ --recursive
+
+2. Deploy Lambda function:
+   sam build
+   sam deploy --guided
+
+3. Test endpoints:
+   curl https://your-api-url/monthly-revenue
+   curl https://your-api-url/peak-hours
+   curl https://your-api-url/top-zones
+   curl https://your-api-url/metrics
+
+AZURE FUNCTIONS DEPLOYMENT
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Prerequisites:
+1. Install Azure CLI: https://docs.microsoft.com/cli/azure/
+2. Install Azure Functions Core Tools
+3. Login to Azure: az login
+
+Steps:
+1. Create Function App:
+   az functionapp create --resource-group taxi-analytics \\
+     --consumption-plan-location eastus \\
+     --runtime python --runtime-version 3.11 \\
+     --functions-version 4 --name taxi-analytics-api
+
+2. Deploy function:
+   func azure functionapp publish taxi-analytics-api
+
+3. Test endpoints:
+   curl https://taxi-analytics-api.azurewebsites.net/api/monthly-revenue
+
+SCHEDULED EXECUTION
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+AWS CloudWatch Events (daily at 2 AM):
+  - Create EventBridge rule with cron expression: cron(0 2 * * ? *)
+  - Target: Your Lambda function
+
+Azure Timer Trigger (daily at 2 AM):
+  - Add timer trigger with CRON: 0 0 2 * * *
+
+MONITORING & LOGGING
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+AWS:
+  - CloudWatch Logs for function execution
+  - CloudWatch Metrics for performance
+  - X-Ray for distributed tracing
+
+Azure:
+  - Application Insights for monitoring
+  - Log Analytics for querying logs
+  - Azure Monitor for alerts
+
+COST OPTIMIZATION
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+- Use S3/Blob Storage for caching aggregated KPIs
+- Set appropriate memory/timeout limits
+- Use reserved capacity for predictable workloads
+- Implement API caching (API Gateway/Azure API Management)
+- Monitor cold start times and optimize accordingly
+"""
+    
+    print(guide)
+
+
+# ============================================================================
+# COLD START BENCHMARK
+# ============================================================================
+
+def benchmark_cold_start(runs=5, targets=None):
+    """
+    Median import time and first-invocation latencies of the handler module,
+    each run in a fresh interpreter, checked against COLD_START_TARGETS_MS
+    """
+    targets = targets or COLD_START_TARGETS_MS
+    print("="*70)
+    print("COLD START BENCHMARK")
+    print("="*70)
+    
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    pythonpath = os.pathsep.join(filter(None, [module_dir, os.getenv('PYTHONPATH')]))
+    samples = {name: [] for name in targets}
+    for source in ('local', 's3'):
+        env = dict(os.environ, PYTHONPATH=pythonpath, KPI_SOURCE=source)
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, '-c', _COLD_START_PROBE], env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            result[f'first_kpi[{source}]'] = result.pop('first_kpi')
+            for name in samples:
+                if name in result:
+                    samples[name].append(result[name])
+    
+    report = {}
+    print(f"\n{'Phase':<20}{'Median ms':>11}{'Target ms':>11}")
+    print("-" * 46)
+    for name, values in samples.items():
+        median = statistics.median(values)
+        report[name] = {'median_ms': round(median, 2), 'target_ms': targets[name],
+                        'ok': median <= targets[name]}
+        mark = "✓" if report[name]['ok'] else "✗"
+        print(f"{name:<20}{median:>11.2f}{targets[name]:>11}  {mark}")
+    
+    print(f"\n{runs} fresh interpreters per KPI source")
+    return report
+
+
+# USAGE EXAMPLE
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("GENERATING DEPLOYMENT CONFIGURATIONS")
+    print("="*70)
+    
+    generate_aws_deployment_config()
+    generate_azure_deployment_config()
+    
+    # Print deployment guide
+    print_deployment_guide()
+    
+    # Track the handler's cold-start budget
+    report = benchmark_cold_start()
+    sys.exit(0 if all(phase['ok'] for phase in report.values()) else 1)
@@ -0,0 +1,175 @@
+"""
+Stage-level instrumentation for Spark jobs
+Groups Spark jobs by ETL step and reports per-stage timings, shuffle and spill
+"""
+
+import json
+import os
+import time
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime
+
+# Spark REST stage fields copied into the report (bytes/records/ms as reported by Spark)
+STAGE_METRIC_FIELDS = [
+    'numTasks', 'numCompleteTasks', 'numFailedTasks', 'executorRunTime',
+    'inputBytes', 'inputRecords', 'outputRecords',
+    'shuffleReadBytes', 'shuffleReadRecords', 'shuffleWriteBytes', 'shuffleWriteRecords',
+    'memoryBytesSpilled', 'diskBytesSpilled'
+]
+
+
+class SparkRunInstrumentation:
+    """
+    Collects per-step and per-stage metrics for a Spark application
+    Uses job groups to map stages to ETL steps and the driver's REST API
+    (backed by the same listener data as the Spark UI) for stage metrics
+    """
+
+    def __init__(self, spark):
+        self.spark = spark
+        self.sc = spark.sparkContext
+        self.steps = []
+
+    @contextmanager
+    def step(self, name):
+        """Attribute every Spark job started inside the block to an ETL step"""
+        group_id = f"etl-step-{len(self.steps)}-{name}"
+        self.sc.setJobGroup(group_id, name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append({
+                'name': name,
+                'job_group': group_id,
+                'wall_seconds': round(time.perf_counter() - start, 3)
+            })
+            self.sc.setLocalProperty("spark.jobGroup.id", None)
+            self.sc.setLocalProperty("spark.job.description", None)
+
+    def collect(self):
+        """Resolve each step's jobs and stages into metric records"""
+        tracker = self.sc.statusTracker()
+        report_steps = []
+
+        for step in self.steps:
+            job_ids = sorted(tracker.getJobIdsForGroup(step['job_group']))
+            stage_ids = []
+            for job_id in job_ids:
+                job = tracker.getJobInfo(job_id)
+                if job:
+                    stage_ids.extend(job.stageIds)
+
+            stages = [self._stage_metrics(tracker, stage_id) for stage_id in sorted(set(stage_ids))]
+            stages = [s for s in stages if s]
+
+            totals = {field: sum(s.get(field, 0) or 0 for s in stages)
+                      for field in STAGE_METRIC_FIELDS}
+            report_steps.append(dict(step, jobs=job_ids, stages=stages, totals=totals))
+
+        return report_steps
+
+    def _stage_metrics(self, tracker, stage_id):
+        """Metrics for one stage from the REST API, falling back to the status tracker"""
+        data = self._fetch_rest_stage(stage_id)
+        if data:
+            record = {'stage_id': stage_id, 'name': data.get('name', '')}
+            record.update({field: data.get(field, 0) for field in STAGE_METRIC_FIELDS})
+            record['wall_seconds'] = self._stage_wall_seconds(data)
+            return record
+
+        info = tracker.getStageInfo(stage_id)
+        if info is None:
+            return None
+        return {
+            'stage_id': stage_id,
+            'name': info.name,
+            'numTasks': info.numTasks,
+            'numCompleteTasks': info.numCompletedTasks,
+            'numFailedTasks': info.numFailedTasks,
+            'wall_seconds': None
+        }
+
+    def _fetch_rest_stage(self, stage_id, retries=3):
+        ui_url = self.sc.uiWebUrl
+        if not ui_url:
+            return None
+
+        url = f"{ui_url}/api/v1/applications/{self.sc.applicationId}/stages/{stage_id}"
+        for attempt in range(retries):
+            try:
+                with urllib.request.urlopen(url, timeout=5) as response:
+                    attempts = json.loads(response.read())
+                # Last attempt reflects the final execution of the stage
+                if attempts and attempts[-1].get('status') in ('COMPLETE', 'FAILED', 'SKIPPED'):
+                    return attempts[-1]
+            except Exception:
+                pass
+            # Listener events are processed asynchronously; give them a moment
+            time.sleep(0.2 * (attempt + 1))
+        return None
+
+    @staticmethod
+    def _stage_wall_seconds(data):
+        def parse(value):
+            return datetime.strptime(value.replace('GMT', ''), "%Y-%m-%dT%H:%M:%S.%f")
+
+        if data.get('submissionTime') and data.get('completionTime'):
+            return round((parse(data['completionTime']) - parse(data['submissionTime'])).total_seconds(), 3)
+        return None
+
+    def write_report(self, path="output/run_report.json", extra=None):
+        """Write the JSON run report and return it"""
+        steps = self.collect()
+        all_stages = [dict(stage, step=step['name']) for step in steps for stage in step['stages']]
+        timed = [s for s in all_stages if s.get('wall_seconds') is not None]
+
+        report = {
+            'application_id': self.sc.applicationId,
+            'spark_version': self.spark.version,
+            'generated_at': datetime.now().isoformat(),
+            'steps': steps,
+            'most_expensive_stage': max(timed, key=lambda s: s['wall_seconds']) if timed else None
+        }
+        if extra:
+            report.update(extra)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        print(f"\n✓ Run report saved to: {path}")
+        return report
+
+    @staticmethod
+    def print_summary(report, top_stages=5):
+        """Readable per-step and slowest-stage summary of a run report"""
+        print("\n" + "="*70)
+        print("SPARK RUN METRICS")
+        print("="*70)
+
+        print(f"\n{'Step':<24}{'Wall s':>8}{'Jobs':>6}{'Stages':>8}{'Tasks':>8}"
+              f"{'Shuffle R MB':>14}{'Shuffle W MB':>14}{'Spill MB':>10}")
+        print("-" * 92)
+        for step in report['steps']:
+            t = step['totals']
+            spill = (t['memoryBytesSpilled'] or 0) + (t['diskBytesSpilled'] or 0)
+            print(f"{step['name'][:23]:<24}{step['wall_seconds']:>8.2f}{len(step['jobs']):>6}"
+                  f"{len(step['stages']):>8}{t['numTasks']:>8}"
+                  f"{t['shuffleReadBytes'] / 1e6:>14.1f}{t['shuffleWriteBytes'] / 1e6:>14.1f}{spill / 1e6:>10.1f}")
+
+        stages = [dict(stage, step=step['name']) for step in report['steps'] for stage in step['stages']
+                  if stage.get('wall_seconds') is not None]
+        stages.sort(key=lambda s: s['wall_seconds'], reverse=True)
+
+        print(f"\nSlowest Stages:")
+        for stage in stages[:top_stages]:
+            print(f"  - [{stage['step']}] stage {stage['stage_id']}: {stage['wall_seconds']:.2f}s, "
+                  f"{stage['numTasks']} tasks, {stage['inputRecords']:,} input rows, "
+                  f"shuffle {stage['shuffleReadBytes'] / 1e6:.1f}/{stage['shuffleWriteBytes'] / 1e6:.1f} MB r/w")
+            print(f"    {stage['name'][:90]}")
+        if not stages:
+            print("  (stage timings unavailable: Spark UI/REST API disabled)")
+
+        print("\n" + "="*70)
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from trip_features import FEATURE_COLUMNS, ZONE_COLUMNS, add_trip_features
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -120,23 +121,10 @@ class MobilityDataAnalyzer:
         print("FEATURE ENGINEERING")
         print("="*60)
         
-        df = self.cleaned_data.copy()
-        
-        # Time-based features
-        print("\n1. Creating Time-Based Features")
-        
-        # Store pickup_datetime as datetime before extracting features
-        pickup_datetime = pd.to_datetime(df['tpep_pickup_datetime'])
-        
-        df['hour_of_day'] = pickup_datetime.dt.hour
-        df['day_of_week'] = pickup_datetime.dt.dayofweek  # 0=Monday, 6=Sunday
-        df['day_name'] = pickup_datetime.dt.day_name()
-        df['month'] = pickup_datetime.dt.month
-        df['month_name'] = pickup_datetime.dt.month_name()
-        df['quarter'] = ((pickup_datetime.dt.month - 1) // 3) + 1
-        df['year'] = pickup_datetime.dt.year
-        df['date'] = pickup_datetime.dt.date
+        # Shared vectorized implementation (also runs in Spark via mapInPandas)
+        df = add_trip_features(self.cleaned_data)
         
+        print("\n1. Time-Based Features")
         print(f"   ✓ hour_of_day (0-23)")
         print(f"   ✓ day_of_week (0=Monday, 6=Sunday)")
         print(f"   ✓ day_name")
@@ -146,46 +134,17 @@ class MobilityDataAnalyzer:
         print(f"   ✓ year")
         print(f"   ✓ date")
         
-        # Analytical features
-        print("\n2. Creating Analytical Features")
-        
-        # Trip duration in minutes
-        df['trip_duration_min'] = (df['tpep_dropoff_datetime'] - df['tpep_pickup_datetime']).dt.total_seconds() / 60 # type: ignore
+        print("\n2. Analytical Features")
         print(f"   ✓ trip_duration_min")
-        
-        # Tip percentage
-        df['tip_percentage'] = (df['tip_amount'] / df['fare_amount'] * 100).round(2)
-        df['tip_percentage'] = df['tip_percentage'].clip(0, 100)  # Cap at 100%
-        print(f"   ✓ tip_percentage")
-        
-        # Revenue per mile
-        df['revenue_per_mile'] = (df['total_amount'] / df['trip_distance']).round(2)
+        print(f"   ✓ tip_percentage (capped at 100%)")
         print(f"   ✓ revenue_per_mile")
-        
-        # Peak hours indicator (7-9 AM and 5-7 PM)
-        df['is_peak_hour'] = df['hour_of_day'].isin([7, 8, 9, 17, 18, 19]).astype(int)
         print(f"   ✓ is_peak_hour (1=peak, 0=off-peak)")
-        
-        # Weekend indicator
-        df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
         print(f"   ✓ is_weekend (1=weekend, 0=weekday)")
-        
-        # Time of day category
-        def categorize_time(hour):
-            if 6 <= hour < 12:
-                return 'Morning'
-            elif 12 <= hour < 17:
-                return 'Afternoon'
-            elif 17 <= hour < 21:
-                return 'Evening'
-            else:
-                return 'Night'
-        
-        df['time_of_day'] = df['hour_of_day'].apply(categorize_time)
         print(f"   ✓ time_of_day (Morning/Afternoon/Evening/Night)")
+        print(f"   ✓ pickup_zone, dropoff_zone (grid cell lookup)")
         
         print(f"\n" + "="*60)
-        print(f"Total Features Created: 15")
+        print(f"Total Features Created: {len(FEATURE_COLUMNS) + len(ZONE_COLUMNS)}")
         print(f"Total Columns in Dataset: {len(df.columns)}")
         print(f"="*60 + "\n")
         
@@ -3,6 +3,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from datetime import datetime
+from kpi_bundle import kpi_payloads_from_trips, write_kpi_bundle
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -256,6 +257,14 @@ class KPIAnalyzer:
         print("✓ All visualizations generated successfully!")
         print("="*70 + "\n")
 
+    def export_kpi_bundle(self, bundle_dir='kpi_data'):
+        """Publish the API's per-endpoint KPI payloads"""
+        print("\n" + "="*70)
+        print("EXPORTING API KPI BUNDLE")
+        print("="*70)
+        return write_kpi_bundle(kpi_payloads_from_trips(self.data), bundle_dir,
+                                source='pandas', row_count=len(self.data))
+
 
 # USAGE EXAMPLE
 if __name__ == "__main__":
@@ -277,4 +286,7 @@ if __name__ == "__main__":
     # Generate visualizations
     kpi_analyzer.generate_all_visualizations()
     
+    # Publish the precomputed payloads the serverless API serves
+    kpi_analyzer.export_kpi_bundle('kpi_data')
+    
     print("\n✓ KPI analysis complete! Ready for SQL analytics.")
\ No newline at end of file
@@ -1,6 +1,7 @@
 import pandas as pd
 import sqlite3
 from datetime import datetime
+from zone_lookup import lookup_zones
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -35,6 +36,10 @@ class SQLAnalyticsEngine:
             print(f"\nLoading data from {csv_file} into SQL database...")
             df = pd.read_csv(csv_file)
             
+            # Older cleaned exports predate the zone columns
+            if 'pickup_zone' not in df.columns:
+                df['pickup_zone'] = lookup_zones(df['pickup_latitude'], df['pickup_longitude'])
+            
             # Load into SQL table
             df.to_sql('taxi_trips', self.conn, if_exists='replace', index=False)
             
@@ -99,15 +104,10 @@ class SQLAnalyticsEngine:
         """
         self.execute_query("Peak Demand Hours", query1)
         
-        # Query 2: Revenue by Pickup Zone (using lat/long approximation)
+        # Query 2: Revenue by Pickup Zone (zones from the gridded zone lookup)
         query2 = """
         SELECT 
-            CASE 
-                WHEN pickup_latitude BETWEEN 40.75 AND 40.78 THEN 'Midtown'
-                WHEN pickup_latitude BETWEEN 40.70 AND 40.75 THEN 'Lower Manhattan'
-                WHEN pickup_latitude BETWEEN 40.78 AND 40.82 THEN 'Upper Manhattan'
-                ELSE 'Other'
-            END as pickup_zone,
+            pickup_zone,
             COUNT(*) as trip_count,
             ROUND(SUM(total_amount), 2) as total_revenue,
             ROUND(AVG(total_amount), 2) as avg_revenue_per_trip
@@ -2,57 +2,184 @@ from pyspark.sql import SparkSession
 from pyspark.sql.functions import *
 from pyspark.sql.window import Window
 from pyspark.sql.types import *
+import numpy as np
+import pandas as pd
+import builtins  # pyspark.sql.functions shadows sum/max/min/round
+import csv
+import glob
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from kpi_bundle import build_payloads, write_kpi_bundle
+from kpi_query import CUBE_FILE, UNKNOWN_PAYMENT_TYPE, kpi_cube_from_aggregates
+from spark_instrumentation import SparkRunInstrumentation
+from trip_features import FEATURE_COLUMNS, ZONE_COLUMNS, add_trip_features, add_trip_features_batches
+from zone_lookup import (GRID_CELL_DEG, GRID_LAT_MIN, GRID_LON_MIN, N_LAT_CELLS,
+                         N_LON_CELLS, ZONE_NAMES, zone_dimension_rows)
 import warnings
 warnings.filterwarnings('ignore')
 
+# Trip lake layout: directory partitions for pruning, in-file sort for min/max skipping
+LAKE_PARTITION_COLUMNS = ["year", "month", "date"]
+LAKE_SORT_COLUMNS = ["pickup_zone", "hour"]
+DEFAULT_LAKE_BYTES_PER_ROW = 48  # snappy Parquet estimate used before a lake exists
+INCREMENTAL_KPIS = ["monthly_revenue", "zone_demand", "peak_hour_analysis", "dow_performance"]
+
+# Raw yellow_tripdata columns, shared by batch and streaming readers
+RAW_TRIP_SCHEMA = StructType([
+    StructField("VendorID", IntegerType(), True),
+    StructField("tpep_pickup_datetime", StringType(), True),
+    StructField("tpep_dropoff_datetime", StringType(), True),
+    StructField("passenger_count", DoubleType(), True),
+    StructField("trip_distance", DoubleType(), True),
+    StructField("pickup_longitude", DoubleType(), True),
+    StructField("pickup_latitude", DoubleType(), True),
+    StructField("RateCodeID", IntegerType(), True),
+    StructField("store_and_fwd_flag", StringType(), True),
+    StructField("dropoff_longitude", DoubleType(), True),
+    StructField("dropoff_latitude", DoubleType(), True),
+    StructField("payment_type", IntegerType(), True),
+    StructField("fare_amount", DoubleType(), True),
+    StructField("extra", DoubleType(), True),
+    StructField("mta_tax", DoubleType(), True),
+    StructField("tip_amount", DoubleType(), True),
+    StructField("tolls_amount", DoubleType(), True),
+    StructField("improvement_surcharge", DoubleType(), True),
+    StructField("total_amount", DoubleType(), True)
+])
+
+# Spark types of the shared pandas features (trip_features.FEATURE_COLUMNS)
+FEATURE_SPARK_TYPES = {
+    'hour_of_day': IntegerType(), 'day_of_week': IntegerType(), 'day_name': StringType(),
+    'month': IntegerType(), 'month_name': StringType(), 'quarter': IntegerType(),
+    'year': IntegerType(), 'date': DateType(), 'trip_duration_min': DoubleType(),
+    'tip_percentage': DoubleType(), 'revenue_per_mile': DoubleType(), 'is_peak_hour': IntegerType(),
+    'is_weekend': IntegerType(), 'time_of_day': StringType()
+}
+
+# Tuning profiles: static memory settings plus rules for sizing shuffle partitions
+TUNING_PROFILES = {
+    'local': {
+        'driver_memory': '2g', 'memory_fraction': 0.6, 'storage_fraction': 0.5,
+        'target_partition_mb': 32, 'partitions_per_core': 2, 'skew_factor': 5, 'adaptive': True
+    },
+    'balanced': {
+        'driver_memory': '4g', 'memory_fraction': 0.6, 'storage_fraction': 0.5,
+        'target_partition_mb': 64, 'partitions_per_core': 2, 'skew_factor': 5, 'adaptive': True
+    },
+    'large': {
+        'driver_memory': '8g', 'memory_fraction': 0.75, 'storage_fraction': 0.3,
+        'target_partition_mb': 128, 'partitions_per_core': 3, 'skew_factor': 4, 'adaptive': True
+    },
+    # Previous hard-coded settings, kept for comparison benchmarks
+    'legacy': {
+        'driver_memory': '4g', 'memory_fraction': 0.6, 'storage_fraction': 0.5,
+        'target_partition_mb': 64, 'partitions_per_core': 2, 'skew_factor': 5, 'adaptive': False,
+        'shuffle_partitions': 8
+    },
+}
+
+
+def input_size_bytes(input_path):
+    """Total size of a file, directory or glob of input files (0 if unknown)"""
+    if not input_path:
+        return 0
+    paths = input_path if isinstance(input_path, (list, tuple)) else [input_path]
+    total = 0
+    for path in paths:
+        for match in glob.glob(path):
+            if os.path.isdir(match):
+                for root, _, files in os.walk(match):
+                    total += builtins.sum(os.path.getsize(os.path.join(root, f)) for f in files)
+            else:
+                total += os.path.getsize(match)
+    return total
+
+
+def choose_shuffle_partitions(input_bytes, cores, target_partition_mb=64, partitions_per_core=2,
+                              max_partitions=2000):
+    """Size shuffle partitions from input volume, never below a few waves per core"""
+    by_size = int(math.ceil(input_bytes / (target_partition_mb * 1024 * 1024)))
+    by_cores = cores * partitions_per_core
+    partitions = builtins.min(builtins.max(by_size, by_cores, 1), max_partitions)
+    # Round up to whole waves so no core idles on the last wave
+    return int(math.ceil(partitions / cores) * cores)
+
+
+def resolve_tuning(input_path=None, profile="balanced", **overrides):
+    """Merge a named profile with overrides and derive the shuffle partition count"""
+    if profile not in TUNING_PROFILES:
+        raise ValueError(f"Unknown tuning profile '{profile}' (choose from {list(TUNING_PROFILES)})")
+
+    tuning = dict(TUNING_PROFILES[profile])
+    tuning.update(overrides)
+    tuning.setdefault('cores', os.cpu_count() or 1)
+    tuning.setdefault('input_bytes', input_size_bytes(input_path))
+    tuning.setdefault('shuffle_partitions', choose_shuffle_partitions(
+        tuning['input_bytes'], tuning['cores'],
+        tuning['target_partition_mb'], tuning['partitions_per_core']))
+    return tuning
+
+
 class PySparkETLPipeline:
     """
     Scalable ETL Pipeline for Urban Mobility Data using PySpark
     """
     
-    def __init__(self, app_name="TaxiETL"):
+    def __init__(self, app_name="TaxiETL", input_path=None, profile="balanced", **overrides):
         print("Initializing PySpark Session...")
+        self.tuning = resolve_tuning(input_path, profile, **overrides)
+        
         self.spark = SparkSession.builder \
             .appName(app_name) \
-            .config("spark.driver.memory", "4g") \
-            .config("spark.sql.shuffle.partitions", "8") \
+            .config("spark.driver.memory", self.tuning['driver_memory']) \
+            .config("spark.memory.fraction", str(self.tuning['memory_fraction'])) \
+            .config("spark.memory.storageFraction", str(self.tuning['storage_fraction'])) \
             .getOrCreate()
+        self.apply_runtime_tuning(self.tuning)
+        self.instrumentation = SparkRunInstrumentation(self.spark)
+        self._zone_dim = None
         
         # Set log level to reduce verbosity
         self.spark.sparkContext.setLogLevel("ERROR")
         print(f"✓ Spark Session Created: {app_name}")
         print(f"  Spark Version: {self.spark.version}")
+        print(f"  Tuning Profile: {profile} ({self.tuning['cores']} cores, "
+              f"{self.tuning['input_bytes'] / 1024 / 1024:,.0f} MB input)")
+        print(f"  Shuffle Partitions: {self.tuning['shuffle_partitions']} (AQE: "
+              f"{'on' if self.tuning['adaptive'] else 'off'})")
+        
+    def apply_runtime_tuning(self, tuning):
+        """Apply session-level SQL settings (safe to change on a running session)"""
+        advisory_bytes = tuning['target_partition_mb'] * 1024 * 1024
+        settings = {
+            "spark.sql.shuffle.partitions": tuning['shuffle_partitions'],
+            "spark.sql.adaptive.enabled": tuning['adaptive'],
+            # Start from the sized partition count and let AQE merge small ones
+            "spark.sql.adaptive.coalescePartitions.enabled": tuning['adaptive'],
+            "spark.sql.adaptive.coalescePartitions.initialPartitionNum": tuning['shuffle_partitions'],
+            "spark.sql.adaptive.advisoryPartitionSizeInBytes": advisory_bytes,
+            # Split oversized join partitions (e.g. the "Other"/Midtown zone keys)
+            "spark.sql.adaptive.skewJoin.enabled": tuning['adaptive'],
+            "spark.sql.adaptive.skewJoin.skewedPartitionFactor": tuning['skew_factor'],
+            "spark.sql.adaptive.skewJoin.skewedPartitionThresholdInBytes": advisory_bytes,
+        }
+        for key, value in settings.items():
+            self.spark.conf.set(key, str(value).lower() if isinstance(value, bool) else str(value))
+        self.tuning = tuning
         
     def load_data(self, file_path):
         """Load CSV data into Spark DataFrame"""
         print(f"\nLoading data from: {file_path}")
         
-        # Define schema for better performance
-        schema = StructType([
-            StructField("VendorID", IntegerType(), True),
-            StructField("tpep_pickup_datetime", StringType(), True),
-            StructField("tpep_dropoff_datetime", StringType(), True),
-            StructField("passenger_count", DoubleType(), True),
-            StructField("trip_distance", DoubleType(), True),
-            StructField("pickup_longitude", DoubleType(), True),
-            StructField("pickup_latitude", DoubleType(), True),
-            StructField("RateCodeID", IntegerType(), True),
-            StructField("store_and_fwd_flag", StringType(), True),
-            StructField("dropoff_longitude", DoubleType(), True),
-            StructField("dropoff_latitude", DoubleType(), True),
-            StructField("payment_type", IntegerType(), True),
-            StructField("fare_amount", DoubleType(), True),
-            StructField("extra", DoubleType(), True),
-            StructField("mta_tax", DoubleType(), True),
-            StructField("tip_amount", DoubleType(), True),
-            StructField("tolls_amount", DoubleType(), True),
-            StructField("improvement_surcharge", DoubleType(), True),
-            StructField("total_amount", DoubleType(), True)
-        ])
-        
+        # Explicit schema for better performance (no inference pass)
         df = self.spark.read \
             .option("header", "true") \
-            .schema(schema) \
+            .schema(RAW_TRIP_SCHEMA) \
             .csv(file_path)
         
         print(f"✓ Loaded {df.count():,} records")
@@ -69,16 +196,9 @@ class PySparkETLPipeline:
         initial_count = df.count()
         print(f"\n1. Initial Record Count: {initial_count:,}")
         
-        # Convert timestamp columns
-        df = df.withColumn("pickup_datetime", to_timestamp("tpep_pickup_datetime")) \
-               .withColumn("dropoff_datetime", to_timestamp("tpep_dropoff_datetime"))
-        
         # Data Quality Filters
         print("\n2. Applying Data Quality Filters")
-        df = df.filter(col("trip_distance") > 0) \
-               .filter(col("fare_amount") > 0) \
-               .filter(col("total_amount") > 0) \
-               .filter(col("dropoff_datetime") > col("pickup_datetime"))
+        df = self._apply_quality_filters(self._parse_timestamps(df))
         
         clean_count = df.count()
         removed = initial_count - clean_count
@@ -87,53 +207,206 @@ class PySparkETLPipeline:
         
         # Feature Engineering
         print("\n3. Feature Engineering")
+        df = self._add_features(df)
         
-        # Time-based features
-        df = df.withColumn("hour", hour("pickup_datetime")) \
-               .withColumn("day_of_week", dayofweek("pickup_datetime")) \
-               .withColumn("month", month("pickup_datetime")) \
-               .withColumn("year", year("pickup_datetime")) \
-               .withColumn("date", to_date("pickup_datetime"))
-        
-        print("   ✓ Time-based features: hour, day_of_week, month, year, date")
-        
-        # Trip duration
-        df = df.withColumn("trip_duration_min", 
-                          (unix_timestamp("dropoff_datetime") - unix_timestamp("pickup_datetime")) / 60)
-        
-        # Tip percentage
-        df = df.withColumn("tip_percentage", 
-                          round((col("tip_amount") / col("fare_amount")) * 100, 2))
-        
-        # Revenue per mile
-        df = df.withColumn("revenue_per_mile", 
-                          round(col("total_amount") / col("trip_distance"), 2))
-        
-        # Peak hour indicator
-        df = df.withColumn("is_peak_hour", 
-                          when(col("hour").isin([7,8,9,17,18,19]), 1).otherwise(0))
-        
-        # Weekend indicator
-        df = df.withColumn("is_weekend", 
-                          when(col("day_of_week").isin([1,7]), 1).otherwise(0))
-        
-        # Zone classification (simplified)
-        df = df.withColumn("pickup_zone",
-                          when((col("pickup_latitude") >= 40.75) & (col("pickup_latitude") < 40.78), "Midtown")
-                          .when((col("pickup_latitude") >= 40.70) & (col("pickup_latitude") < 40.75), "Lower Manhattan")
-                          .when((col("pickup_latitude") >= 40.78) & (col("pickup_latitude") < 40.82), "Upper Manhattan")
-                          .otherwise("Other"))
-        
-        print("   ✓ Analytical features: trip_duration_min, tip_percentage, revenue_per_mile")
-        print("   ✓ Indicator features: is_peak_hour, is_weekend")
-        print("   ✓ Zone classification: pickup_zone")
+        print("   ✓ Shared vectorized features (mapInPandas): " + ", ".join(FEATURE_COLUMNS))
+        print("   ✓ Zone classification: pickup_zone, dropoff_zone (broadcast grid lookup)")
         
         print(f"\n4. Final Transformed Dataset")
         print(f"   Records: {df.count():,}")
         print(f"   Columns: {len(df.columns)}")
+
+        return df
+
+    def transform_trips(self, df):
+        """Cleaning and feature engineering without actions (batch or streaming)"""
+        return self._add_features(self._apply_quality_filters(self._parse_timestamps(df)))
+
+    @staticmethod
+    def _parse_timestamps(df):
+        return df.withColumn("pickup_datetime", to_timestamp("tpep_pickup_datetime")) \
+                 .withColumn("dropoff_datetime", to_timestamp("tpep_dropoff_datetime"))
+
+    @staticmethod
+    def _apply_quality_filters(df):
+        return df.filter(col("trip_distance") > 0) \
+                 .filter(col("fare_amount") > 0) \
+                 .filter(col("total_amount") > 0) \
+                 .filter(col("dropoff_datetime") > col("pickup_datetime"))
+
+    def _add_features(self, df):
+        """Shared vectorized features (trip_features.py) as a mapInPandas stage over Arrow batches"""
+        df = df.mapInPandas(add_trip_features_batches, self._feature_schema(df.schema))
+        
+        # `hour` kept as an alias so KPI and lake outputs keep their column names
+        df = df.withColumn("hour", col("hour_of_day"))
+        
+        # Zone classification: O(1) grid-cell lookup via broadcast join
+        df = self._add_zones(df)
         
         return df
-    
+
+    @staticmethod
+    def _feature_schema(input_schema):
+        return StructType(input_schema.fields + [
+            StructField(name, FEATURE_SPARK_TYPES[name], True) for name in FEATURE_COLUMNS
+        ])
+
+    def _add_zones(self, df):
+        """Attach pickup_zone/dropoff_zone by broadcast-joining the gridded zone dimension"""
+        if self._zone_dim is None:
+            self._zone_dim = self.spark.createDataFrame(
+                zone_dimension_rows(), "cell_id INT, zone STRING").cache()
+
+        for prefix in ("pickup", "dropoff"):
+            zones = self._zone_dim.select(col("cell_id").alias(f"{prefix}_cell"),
+                                          col("zone").alias(f"{prefix}_zone_name"))
+            df = df.withColumn(f"{prefix}_cell",
+                               self._cell_id_col(f"{prefix}_latitude", f"{prefix}_longitude")) \
+                   .join(broadcast(zones), f"{prefix}_cell", "left") \
+                   .withColumn(f"{prefix}_zone", coalesce(col(f"{prefix}_zone_name"), lit(ZONE_NAMES[0]))) \
+                   .drop(f"{prefix}_cell", f"{prefix}_zone_name")
+        return df
+
+    @staticmethod
+    def _cell_id_col(lat_column, lon_column):
+        """Spark expression mirroring zone_lookup.cell_ids"""
+        lat_idx = floor((col(lat_column) - GRID_LAT_MIN) / GRID_CELL_DEG)
+        lon_idx = floor((col(lon_column) - GRID_LON_MIN) / GRID_CELL_DEG)
+        in_grid = lat_idx.between(0, N_LAT_CELLS - 1) & lon_idx.between(0, N_LON_CELLS - 1)
+        return when(in_grid, (lat_idx * N_LON_CELLS + lon_idx).cast("int")).otherwise(lit(-1))
+
+    def write_trip_lake(self, df, output_path="output/trips_lake", target_file_size_mb=128,
+                        bytes_per_row=None):
+        """Persist cleaned trips as a year/month/date partitioned, sorted Parquet lake"""
+        print("\n" + "="*70)
+        print("PYSPARK: PARTITIONED PARQUET TRIP LAKE")
+        print("="*70)
+
+        target_bytes = target_file_size_mb * 1024 * 1024
+        if bytes_per_row is None:
+            bytes_per_row = self._estimate_lake_bytes_per_row(output_path)
+        max_records = builtins.max(int(target_bytes / bytes_per_row), 1)
+
+        print(f"\n1. Layout")
+        print(f"   Partitions: {'/'.join(LAKE_PARTITION_COLUMNS)}")
+        print(f"   Sorted within files by: {', '.join(LAKE_SORT_COLUMNS)}")
+        print(f"   Target file size: {target_file_size_mb} MB (~{max_records:,} rows/file)")
+
+        # One task per date keeps each partition in few files; the in-file sort
+        # gives tight pickup_zone/hour min-max statistics for data skipping
+        lake_df = df.repartition(*LAKE_PARTITION_COLUMNS) \
+            .sortWithinPartitions(*LAKE_PARTITION_COLUMNS, *LAKE_SORT_COLUMNS)
+
+        lake_df.write \
+            .mode("overwrite") \
+            .option("partitionOverwriteMode", "dynamic") \
+            .option("maxRecordsPerFile", max_records) \
+            .option("compression", "snappy") \
+            .partitionBy(*LAKE_PARTITION_COLUMNS) \
+            .parquet(output_path)
+
+        partitions = self._lake_partition_files(output_path)
+        file_count = builtins.sum(len(files) for files in partitions.values())
+        total_bytes = builtins.sum(size for files in partitions.values() for _, size in files)
+        print(f"\n2. Written")
+        print(f"   ✓ Saved to: {output_path}")
+        print(f"   ✓ Partitions: {len(partitions):,}")
+        print(f"   ✓ Files: {file_count:,} ({total_bytes / 1024 / 1024:.1f} MB)")
+
+        return output_path
+
+    def compact_trip_lake(self, output_path="output/trips_lake", target_file_size_mb=128,
+                          min_file_size_mb=None):
+        """Rewrite partitions made of small files into fewer target-sized, sorted files"""
+        print("\n" + "="*70)
+        print("PYSPARK: TRIP LAKE COMPACTION")
+        print("="*70)
+
+        target_bytes = target_file_size_mb * 1024 * 1024
+        min_bytes = (min_file_size_mb * 1024 * 1024) if min_file_size_mb else target_bytes / 4
+
+        stats = {'partitions_scanned': 0, 'partitions_compacted': 0,
+                 'files_before': 0, 'files_after': 0}
+
+        for partition_dir, files in self._lake_partition_files(output_path).items():
+            stats['partitions_scanned'] += 1
+            stats['files_before'] += len(files)
+
+            small_files = [f for f, size in files if size < min_bytes]
+            if len(files) <= 1 or not small_files:
+                stats['files_after'] += len(files)
+                continue
+
+            total_bytes = builtins.sum(size for _, size in files)
+            n_files = builtins.max(int(math.ceil(total_bytes / target_bytes)), 1)
+
+            # Write beside the partition under a hidden name, then swap directories;
+            # a failed write or swap leaves the original partition in place
+            staged_dir = self._staging_path(partition_dir)
+            try:
+                self.spark.read.parquet(partition_dir) \
+                    .coalesce(n_files) \
+                    .sortWithinPartitions(*LAKE_SORT_COLUMNS) \
+                    .write.mode("overwrite") \
+                    .option("compression", "snappy") \
+                    .parquet(staged_dir)
+                self._atomic_replace_dir(staged_dir, partition_dir)
+            finally:
+                shutil.rmtree(staged_dir, ignore_errors=True)
+
+            stats['partitions_compacted'] += 1
+            stats['files_after'] += len(self._parquet_files(partition_dir))
+
+        print(f"\n   Partitions scanned:   {stats['partitions_scanned']:,}")
+        print(f"   Partitions compacted: {stats['partitions_compacted']:,}")
+        print(f"   Files: {stats['files_before']:,} → {stats['files_after']:,}")
+        print("   ✓ Compaction complete")
+
+        return stats
+
+    def load_trip_lake(self, lake_path="output/trips_lake", start_date=None, end_date=None):
+        """Load cleaned trips from the Parquet lake, pruning date partitions"""
+        print(f"\nLoading trip lake from: {lake_path}")
+
+        df = self.spark.read.parquet(lake_path)
+        if start_date:
+            df = df.filter(col("date") >= lit(start_date).cast("date"))
+        if end_date:
+            df = df.filter(col("date") <= lit(end_date).cast("date"))
+
+        return df
+
+    def _estimate_lake_bytes_per_row(self, lake_path):
+        """Average on-disk bytes per row of an existing lake (metadata-only count)"""
+        partitions = self._lake_partition_files(lake_path)
+        total_bytes = builtins.sum(size for files in partitions.values() for _, size in files)
+        if total_bytes == 0:
+            return DEFAULT_LAKE_BYTES_PER_ROW
+
+        rows = self.spark.read.parquet(lake_path).count()
+        return total_bytes / rows if rows else DEFAULT_LAKE_BYTES_PER_ROW
+
+    def _lake_partition_files(self, lake_path):
+        """Map each leaf partition directory to its (file, size) Parquet parts"""
+        partitions = {}
+        if not os.path.isdir(lake_path):
+            return partitions
+
+        for root, dirs, _ in os.walk(lake_path):
+            # Skip hidden/temporary directories, same as Spark's file index
+            dirs[:] = [d for d in dirs if not d.startswith(('.', '_'))]
+            files = self._parquet_files(root)
+            if files:
+                partitions[root] = [(f, os.path.getsize(f)) for f in files]
+
+        return partitions
+
+    @staticmethod
+    def _parquet_files(directory):
+        return [os.path.join(directory, f) for f in sorted(os.listdir(directory))
+                if f.endswith(".parquet") and not f.startswith(('.', '_'))]
+
     def compute_kpis(self, df):
         """Compute KPIs at scale"""
         print("\n" + "="*70)
@@ -224,7 +497,311 @@ class PySparkETLPipeline:
         print("\n" + "="*70)
         print("✓ All KPIs computed and saved to Parquet format")
         print("="*70)
-    
+
+    def run_incremental(self, input_dir, output_dir="output", manifest_path=None, rebuild_state=False):
+        """
+        Process only new input files and merge their partial KPIs into existing outputs
+        rebuild_state=True discards the manifest and state and rebuilds both from every
+        file in input_dir (required once when output_dir holds compute_kpis() results)
+        """
+        print("\n" + "="*70)
+        print("PYSPARK: INCREMENTAL KPI COMPUTATION")
+        print("="*70)
+
+        state_dir = os.path.join(output_dir, "_incremental")
+        manifest_path = manifest_path or os.path.join(state_dir, "manifest.json")
+        manifest = {'files': {}} if rebuild_state else self._load_manifest(manifest_path)
+
+        # KPIs from a full compute_kpis() run have no mergeable state; publishing
+        # partials from new files alone would overwrite the full-history results
+        unseeded = [name for name in INCREMENTAL_KPIS
+                    if os.path.isdir(os.path.join(output_dir, f"{name}.parquet"))
+                    and not os.path.isdir(os.path.join(state_dir, "state", f"{name}.parquet"))]
+        if unseeded and not rebuild_state:
+            print(f"   ✗ {', '.join(unseeded)} exist in {output_dir} without incremental state")
+            raise RuntimeError(
+                f"No incremental state for existing KPI outputs in {output_dir}; run once with "
+                f"rebuild_state=True over an input_dir holding the full history")
+
+        # Input files are treated as append-only: a processed file that changed
+        # cannot be merged again without double counting
+        new_files, changed_files = [], []
+        for path in sorted(glob.glob(os.path.join(input_dir, "*.csv"))):
+            stat = os.stat(path)
+            seen = manifest['files'].get(path)
+            if seen is None:
+                new_files.append((path, stat))
+            elif seen['size'] != stat.st_size or seen['mtime'] != stat.st_mtime:
+                changed_files.append(path)
+
+        print(f"\n1. Input Manifest")
+        print(f"   Already processed: {len(manifest['files']):,} files")
+        print(f"   New: {len(new_files):,} files")
+        for path in changed_files:
+            print(f"   ⚠ Skipping modified file (full rebuild required): {path}")
+
+        if not new_files:
+            print("\n✓ KPIs already up to date")
+            return {'new_files': 0, 'changed_files': len(changed_files)}
+
+        raw_df = self.spark.read \
+            .option("header", "true") \
+            .schema(RAW_TRIP_SCHEMA) \
+            .csv([path for path, _ in new_files])
+        trips = self.transform_trips(raw_df)
+
+        # Merge additive partials (counts and sums) into the stored state, staging
+        # every rewritten directory before anything visible is replaced
+        print(f"\n2. Merging Partial Aggregates")
+        staged = []
+        for name, (keys, partial_df) in self._kpi_partials(trips).items():
+            state_path = os.path.join(state_dir, "state", f"{name}.parquet")
+            merged = partial_df
+            if os.path.isdir(state_path) and not rebuild_state:
+                sum_cols = [c for c in partial_df.columns if c not in keys]
+                merged = self.spark.read.parquet(state_path) \
+                    .unionByName(partial_df) \
+                    .groupBy(*keys) \
+                    .agg(*[sum(c).alias(c) for c in sum_cols])
+
+            staged_state = self._staging_path(state_path)
+            merged.write.mode("overwrite").parquet(staged_state)
+
+            kpi_path = os.path.join(output_dir, f"{name}.parquet")
+            staged_kpi = self._staging_path(kpi_path)
+            self._finalize_kpi(name, self.spark.read.parquet(staged_state)) \
+                .write.mode("overwrite").parquet(staged_kpi)
+
+            staged.extend([(staged_state, state_path), (staged_kpi, kpi_path)])
+            print(f"   ✓ {name}")
+
+        print(f"\n3. Publishing")
+        for staged_path, final_path in staged:
+            self._atomic_replace_dir(staged_path, final_path)
+            print(f"   ✓ Replaced: {final_path}")
+
+        # The manifest is written last so a failed run simply reprocesses its files
+        processed_at = datetime.now().isoformat()
+        for path, stat in new_files:
+            manifest['files'][path] = {'size': stat.st_size, 'mtime': stat.st_mtime,
+                                       'processed_at': processed_at}
+        self._save_manifest(manifest, manifest_path)
+        print(f"   ✓ Manifest updated: {manifest_path}")
+
+        print("\n   Note: high_value_segments depends on the global average fare and is")
+        print("   only produced by the full compute_kpis() run")
+
+        return {'new_files': len(new_files), 'changed_files': len(changed_files)}
+
+    def _kpi_partials(self, df):
+        """Additive per-key partial aggregates that can be merged across runs"""
+        return {
+            'monthly_revenue': (["year", "month"], df.groupBy("year", "month").agg(
+                count("*").alias("trip_count"),
+                sum("total_amount").alias("revenue_sum"))),
+            'zone_demand': (["pickup_zone"], df.groupBy("pickup_zone").agg(
+                count("*").alias("trip_count"),
+                sum("total_amount").alias("revenue_sum"),
+                sum("trip_distance").alias("distance_sum"))),
+            'peak_hour_analysis': (["hour", "is_peak_hour"], df.groupBy("hour", "is_peak_hour").agg(
+                count("*").alias("trip_count"),
+                sum("trip_duration_min").alias("duration_sum"),
+                sum("total_amount").alias("fare_sum"))),
+            'dow_performance': (["day_of_week", "is_weekend"], df.groupBy("day_of_week", "is_weekend").agg(
+                count("*").alias("trip_count"),
+                sum("total_amount").alias("revenue_sum"),
+                sum("tip_percentage").alias("tip_pct_sum"),
+                count("tip_percentage").alias("tip_pct_count"))),
+        }
+
+    @staticmethod
+    def _finalize_kpi(name, state):
+        """Rebuild the compute_kpis() output columns from merged sums and counts"""
+        if name == 'monthly_revenue':
+            return state.select(
+                "year", "month", "trip_count",
+                round(col("revenue_sum"), 2).alias("total_revenue"),
+                round(col("revenue_sum") / col("trip_count"), 2).alias("avg_revenue_per_trip")
+            ).orderBy("year", "month")
+        if name == 'zone_demand':
+            return state.select(
+                "pickup_zone", "trip_count",
+                round(col("revenue_sum"), 2).alias("total_revenue"),
+                round(col("distance_sum") / col("trip_count"), 2).alias("avg_distance")
+            ).orderBy(desc("trip_count"))
+        if name == 'peak_hour_analysis':
+            return state.select(
+                "hour", "is_peak_hour", "trip_count",
+                round(col("duration_sum") / col("trip_count"), 2).alias("avg_duration"),
+                round(col("fare_sum") / col("trip_count"), 2).alias("avg_fare")
+            ).orderBy("hour")
+        if name == 'dow_performance':
+            return state.select(
+                "day_of_week", "is_weekend", "trip_count",
+                round(col("revenue_sum"), 2).alias("revenue"),
+                round(col("revenue_sum") / col("trip_count"), 2).alias("avg_fare"),
+                round(col("tip_pct_sum") / col("tip_pct_count"), 2).alias("avg_tip_pct")
+            ).orderBy("day_of_week")
+        raise ValueError(f"Unknown incremental KPI: {name}")
+
+    @staticmethod
+    def _load_manifest(manifest_path):
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                return json.load(f)
+        return {'files': {}}
+
+    @staticmethod
+    def _save_manifest(manifest, manifest_path):
+        os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    @staticmethod
+    def _staging_path(final_path):
+        parent, name = os.path.split(final_path)
+        return os.path.join(parent, f".{name}.staging")
+
+    @staticmethod
+    def _atomic_replace_dir(staged_path, final_path):
+        """Swap a fully written directory into place (rename-based, same filesystem)"""
+        parent, name = os.path.split(final_path)
+        old_path = os.path.join(parent, f".{name}.old")
+        if os.path.exists(old_path):
+            shutil.rmtree(old_path)
+        if os.path.exists(final_path):
+            os.rename(final_path, old_path)
+        try:
+            os.rename(staged_path, final_path)
+        except OSError:
+            # Put the previous version back rather than leave nothing at final_path
+            if os.path.exists(old_path) and not os.path.exists(final_path):
+                os.rename(old_path, final_path)
+            raise
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    def export_kpi_bundle(self, output_dir="output", bundle_dir="kpi_data", trips=None):
+        """
+        Publish the API's per-endpoint KPI payloads from the KPI Parquet outputs;
+        with cleaned trips also aggregate the /kpis date x hour x zone x payment cube
+        """
+        print("\n" + "="*70)
+        print("PYSPARK: EXPORTING API KPI BUNDLE")
+        print("="*70)
+
+        # Works for both compute_kpis() and run_incremental() outputs; all three are tiny
+        monthly, hourly, zones = {}, {}, {}
+        for row in self.spark.read.parquet(os.path.join(output_dir, "monthly_revenue.parquet")).collect():
+            key = (row['year'], row['month'])
+            monthly[key] = monthly.get(key, 0.0) + float(row['total_revenue'])
+        for row in self.spark.read.parquet(os.path.join(output_dir, "peak_hour_analysis.parquet")).collect():
+            hourly[row['hour']] = hourly.get(row['hour'], 0) + int(row['trip_count'])
+        for row in self.spark.read.parquet(os.path.join(output_dir, "zone_demand.parquet")).collect():
+            zones[row['pickup_zone']] = int(row['trip_count'])
+
+        payloads = build_payloads(monthly, hourly, zones)
+        if trips is not None:
+            # At most days x 24 x zones x payment types rows, so collecting to the driver is safe
+            cube = trips.fillna({'payment_type': UNKNOWN_PAYMENT_TYPE}) \
+                .groupBy("date", "hour", "pickup_zone", "payment_type") \
+                .agg(
+                    count("*").alias("trips"),
+                    sum("total_amount").alias("revenue_sum"),
+                    sum("trip_distance").alias("distance_sum"),
+                    sum("tip_percentage").alias("tip_pct_sum")
+                ).toPandas().fillna({'tip_pct_sum': 0.0})
+            payloads[CUBE_FILE] = kpi_cube_from_aggregates(cube)
+
+        return write_kpi_bundle(payloads, bundle_dir,
+                                source='spark', row_count=builtins.sum(zones.values()))
+
+    def start_streaming(self, input_dir, output_dir="output/streaming",
+                        checkpoint_dir="output/_checkpoints/streaming", sink="parquet",
+                        watermark="1 hour", trigger_interval="10 seconds",
+                        max_files_per_trigger=None):
+        """Continuously compute hourly and zone KPIs from trip CSV files landing in input_dir"""
+        print("\n" + "="*70)
+        print("PYSPARK STRUCTURED STREAMING: NEAR-REAL-TIME KPIs")
+        print("="*70)
+
+        if sink not in ("parquet", "memory"):
+            raise ValueError(f"Unsupported sink '{sink}' (use 'parquet' or 'memory')")
+
+        reader = self.spark.readStream \
+            .option("header", "true") \
+            .schema(RAW_TRIP_SCHEMA)
+        if max_files_per_trigger:
+            reader = reader.option("maxFilesPerTrigger", max_files_per_trigger)
+
+        # Same cleaning/features as batch; the watermark bounds state for late trips
+        trips = self.transform_trips(reader.csv(input_dir)) \
+            .withWatermark("pickup_datetime", watermark)
+
+        hourly_kpis = trips.groupBy(window("pickup_datetime", "1 hour")) \
+            .agg(
+                count("*").alias("trip_count"),
+                round(sum("total_amount"), 2).alias("total_revenue"),
+                round(avg("total_amount"), 2).alias("avg_fare"),
+                round(avg("trip_duration_min"), 2).alias("avg_duration")
+            ) \
+            .select(col("window.start").alias("window_start"),
+                    col("window.end").alias("window_end"),
+                    "trip_count", "total_revenue", "avg_fare", "avg_duration")
+
+        zone_kpis = trips.groupBy(window("pickup_datetime", "1 hour"), "pickup_zone") \
+            .agg(
+                count("*").alias("trip_count"),
+                round(sum("total_amount"), 2).alias("total_revenue"),
+                round(avg("trip_distance"), 2).alias("avg_distance")
+            ) \
+            .select(col("window.start").alias("window_start"),
+                    col("window.end").alias("window_end"),
+                    "pickup_zone", "trip_count", "total_revenue", "avg_distance")
+
+        queries = {}
+        for name, kpi_df in [("hourly_kpis", hourly_kpis), ("zone_kpis", zone_kpis)]:
+            writer = kpi_df.writeStream \
+                .queryName(f"{name}_stream") \
+                .option("checkpointLocation", f"{checkpoint_dir}/{name}") \
+                .trigger(processingTime=trigger_interval)
+
+            if sink == "memory":
+                # In-memory table holds the latest value of every open window
+                writer = writer.outputMode("complete").format("memory")
+            else:
+                # File sinks only accept finalized windows (after the watermark passes)
+                writer = writer.outputMode("append").format("parquet") \
+                    .option("path", f"{output_dir}/{name}.parquet")
+
+            queries[name] = writer.start()
+            target = f"{name}_stream (memory table)" if sink == "memory" else f"{output_dir}/{name}.parquet"
+            print(f"   ✓ Started {name}: {target}")
+
+        print(f"\n   Watching: {input_dir}")
+        print(f"   Watermark: {watermark} on pickup_datetime")
+        print(f"   Checkpoints: {checkpoint_dir}")
+
+        return queries
+
+    def stop_streaming(self, queries):
+        """Stop running streaming queries"""
+        for name, query in queries.items():
+            if query.isActive:
+                query.stop()
+            print(f"   ✓ Stopped {name}")
+
+    def track_step(self, name):
+        """Context manager that attributes Spark jobs in the block to an ETL step"""
+        return self.instrumentation.step(name)
+
+    def write_run_report(self, path="output/run_report.json"):
+        """Write per-step/per-stage metrics to JSON and print a readable summary"""
+        report = self.instrumentation.write_report(path, extra={'tuning': self.tuning})
+        self.instrumentation.print_summary(report)
+        return report
+
     def show_execution_plan(self, df):
         """Display Spark execution plan"""
         print("\n" + "="*70)
@@ -295,25 +872,251 @@ class PySparkETLPipeline:
         print("\n✓ Spark session stopped")
 
 
+# ============================================================================
+# LOCAL STREAMING TEST
+# ============================================================================
+
+def test_streaming_locally(etl, sample_csv="cleaned_taxi_data_10k.csv", batches=3):
+    """
+    Drop slices of a sample CSV into a temp directory and check that the
+    streaming KPIs pick up every file
+    """
+    print("="*70)
+    print("TESTING STRUCTURED STREAMING LOCALLY")
+    print("="*70)
+
+    raw_columns = RAW_TRIP_SCHEMA.fieldNames()
+    with open(sample_csv, newline='') as f:
+        reader = csv.DictReader(f)
+        rows = [[row[c] for c in raw_columns] for row in reader]
+
+    work_dir = tempfile.mkdtemp(prefix="taxi_stream_")
+    input_dir = os.path.join(work_dir, "incoming")
+    staging_dir = os.path.join(work_dir, "staging")
+    os.makedirs(input_dir)
+    os.makedirs(staging_dir)
+
+    queries = etl.start_streaming(
+        input_dir,
+        checkpoint_dir=os.path.join(work_dir, "checkpoints"),
+        sink="memory",
+        trigger_interval="1 second"
+    )
+
+    try:
+        batch_size = int(math.ceil(len(rows) / batches))
+        for i in range(batches):
+            # Write outside the watched directory, then move in atomically
+            staged = os.path.join(staging_dir, f"trips_{i:03d}.csv")
+            with open(staged, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(raw_columns)
+                writer.writerows(rows[i * batch_size:(i + 1) * batch_size])
+            os.replace(staged, os.path.join(input_dir, f"trips_{i:03d}.csv"))
+
+            for query in queries.values():
+                query.processAllAvailable()
+
+            streamed = etl.spark.sql("SELECT SUM(trip_count) AS trips FROM hourly_kpis_stream") \
+                .collect()[0]["trips"] or 0
+            print(f"\nBatch {i + 1}/{batches}: {streamed:,} clean trips aggregated so far")
+
+        print("\nTop zones (latest windows):")
+        etl.spark.sql("""
+            SELECT pickup_zone, SUM(trip_count) AS trips, ROUND(SUM(total_revenue), 2) AS revenue
+            FROM zone_kpis_stream
+            GROUP BY pickup_zone
+            ORDER BY trips DESC
+        """).show()
+    finally:
+        etl.stop_streaming(queries)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# ============================================================================
+# TUNING BENCHMARK
+# ============================================================================
+
+def benchmark_tuning_profiles(etl, sample_csv="cleaned_taxi_data_10k.csv", scales=(1, 5, 20),
+                              profiles=("legacy", "balanced")):
+    """
+    Time the KPI aggregations and a zone-skewed join on 1x/5x/20x synthetic
+    copies of the sample under each tuning profile
+    """
+    print("="*70)
+    print("TUNING PROFILE BENCHMARK")
+    print("="*70)
+
+    sample = etl.spark.read.option("header", "true").schema(RAW_TRIP_SCHEMA).csv(sample_csv)
+    sample_bytes = input_size_bytes(sample_csv)
+    original_tuning = etl.tuning
+    results = []
+
+    # Force a shuffle join so zone skew actually reaches the join
+    etl.spark.conf.set("spark.sql.autoBroadcastJoinThreshold", "-1")
+
+    try:
+        for scale in scales:
+            # Replicate the sample, shifting each copy by whole days so dates stay realistic
+            synthetic = sample.crossJoin(etl.spark.range(scale).withColumnRenamed("id", "copy")) \
+                .withColumn("tpep_pickup_datetime",
+                            date_format(to_timestamp("tpep_pickup_datetime") + expr("make_interval(0, 0, 0, copy)"),
+                                        "yyyy-MM-dd HH:mm:ss")) \
+                .withColumn("tpep_dropoff_datetime",
+                            date_format(to_timestamp("tpep_dropoff_datetime") + expr("make_interval(0, 0, 0, copy)"),
+                                        "yyyy-MM-dd HH:mm:ss")) \
+                .drop("copy") \
+                .cache()
+            rows = synthetic.count()
+
+            for profile in profiles:
+                etl.apply_runtime_tuning(resolve_tuning(
+                    profile=profile, input_bytes=sample_bytes * scale, cores=original_tuning['cores']))
+
+                start = time.perf_counter()
+                trips = etl.transform_trips(synthetic)
+                for _, partial_df in etl._kpi_partials(trips).values():
+                    partial_df.write.format("noop").mode("overwrite").save()
+
+                zone_avgs = trips.groupBy("pickup_zone").agg(avg("total_amount").alias("zone_avg_fare"))
+                trips.join(zone_avgs, "pickup_zone") \
+                    .withColumn("fare_vs_zone", col("total_amount") / col("zone_avg_fare")) \
+                    .write.format("noop").mode("overwrite").save()
+                elapsed = time.perf_counter() - start
+
+                results.append({'scale': scale, 'rows': rows, 'profile': profile,
+                                'shuffle_partitions': etl.tuning['shuffle_partitions'],
+                                'adaptive': etl.tuning['adaptive'], 'seconds': elapsed})
+
+            synthetic.unpersist()
+    finally:
+        etl.spark.conf.unset("spark.sql.autoBroadcastJoinThreshold")
+        etl.apply_runtime_tuning(original_tuning)
+
+    print(f"\n{'Scale':<7}{'Rows':>12}  {'Profile':<10}{'Partitions':>11}{'AQE':>6}{'Seconds':>10}")
+    print("-" * 60)
+    for r in results:
+        print(f"{str(r['scale']) + 'x':<7}{r['rows']:>12,}  {r['profile']:<10}{r['shuffle_partitions']:>11}"
+              f"{'on' if r['adaptive'] else 'off':>6}{r['seconds']:>10.2f}")
+
+    return results
+
+
+# ============================================================================
+# FEATURE PARITY & ENGINE THROUGHPUT
+# ============================================================================
+
+def _raw_sample(sample_csv):
+    """Raw yellow_tripdata columns of a sample CSV as pandas, with a stable row id"""
+    pdf = pd.read_csv(sample_csv, usecols=RAW_TRIP_SCHEMA.fieldNames())[RAW_TRIP_SCHEMA.fieldNames()]
+    pdf.insert(0, "_row_id", np.arange(len(pdf)))
+    return pdf
+
+
+def verify_feature_parity(etl, sample_csv="cleaned_taxi_data_10k.csv"):
+    """
+    Run the same trips through the pandas and Spark feature paths and
+    compare every derived column row by row
+    """
+    print("="*70)
+    print("FEATURE PARITY: PANDAS vs SPARK")
+    print("="*70)
+
+    pdf = _raw_sample(sample_csv)
+    expected = add_trip_features(pdf).sort_values("_row_id").reset_index(drop=True)
+
+    sdf = etl.spark.createDataFrame(pdf, schema=StructType(
+        [StructField("_row_id", LongType(), False)] + RAW_TRIP_SCHEMA.fields))
+    actual = etl._add_features(etl._parse_timestamps(sdf)).toPandas() \
+        .sort_values("_row_id").reset_index(drop=True)
+
+    mismatches = {}
+    for column in FEATURE_COLUMNS + ZONE_COLUMNS:
+        left, right = expected[column], actual[column]
+        if left.dtype.kind in "fiu" and right.dtype.kind in "fiu":
+            equal = np.isclose(left.to_numpy(dtype=float), right.to_numpy(dtype=float), equal_nan=True)
+        else:
+            equal = left.astype(str).to_numpy() == right.astype(str).to_numpy()
+        if not equal.all():
+            mismatches[column] = int((~equal).sum())
+
+    print(f"\nRows compared: {len(expected):,}")
+    for column in FEATURE_COLUMNS + ZONE_COLUMNS:
+        status = f"✗ {mismatches[column]:,} mismatches" if column in mismatches else "✓"
+        print(f"   {status:<20} {column}")
+
+    if mismatches:
+        raise AssertionError(f"Feature parity failed for: {sorted(mismatches)}")
+    print("\n✓ pandas and Spark feature paths agree on every column")
+    return True
+
+
+def benchmark_feature_engines(etl, sample_csv="cleaned_taxi_data_10k.csv", scale=20):
+    """Rows/sec of the shared feature function in pandas vs as a Spark mapInPandas stage"""
+    print("="*70)
+    print("FEATURE THROUGHPUT: PANDAS vs SPARK")
+    print("="*70)
+
+    pdf = pd.concat([_raw_sample(sample_csv)] * scale, ignore_index=True)
+    rows = len(pdf)
+
+    start = time.perf_counter()
+    add_trip_features(pdf)
+    pandas_seconds = time.perf_counter() - start
+
+    sdf = etl.spark.createDataFrame(pdf).cache()
+    sdf.count()
+    start = time.perf_counter()
+    etl._add_features(etl._parse_timestamps(sdf)).write.format("noop").mode("overwrite").save()
+    spark_seconds = time.perf_counter() - start
+    sdf.unpersist()
+
+    results = {
+        'rows': rows,
+        'pandas_rows_per_sec': rows / pandas_seconds,
+        'spark_rows_per_sec': rows / spark_seconds
+    }
+    print(f"\nRows: {rows:,}")
+    print(f"   pandas: {pandas_seconds:6.2f}s ({results['pandas_rows_per_sec']:,.0f} rows/s)")
+    print(f"   spark:  {spark_seconds:6.2f}s ({results['spark_rows_per_sec']:,.0f} rows/s, incl. zone join)")
+    return results
+
+
 # USAGE EXAMPLE
 if __name__ == "__main__":
     # Initialize ETL Pipeline
-    etl = PySparkETLPipeline(app_name="NYC_Taxi_ETL")
+    etl = PySparkETLPipeline(app_name="NYC_Taxi_ETL", input_path="yellow_tripdata.csv")
     
     try:
         # Load data
-        df = etl.load_data("yellow_tripdata.csv")
+        with etl.track_step("load_data"):
+            df = etl.load_data("yellow_tripdata.csv")
         
         # Clean and transform
-        clean_df = etl.clean_and_transform(df)
-        
+        with etl.track_step("clean_and_transform"):
+            clean_df = etl.clean_and_transform(df)
+
+        # Persist cleaned trips so later runs can start from the lake
+        with etl.track_step("write_trip_lake"):
+            etl.write_trip_lake(clean_df, "output/trips_lake")
+        with etl.track_step("compact_trip_lake"):
+            etl.compact_trip_lake("output/trips_lake")
+
         # Compute KPIs
-        etl.compute_kpis(clean_df)
+        with etl.track_step("compute_kpis"):
+            etl.compute_kpis(clean_df)
+        
+        # Publish the precomputed payloads the serverless API serves
+        with etl.track_step("export_kpi_bundle"):
+            etl.export_kpi_bundle("output", "kpi_data", trips=clean_df)
         
         # Show execution plan (on a sample aggregation)
         sample_agg = clean_df.groupBy("hour").agg(count("*").alias("trips"))
         etl.show_execution_plan(sample_agg)
         
+        # Stage-level metrics for every step above
+        etl.write_run_report("output/run_report.json")
+        
         # Explain performance benefits
         etl.performance_benefits()
         
@@ -1,7 +1,14 @@
 import pandas as pd
 import json
 from datetime import datetime
+import asyncio
 import os
+import re
+import time
+
+from genai_cache import SemanticResponseCache, kpi_context_hash, normalize_question
+from genai_context import CONTEXT_TOKEN_BUDGET, build_kpi_context
+from llm_client import AsyncLLMClient, LLMError, MockLLMServer, estimate_tokens
 
 # Note: Install required packages
 # pip install openai langchain langchain-openai
@@ -22,6 +29,25 @@ except ImportError:
     OPENAI_AVAILABLE = False
     print("⚠ OpenAI not installed. Install with: pip install openai")
 
+LANGCHAIN_TEMPLATE = """
+You are an expert urban mobility data analyst. You have access to NYC taxi trip data analytics.
+
+CONTEXT:
+{context}
+
+USER QUESTION:
+{question}
+
+Provide a clear, data-driven answer based on the metrics provided. Include specific numbers and insights.
+If relevant, provide actionable recommendations for city planners or transportation companies.
+
+ANSWER:
+"""
+
+# Mock mode streaming pace (roughly a hosted chat model)
+MOCK_FIRST_TOKEN_S = 0.4
+MOCK_TOKEN_INTERVAL_S = 0.015
+
 
 class GenAIMobilityInsights:
     """
@@ -29,12 +55,21 @@ class GenAIMobilityInsights:
     Uses OpenAI/Gemini API with LangChain for conversational analytics
     """
     
-    def __init__(self, api_key=None, model="gpt-4", use_langchain=True):
+    def __init__(self, api_key=None, model="gpt-4", use_langchain=True, use_cache=True, base_url=None,
+                 context_tokens=CONTEXT_TOKEN_BUDGET):
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.model = model
+        # OpenAI-compatible endpoint for ask_many (e.g. a local MockLLMServer)
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1"
         self.use_langchain = use_langchain and LANGCHAIN_AVAILABLE
         self.kpi_data = {}
         
+        # Answers are reused for repeated or paraphrased questions on the same KPI context
+        self.response_cache = SemanticResponseCache() if use_cache else None
+        self._context_hash = None
+        # Prompt context budget per question (estimated tokens)
+        self.context_tokens = context_tokens
+        
         if not self.api_key:
             print("⚠ No API key provided. Set OPENAI_API_KEY environment variable.")
             print("  For demo purposes, using mock responses.")
@@ -47,52 +82,51 @@ class GenAIMobilityInsights:
                     temperature=0.3,
                     openai_api_key=self.api_key
                 )
-            else:
+            elif OPENAI_AVAILABLE:
                 openai.api_key = self.api_key
         
         print(f"✓ GenAI Assistant initialized")
         print(f"  Model: {self.model}")
         print(f"  LangChain: {'Enabled' if self.use_langchain else 'Disabled'}")
         print(f"  Mock Mode: {'Yes' if self.mock_mode else 'No'}")
+        print(f"  Response Cache: {'Enabled' if self.response_cache is not None else 'Disabled'}")
     
-    def load_kpi_context(self, csv_file='cleaned_taxi_data.csv'):
-        """Load and prepare KPI context for the AI"""
+    def load_kpi_context(self, csv_file='cleaned_taxi_data.csv', use_snapshot=True):
+        """
+        Load and prepare KPI context for the AI
+        csv_file may also be a Parquet file or the Spark trip lake directory;
+        the context is cached in a snapshot next to it and reused until the source changes
+        """
         print(f"\nLoading KPI context from {csv_file}...")
+        start = time.perf_counter()
         
-        df = pd.read_csv(csv_file)
-        df['tpep_pickup_datetime'] = pd.to_datetime(df['tpep_pickup_datetime'])
+        snapshot_path = kpi_snapshot_path(csv_file)
+        fingerprint = _source_fingerprint(csv_file)
+        snapshot = _read_snapshot(snapshot_path) if use_snapshot else None
+        if snapshot and snapshot.get('source') == fingerprint:
+            self.kpi_data = snapshot['kpi_data']
+            print(f"✓ Loaded KPI context with {len(self.kpi_data)} metrics from snapshot "
+                  f"{snapshot_path} ({(time.perf_counter() - start) * 1000:.1f} ms)")
+            return self.kpi_data
         
-        # Compute comprehensive KPIs
-        self.kpi_data = {
-            'total_trips': len(df),
-            'total_revenue': df['total_amount'].sum(),
-            'avg_fare': df['fare_amount'].mean(),
-            'avg_trip_distance': df['trip_distance'].mean(),
-            'avg_tip_percentage': df['tip_percentage'].mean(),
-            
-            # Busiest zones
-            'busiest_zones': df.groupby('pickup_zone')['VendorID'].count().to_dict() if 'pickup_zone' in df.columns else {},
-            
-            # Peak hours
-            'hourly_demand': df.groupby('hour_of_day')['VendorID'].count().to_dict() if 'hour_of_day' in df.columns else {},
-            
-            # Monthly trends
-            'monthly_revenue': df.groupby('month_name')['total_amount'].sum().to_dict() if 'month_name' in df.columns else {},
-            'monthly_trips': df.groupby('month_name')['VendorID'].count().to_dict() if 'month_name' in df.columns else {},
-            
-            # Peak vs off-peak
-            'peak_revenue': df[df['is_peak_hour'] == 1]['total_amount'].sum() if 'is_peak_hour' in df.columns else 0,
-            'off_peak_revenue': df[df['is_peak_hour'] == 0]['total_amount'].sum() if 'is_peak_hour' in df.columns else 0,
-            
-            # Day of week
-            'dow_performance': df.groupby('day_name')['total_amount'].mean().to_dict() if 'day_name' in df.columns else {}
-        }
+        self.kpi_data = kpi_context_from_trips(_read_context_columns(csv_file))
+        if use_snapshot:
+            _write_snapshot(snapshot_path, fingerprint, self.kpi_data)
         
-        print(f"✓ Loaded KPI context with {len(self.kpi_data)} metrics")
+        print(f"✓ Loaded KPI context with {len(self.kpi_data)} metrics "
+              f"({time.perf_counter() - start:.2f}s)")
         return self.kpi_data
     
-    def format_kpi_context(self):
-        """Format KPI data for AI context"""
+    def format_kpi_context(self, question=None):
+        """
+        Format KPI data for AI context
+        With a question, only the relevant sections are included, compacted to
+        fit self.context_tokens; without one, the full KPI summary is returned
+        """
+        if question is not None:
+            context, self.last_context_report = build_kpi_context(self.kpi_data, question, self.context_tokens)
+            return context
+        
         context = f"""
 NYC TAXI TRIP DATA ANALYTICS SUMMARY
 
@@ -127,35 +161,47 @@ DAY OF WEEK PERFORMANCE (Avg Revenue):
         print(f"QUESTION: {question}")
         print(f"{'='*70}")
         
+        cached = self._cached_answer(question)
+        if cached is not None:
+            return cached
+        
         if self.mock_mode:
-            return self._get_mock_response(question)
+            answer = self._get_mock_response(question)
+        else:
+            context = self.format_kpi_context(question)
+            if self.use_langchain:
+                answer = self._ask_with_langchain(question, context)
+            else:
+                answer = self._ask_with_openai(question, context)
         
-        context = self.format_kpi_context()
+        # Failed calls return None and are retried next time
+        if answer is not None and self.response_cache is not None:
+            self.response_cache.put(question, self._context_hash, answer)
+        return answer
+    
+    def _cached_answer(self, question, verbose=True):
+        """Cached answer for this (or a near-identical) question on the current KPI context"""
+        if self.response_cache is None:
+            return None
         
-        if self.use_langchain:
-            return self._ask_with_langchain(question, context)
-        else:
-            return self._ask_with_openai(question, context)
+        # Hashing kpi_data on every question also catches in-place edits
+        context_hash = kpi_context_hash(self.kpi_data)
+        if context_hash != self._context_hash:
+            self.response_cache.invalidate(context_hash)
+            self._context_hash = context_hash
+        
+        entry = self.response_cache.get(question, context_hash)
+        if entry is None:
+            return None
+        if verbose:
+            print(f"\nANSWER (cached, {entry['similarity']:.0%} match to {entry['question']!r}):\n"
+                  f"{entry['answer']}\n")
+        return entry['answer']
     
     def _ask_with_langchain(self, question, context):
         """Use LangChain for structured prompting"""
-        template = """
-You are an expert urban mobility data analyst. You have access to NYC taxi trip data analytics.
-
-CONTEXT:
-{context}
-
-USER QUESTION:
-{question}
-
-Provide a clear, data-driven answer based on the metrics provided. Include specific numbers and insights.
-If relevant, provide actionable recommendations for city planners or transportation companies.
-
-ANSWER:
-"""
-        
         prompt = PromptTemplate(
-            template=template,
+            template=LANGCHAIN_TEMPLATE,
             input_variables=["context", "question"]
         )
         
@@ -169,12 +215,83 @@ ANSWER:
             print(f"✗ Error: {e}")
             return None
     
-    def _ask_with_openai(self, question, context):
-        """Use OpenAI API directly"""
-        messages = [
+    def _chat_messages(self, question, context):
+        return [
             {"role": "system", "content": "You are an expert urban mobility data analyst."},
             {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}"}
         ]
+    
+    def stream_answer(self, question):
+        """
+        Yield the answer in pieces as the model produces them (cached answers
+        arrive as one piece); time-to-first-token and total time are recorded
+        in self.last_stream_stats once the stream ends
+        """
+        start = time.perf_counter()
+        stats = self.last_stream_stats = {'ttft_ms': None, 'total_ms': None, 'chunks': 0, 'cached': False}
+        
+        cached = self._cached_answer(question, verbose=False)
+        if cached is not None:
+            stats['cached'] = True
+            chunks = iter([cached])
+        elif self.mock_mode:
+            chunks = self._stream_mock_response(question)
+        else:
+            context = self.format_kpi_context(question)
+            if self.use_langchain:
+                chunks = self._stream_with_langchain(question, context)
+            else:
+                chunks = self._stream_with_openai(question, context)
+        
+        parts = []
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if stats['ttft_ms'] is None:
+                    stats['ttft_ms'] = (time.perf_counter() - start) * 1000
+                stats['chunks'] += 1
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            print(f"✗ Error: {e}")
+            stats['error'] = str(e)
+            return
+        stats['total_ms'] = (time.perf_counter() - start) * 1000
+        
+        # Only complete answers are cached (a consumer that stops early never gets here)
+        if parts and not stats['cached'] and self.response_cache is not None:
+            self.response_cache.put(question, self._context_hash, "".join(parts))
+    
+    def _stream_with_langchain(self, question, context):
+        prompt = PromptTemplate(template=LANGCHAIN_TEMPLATE, input_variables=["context", "question"])
+        for chunk in self.llm.stream(prompt.format(context=context, question=question)):
+            yield chunk.content
+    
+    def _stream_with_openai(self, question, context):
+        client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url)
+        stream = client.chat.completions.create(
+            model=self.model,
+            messages=self._chat_messages(question, context),
+            temperature=0.3,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content
+    
+    def _stream_mock_response(self, question):
+        """Mock answer paced like a hosted model: first-token latency, then word by word"""
+        response = self._get_mock_response(question, verbose=False)
+        time.sleep(MOCK_FIRST_TOKEN_S)
+        for i, piece in enumerate(re.findall(r"\s*\S+", response)):
+            if i:
+                time.sleep(MOCK_TOKEN_INTERVAL_S)
+            yield piece
+    
+    def _ask_with_openai(self, question, context):
+        """Use OpenAI API directly"""
+        messages = self._chat_messages(question, context)
         
         try:
             client = openai.OpenAI(api_key=self.api_key)
@@ -190,7 +307,7 @@ ANSWER:
             print(f"✗ Error: {e}")
             return None
     
-    def _get_mock_response(self, question):
+    def _get_mock_response(self, question, verbose=True):
         """Generate mock responses for demo purposes"""
         question_lower = question.lower()
         
@@ -245,9 +362,68 @@ The data reveals strong demand patterns tied to business hours and urban zones.
         else:
             response = mock_responses['default']
         
-        print(f"\nANSWER (Mock Mode):\n{response}\n")
+        if verbose:
+            print(f"\nANSWER (Mock Mode):\n{response}\n")
         return response
     
+    async def ask_many(self, questions, max_concurrency=8, requests_per_second=5.0, max_retries=4,
+                       timeout=30.0):
+        """
+        Answer many questions concurrently; returns answers in question order
+        (None for questions that still failed after retries)
+        Cached and repeated questions cost no LLM call; the rest go out through
+        AsyncLLMClient with bounded concurrency and a requests/s token bucket
+        """
+        start = time.perf_counter()
+        answers = [None] * len(questions)
+        pending = {}  # normalized question -> indexes sharing one LLM call
+        for i, question in enumerate(questions):
+            cached = self._cached_answer(question, verbose=False)
+            if cached is not None:
+                answers[i] = cached
+            else:
+                pending.setdefault(normalize_question(question), []).append(i)
+        
+        stats = {'questions': len(questions), 'cache_hits': len(questions) - sum(map(len, pending.values())),
+                 'llm_questions': len(pending), 'failed': 0}
+        
+        if self.mock_mode:
+            for indexes in pending.values():
+                answer = self._get_mock_response(questions[indexes[0]], verbose=False)
+                for i in indexes:
+                    answers[i] = answer
+        elif pending:
+            client = AsyncLLMClient(self.api_key, self.model, self.base_url, max_concurrency=max_concurrency,
+                                    requests_per_second=requests_per_second, max_retries=max_retries,
+                                    timeout=timeout)
+            
+            async def answer(indexes):
+                question = questions[indexes[0]]
+                context = self.format_kpi_context(question)
+                try:
+                    result = await client.complete(self._chat_messages(question, context))
+                except LLMError as e:  # the client wraps transport and decode errors
+                    print(f"✗ Error for {question!r}: {e}")
+                    stats['failed'] += 1
+                    return
+                for i in indexes:
+                    answers[i] = result
+                if self.response_cache is not None:
+                    self.response_cache.put(question, self._context_hash, result)
+            
+            async with client:
+                await asyncio.gather(*[answer(indexes) for indexes in pending.values()])
+            stats['client'] = client.stats
+            stats['rate_limit_wait_s'] = round(client.request_bucket.waited_s, 2)
+        
+        stats['seconds'] = time.perf_counter() - start
+        stats['questions_per_s'] = len(questions) / stats['seconds'] if stats['seconds'] else 0.0
+        self.last_batch_stats = stats
+        print(f"✓ Answered {len(questions) - stats['failed']}/{len(questions)} questions in "
+              f"{stats['seconds']:.2f}s ({stats['questions_per_s']:.1f}/s; "
+              f"{stats['llm_questions']} LLM questions, {stats['cache_hits']} cached/repeated)")
+        return answers
+    
     def generate_executive_summary(self):
         """Generate monthly executive summary"""
         print(f"\n{'='*70}")
@@ -316,6 +492,229 @@ NEXT STEPS
         return self.ask_question(question)
 
 
+# ============================================================================
+# KPI CONTEXT SOURCES
+# ============================================================================
+
+# The only trip columns the context needs; everything else is never parsed
+CONTEXT_COLUMNS = ['total_amount', 'fare_amount', 'trip_distance', 'tip_percentage', 'pickup_zone',
+                   'hour_of_day', 'month_name', 'day_name', 'is_peak_hour']
+CATEGORY_COLUMNS = ['pickup_zone', 'month_name', 'day_name']
+SNAPSHOT_SUFFIX = ".kpi_context.json"
+SNAPSHOT_VERSION = 1
+
+
+def kpi_context_from_trips(df):
+    """KPI context dict (plain Python types) from cleaned trips with CONTEXT_COLUMNS"""
+    def counts(column):
+        if column not in df.columns:
+            return {}
+        return {k: int(v) for k, v in df.groupby(column, observed=True).size().items()}
+    
+    def by(column, func):
+        if column not in df.columns:
+            return {}
+        grouped = df.groupby(column, observed=True)['total_amount'].agg(func)
+        return {k: float(v) for k, v in grouped.items()}
+    
+    is_peak = df['is_peak_hour'] == 1 if 'is_peak_hour' in df.columns else None
+    return {
+        'total_trips': len(df),
+        'total_revenue': float(df['total_amount'].sum()),
+        'avg_fare': float(df['fare_amount'].mean()),
+        'avg_trip_distance': float(df['trip_distance'].mean()),
+        'avg_tip_percentage': float(df['tip_percentage'].mean()),
+        
+        # Busiest zones
+        'busiest_zones': counts('pickup_zone'),
+        
+        # Peak hours
+        'hourly_demand': {int(h): n for h, n in counts('hour_of_day').items()},
+        
+        # Monthly trends
+        'monthly_revenue': by('month_name', 'sum'),
+        'monthly_trips': counts('month_name'),
+        
+        # Peak vs off-peak
+        'peak_revenue': float(df.loc[is_peak, 'total_amount'].sum()) if is_peak is not None else 0,
+        'off_peak_revenue': float(df.loc[~is_peak, 'total_amount'].sum()) if is_peak is not None else 0,
+        
+        # Day of week
+        'dow_performance': by('day_name', 'mean'),
+    }
+
+
+def _read_context_columns(source):
+    """Projected read of CONTEXT_COLUMNS from a cleaned CSV, Parquet file or Parquet lake"""
+    if os.path.isdir(source) or source.endswith('.parquet'):
+        import pyarrow.dataset as ds
+        dataset = ds.dataset(source, format='parquet', partitioning='hive')
+        columns = [c for c in CONTEXT_COLUMNS if c in dataset.schema.names]
+        df = dataset.to_table(columns=columns).to_pandas()
+    else:
+        header = pd.read_csv(source, nrows=0).columns
+        columns = [c for c in CONTEXT_COLUMNS if c in header]
+        try:
+            import pyarrow  # noqa: F401  (multithreaded CSV parser)
+            engine = 'pyarrow'
+        except ImportError:
+            engine = 'c'
+        df = pd.read_csv(source, usecols=columns, engine=engine,
+                         dtype={c: 'category' for c in CATEGORY_COLUMNS if c in columns})
+    return df
+
+
+def kpi_snapshot_path(source):
+    """Snapshot file kept next to the source: cleaned_taxi_data.csv -> cleaned_taxi_data.kpi_context.json"""
+    base = source.rstrip(os.sep)
+    return (os.path.splitext(base)[0] if os.path.isfile(base) else base) + SNAPSHOT_SUFFIX
+
+
+def _source_fingerprint(source):
+    """Size and mtime of the source (every file, for a lake directory)"""
+    if os.path.isdir(source):
+        files = [os.path.join(root, name) for root, _, names in os.walk(source) for name in names
+                 if not name.startswith(('.', '_'))]
+    else:
+        files = [source]
+    stats = [os.stat(f) for f in files]
+    return {
+        'path': os.path.abspath(source),
+        'files': len(stats),
+        'bytes': sum(st.st_size for st in stats),
+        'mtime_ns': max((st.st_mtime_ns for st in stats), default=0),
+        'version': SNAPSHOT_VERSION,
+    }
+
+
+def _read_snapshot(path):
+    try:
+        with open(path, 'r') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # JSON object keys are strings; hours are ints everywhere else
+    kpi_data = snapshot.get('kpi_data', {})
+    kpi_data['hourly_demand'] = {int(h): n for h, n in kpi_data.get('hourly_demand', {}).items()}
+    return snapshot
+
+
+def _write_snapshot(path, fingerprint, kpi_data):
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({'source': fingerprint, 'kpi_data': kpi_data}, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠ Could not write KPI context snapshot {path}: {e}")
+
+
+def benchmark_ask_many(kpi_data=None, n_questions=48, latency_ms=200, server_rps=20):
+    """
+    ask_many against a local MockLLMServer: one call at a time vs bounded
+    concurrency, and a client rate above the server's limit so 429s are retried
+    """
+    print("="*70)
+    print("ask_many BENCHMARK (LOCAL MOCK LLM)")
+    print("="*70)
+    
+    assistant = GenAIMobilityInsights(api_key="mock", use_langchain=False, use_cache=False)
+    assistant.kpi_data = kpi_data or {}
+    # Distinct numbers keep every question a separate LLM call
+    questions = [f"How many trips started in hour {i % 24} of day {i // 24 + 1}?" for i in range(n_questions)]
+    scenarios = [(1, 50.0), (8, 15.0), (32, 15.0), (32, 40.0)]  # (max_concurrency, client requests/s)
+    
+    async def run(concurrency, rps):
+        async with MockLLMServer(port=0, latency_ms=latency_ms, requests_per_second=server_rps,
+                                 seed=42) as server:
+            assistant.base_url = server.base_url
+            answers = await assistant.ask_many(questions, max_concurrency=concurrency,
+                                               requests_per_second=rps)
+            return answers, server.stats
+    
+    print(f"\nMock LLM: {latency_ms} ms per call, {server_rps} req/s limit (429 beyond), "
+          f"{n_questions} questions per run\n")
+    results = []
+    for concurrency, rps in scenarios:
+        answers, server_stats = asyncio.run(run(concurrency, rps))
+        stats = assistant.last_batch_stats
+        results.append((concurrency, rps, stats, server_stats, sum(a is not None for a in answers)))
+    
+    print(f"\n{'Conc':>5} {'Client r/s':>10} {'Seconds':>8} {'Q/s':>6} {'429s':>5} {'Retries':>8} "
+          f"{'In flight':>10} {'Answered':>9}")
+    print("-"*70)
+    for concurrency, rps, stats, server_stats, answered in results:
+        print(f"{concurrency:>5} {rps:>10.0f} {stats['seconds']:>8.2f} {stats['questions_per_s']:>6.1f} "
+              f"{server_stats['rate_limited']:>5} {stats['client']['retries']:>8} "
+              f"{server_stats['max_in_flight']:>10} {answered:>6}/{n_questions}")
+    
+    sequential, best = results[0][2], max(results, key=lambda r: r[2]['questions_per_s'])[2]
+    print(f"\n✓ {best['questions_per_s'] / sequential['questions_per_s']:.1f}x the sequential throughput; "
+          f"the provider's rate limit, not latency, is the ceiling")
+    return results
+
+
+def benchmark_streaming(kpi_data=None, questions=None):
+    """Time to first token vs time to the full answer for streamed (mock) answers"""
+    print("="*70)
+    print("STREAMING: TIME TO FIRST TOKEN")
+    print("="*70)
+    
+    assistant = GenAIMobilityInsights(api_key=None, use_cache=False)
+    assistant.kpi_data = kpi_data or {}
+    questions = questions or ["What were the busiest pickup zones?", "When is surge demand highest?",
+                              "Why did revenue drop in February?", "How can we improve revenue per trip?"]
+    
+    print(f"\n{'Question':<40} {'Chunks':>7} {'TTFT ms':>9} {'Total ms':>9}")
+    print("-"*70)
+    ttft, total = [], []
+    for question in questions:
+        for _ in assistant.stream_answer(question):
+            pass
+        stats = assistant.last_stream_stats
+        ttft.append(stats['ttft_ms'])
+        total.append(stats['total_ms'])
+        print(f"{question[:40]:<40} {stats['chunks']:>7} {stats['ttft_ms']:>9.0f} {stats['total_ms']:>9.0f}")
+    
+    ttft.sort()
+    total.sort()
+    median_ttft, median_total = ttft[len(ttft) // 2], total[len(total) // 2]
+    print(f"\n✓ Median first token after {median_ttft:.0f} ms vs {median_total:.0f} ms for the full answer "
+          f"({1 - median_ttft / median_total:.0%} less time looking at a blank answer)")
+    return {'ttft_ms': ttft, 'total_ms': total}
+
+
+def benchmark_context_budget(kpi_data, questions=None, max_tokens=CONTEXT_TOKEN_BUDGET):
+    """Prompt context size per question: full KPI dump vs the token-budgeted builder"""
+    print("="*70)
+    print("PROMPT CONTEXT: FULL DUMP vs TOKEN-BUDGETED")
+    print("="*70)
+    
+    assistant = GenAIMobilityInsights(api_key=None, use_cache=False, context_tokens=max_tokens)
+    assistant.kpi_data = kpi_data
+    full_tokens = estimate_tokens(assistant.format_kpi_context())
+    questions = questions or ["What is the busiest hour?", "Which pickup zones are busiest?",
+                              "Why did revenue drop in February?", "Do weekends earn more per trip?",
+                              "When is surge demand highest?", "How can we improve revenue per trip?"]
+    
+    print(f"\nFull KPI dump: {full_tokens} tokens per prompt; budget: {max_tokens} tokens\n")
+    print(f"{'Question':<38} {'Tokens':>6} {'Saved':>6}  Sections")
+    print("-"*70)
+    sizes = []
+    for question in questions:
+        assistant.format_kpi_context(question)
+        report = assistant.last_context_report
+        sizes.append(report['tokens'])
+        sections = ", ".join(n if d == 'full' else f"{n}*" for n, d in report['sections'].items() if n != 'overview')
+        print(f"{question[:38]:<38} {report['tokens']:>6} {1 - report['tokens'] / full_tokens:>6.0%}  {sections}")
+    
+    average = sum(sizes) / len(sizes)
+    print(f"\n* summarized to fit the budget or because the question is open-ended")
+    print(f"✓ Average context {average:.0f} tokens vs {full_tokens} ({1 - average / full_tokens:.0%} fewer prompt "
+          f"tokens per question; all within budget: {'yes' if max(sizes) <= max_tokens else 'NO'})")
+    return sizes
+
+
 # USAGE EXAMPLE
 if __name__ == "__main__":
     print("="*70)
@@ -338,12 +737,36 @@ if __name__ == "__main__":
         "When is surge demand highest?",
         "Why did revenue drop in February?",
         "What are the peak hours for taxi demand?",
-        "How can we improve revenue per trip?"
+        "How can we improve revenue per trip?",
+        # Repeats and paraphrases are answered from the response cache
+        "what are the busiest pickup zones last month",
+        "When is the surge demand highest?",
     ]
     
     for q in questions:
         assistant.ask_question(q)
     
+    stats = assistant.response_cache.stats
+    print(f"✓ Response cache: {stats['hits']} exact + {stats['similar_hits']} similar hits, "
+          f"{stats['misses']} LLM calls")
+    
+    # Concurrent, rate-limited answering against a local mock LLM
+    benchmark_ask_many(assistant.kpi_data)
+    
+    # Streaming: print tokens as they arrive
+    print("\n" + "="*70)
+    print("STREAMED ANSWER")
+    print("="*70)
+    print("Q: What drives demand at peak hours?\nA: ", end="")
+    for token in assistant.stream_answer("What drives demand at peak hours?"):
+        print(token, end="", flush=True)
+    print(f"\n\n✓ First token after {assistant.last_stream_stats['ttft_ms']:.0f} ms, "
+          f"complete after {assistant.last_stream_stats['total_ms']:.0f} ms")
+    benchmark_streaming(assistant.kpi_data)
+    
+    # Question-specific, token-budgeted prompt context
+    benchmark_context_budget(assistant.kpi_data)
+    
     # Generate executive summary
     assistant.generate_executive_summary()
     
@@ -4,6 +4,7 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
+import os
 import sqlite3
 from io import StringIO
 
@@ -77,6 +78,20 @@ def calculate_kpis(df):
     }
     return kpis
 
+@st.cache_resource
+def get_genai_assistant():
+    """LLM-backed assistant when OPENAI_API_KEY is set, otherwise None (rule-based answers)"""
+    if not os.getenv("OPENAI_API_KEY"):
+        return None
+    from step5_genai_assistant import GenAIMobilityInsights
+    return GenAIMobilityInsights()
+
+@st.cache_data
+def assistant_kpi_context(df):
+    """KPI context for the assistant from the loaded trips"""
+    from step5_genai_assistant import kpi_context_from_trips
+    return kpi_context_from_trips(df)
+
 def create_sql_connection(df):
     """Create SQLite database from dataframe"""
     conn = sqlite3.connect(':memory:')
@@ -762,17 +777,39 @@ if data_loaded:
         )
         
         if st.button("Get Insights", type="primary") and user_question:
-            with st.spinner("Analyzing data..."):
-                # Generate insights based on the question
-                kpis = calculate_kpis(df)
-                
-                # Simple rule-based responses (can be replaced with actual GenAI API)
-                response = generate_insights(user_question, df, kpis)
-                
+            kpis = calculate_kpis(df)
+            assistant = get_genai_assistant()
+            
+            if assistant is not None:
+                # Stream the LLM answer token by token instead of waiting for the full completion
+                assistant.kpi_data = assistant_kpi_context(df)
                 st.markdown("<div class='insight-box'>", unsafe_allow_html=True)
                 st.markdown("### 🤖 AI Response")
-                st.write(response)
+                answer_box = st.empty()
+                answer = ""
+                with st.spinner("Waiting for the model..."):
+                    tokens = assistant.stream_answer(user_question)
+                    first = next(tokens, "")
+                answer += first
+                answer_box.markdown(answer + "▌")
+                for token in tokens:
+                    answer += token
+                    answer_box.markdown(answer + "▌")
+                answer_box.markdown(answer or "⚠ No answer returned; check the API key and model.")
+                stats = assistant.last_stream_stats
+                if stats.get('total_ms') is not None:
+                    st.caption(f"First token after {stats['ttft_ms']:,.0f} ms · complete after "
+                               f"{stats['total_ms']:,.0f} ms{' · cached' if stats['cached'] else ''}")
                 st.markdown("</div>", unsafe_allow_html=True)
+            else:
+                with st.spinner("Analyzing data..."):
+                    # Simple rule-based responses (set OPENAI_API_KEY for streamed LLM answers)
+                    response = generate_insights(user_question, df, kpis)
+                    
+                    st.markdown("<div class='insight-box'>", unsafe_allow_html=True)
+                    st.markdown("### 🤖 AI Response")
+                    st.write(response)
+                    st.markdown("</div>", unsafe_allow_html=True)
         
         # Monthly Executive Summary
         st.markdown("---")
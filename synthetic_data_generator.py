@@ -0,0 +1,357 @@
+"""
+Synthetic NYC Taxi Trip Generator
+Produces raw yellow_tripdata-schema CSV/Parquet at any row count, with
+distributions fitted from the 10k sample, for offline scale benchmarks
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+RAW_COLUMNS = [
+    'VendorID', 'tpep_pickup_datetime', 'tpep_dropoff_datetime', 'passenger_count',
+    'trip_distance', 'pickup_longitude', 'pickup_latitude', 'RateCodeID', 'store_and_fwd_flag',
+    'dropoff_longitude', 'dropoff_latitude', 'payment_type', 'fare_amount', 'extra', 'mta_tax',
+    'tip_amount', 'tolls_amount', 'improvement_surcharge', 'total_amount'
+]
+
+CATEGORICAL_COLUMNS = ['VendorID', 'passenger_count', 'RateCodeID', 'store_and_fwd_flag',
+                       'payment_type', 'extra', 'mta_tax', 'improvement_surcharge']
+
+# Share of rows corrupted in each way step 1 cleans up (see MobilityDataAnalyzer.clean_data)
+DEFAULT_DIRTY_RATES = {
+    'missing_passenger_count': 0.005,
+    'zero_distance': 0.01,
+    'negative_fare': 0.002,
+    'invalid_timestamps': 0.002,
+    'zero_coordinates': 0.015,
+}
+
+NYC_BOUNDS = {'lat': (40.49, 40.92), 'lon': (-74.27, -73.68)}
+N_QUANTILES = 201
+N_CLUSTERS = 24
+
+
+class SyntheticTripGenerator:
+    """
+    Vectorized generator for raw taxi trips
+    fit() learns demand, fare, tip and location distributions from a sample;
+    generate() samples a DataFrame; write() fans chunks out to worker processes
+    """
+
+    def __init__(self, model=None, dirty_rates=None):
+        self.model = model
+        self.dirty_rates = dict(DEFAULT_DIRTY_RATES if dirty_rates is None else dirty_rates)
+
+    # ------------------------------------------------------------------
+    # Fitting
+    # ------------------------------------------------------------------
+
+    def fit(self, sample_csv='cleaned_taxi_data_10k.csv', seed=0):
+        """Fit distributions from a (clean) sample of raw trips"""
+        print(f"Fitting synthetic trip model from {sample_csv}...")
+        df = pd.read_csv(sample_csv, usecols=RAW_COLUMNS)
+        pickup = pd.to_datetime(df['tpep_pickup_datetime'])
+        dropoff = pd.to_datetime(df['tpep_dropoff_datetime'])
+        duration_hours = (dropoff - pickup).dt.total_seconds() / 3600
+
+        valid = (df['trip_distance'] > 0) & (df['fare_amount'] > 0) & (duration_hours > 0)
+        for prefix in ('pickup', 'dropoff'):
+            valid &= df[f'{prefix}_latitude'].between(*NYC_BOUNDS['lat'])
+            valid &= df[f'{prefix}_longitude'].between(*NYC_BOUNDS['lon'])
+        df, pickup, duration_hours = df[valid], pickup[valid], duration_hours[valid]
+
+        quantile_grid = np.linspace(0, 1, N_QUANTILES)
+
+        # Demand: joint day-of-week x hour weights (add-one smoothed)
+        dow_hour = np.ones((7, 24))
+        np.add.at(dow_hour, (pickup.dt.dayofweek.to_numpy(), pickup.dt.hour.to_numpy()), 1)
+
+        # Fare ~ linear in distance plus an empirical residual
+        distance = df['trip_distance'].to_numpy()
+        fare = df['fare_amount'].to_numpy()
+        slope, intercept = np.polyfit(distance, fare, 1)
+        residuals = fare - (intercept + slope * distance)
+
+        speed_mph = np.clip(distance / duration_hours.to_numpy(), 1, 60)
+
+        tipped = df[(df['payment_type'] == 1) & (df['tip_amount'] > 0)]
+        tip_rate = df.groupby('payment_type')['tip_amount'].apply(lambda s: float((s > 0).mean()))
+        tolls = df.loc[df['tolls_amount'] > 0, 'tolls_amount'].round(2).value_counts(normalize=True)
+
+        self.model = {
+            'sample_rows': int(len(df)),
+            'date_start': pickup.min().normalize().strftime('%Y-%m-%d'),
+            'date_days': int((pickup.max().normalize() - pickup.min().normalize()).days) + 1,
+            'dow_hour_weights': dow_hour.tolist(),
+            'log_distance_quantiles': np.quantile(np.log(distance), quantile_grid).tolist(),
+            'speed_quantiles': np.quantile(speed_mph, quantile_grid).tolist(),
+            'fare_fit': [float(intercept), float(slope)],
+            'fare_residual_quantiles': np.quantile(residuals, quantile_grid).tolist(),
+            'categorical': {
+                column: self._value_distribution(df[column]) for column in CATEGORICAL_COLUMNS
+            },
+            'tip_rate_by_payment': {str(k): v for k, v in tip_rate.items()},
+            'tip_pct_quantiles': np.quantile(tipped['tip_amount'] / tipped['fare_amount'],
+                                             quantile_grid).tolist(),
+            'toll_rate': float((df['tolls_amount'] > 0).mean()),
+            'toll_values': {'values': tolls.index.tolist(), 'probs': tolls.tolist()},
+            'pickup_clusters': self._fit_clusters(
+                df[['pickup_latitude', 'pickup_longitude']].to_numpy(), seed),
+            'dropoff_clusters': self._fit_clusters(
+                df[['dropoff_latitude', 'dropoff_longitude']].to_numpy(), seed + 1),
+        }
+
+        print(f"✓ Fitted on {len(df):,} clean trips "
+              f"({self.model['date_start']} + {self.model['date_days']} days)")
+        return self.model
+
+    @staticmethod
+    def _value_distribution(series):
+        counts = series.value_counts(normalize=True)
+        values = [v.item() if hasattr(v, 'item') else v for v in counts.index]
+        return {'values': values, 'probs': counts.tolist()}
+
+    @staticmethod
+    def _fit_clusters(points, seed, k=N_CLUSTERS, iterations=20):
+        """Small k-means so coordinates keep their hotspot structure"""
+        rng = np.random.default_rng(seed)
+        centers = points[rng.choice(len(points), k, replace=False)].copy()
+        for _ in range(iterations):
+            labels = ((points[:, None, :] - centers[None]) ** 2).sum(-1).argmin(1)
+            for j in range(k):
+                members = points[labels == j]
+                if len(members):
+                    centers[j] = members.mean(0)
+
+        weights = np.bincount(labels, minlength=k) / len(points)
+        spreads = np.array([points[labels == j].std(0) if (labels == j).sum() > 1 else [0.002, 0.002]
+                            for j in range(k)])
+        return {
+            'centers': centers.tolist(),
+            'weights': weights.tolist(),
+            'spreads': np.clip(spreads, 0.0005, 0.02).tolist()
+        }
+
+    def save_model(self, path='synthetic_trip_model.json'):
+        with open(path, 'w') as f:
+            json.dump(self.model, f)
+        print(f"✓ Model saved to: {path}")
+
+    @classmethod
+    def load_model(cls, path='synthetic_trip_model.json', dirty_rates=None):
+        with open(path, 'r') as f:
+            return cls(json.load(f), dirty_rates)
+
+    # ------------------------------------------------------------------
+    # Sampling
+    # ------------------------------------------------------------------
+
+    def generate(self, n_rows, seed=None):
+        """Sample n_rows raw trips as a DataFrame"""
+        if self.model is None:
+            raise ValueError("No model fitted. Call fit() or load_model() first.")
+        return _generate_frame(self.model, self.dirty_rates, n_rows, np.random.default_rng(seed))
+
+    def write(self, n_rows, output_path, fmt=None, workers=None, chunk_rows=500_000, seed=42):
+        """
+        Generate n_rows in parallel chunks
+        CSV paths ending in .csv become one file; other paths become a directory of parts
+        """
+        if self.model is None:
+            raise ValueError("No model fitted. Call fit() or load_model() first.")
+
+        fmt = fmt or ('parquet' if output_path.endswith('.parquet') else 'csv')
+        single_file = fmt == 'csv' and output_path.endswith('.csv')
+        workers = workers or os.cpu_count() or 1
+
+        parts_dir = f"{output_path}.parts" if single_file else output_path
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        os.makedirs(parts_dir)
+
+        n_chunks = max(int(np.ceil(n_rows / chunk_rows)), 1)
+        seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+        tasks = []
+        for i in range(n_chunks):
+            rows = min(chunk_rows, n_rows - i * chunk_rows)
+            part_path = os.path.join(parts_dir, f"part-{i:05d}.{fmt}")
+            # Only the first CSV part carries a header when parts are concatenated
+            header = not single_file or i == 0
+            tasks.append((self.model, self.dirty_rates, rows, seeds[i], part_path, fmt, header))
+
+        print(f"\nGenerating {n_rows:,} trips → {output_path} "
+              f"({n_chunks} chunks, {workers} processes, {fmt})")
+        start = time.perf_counter()
+        if workers > 1 and n_chunks > 1:
+            with Pool(workers) as pool:
+                for _ in pool.imap_unordered(_write_chunk, tasks):
+                    pass
+        else:
+            for task in tasks:
+                _write_chunk(task)
+
+        if single_file:
+            with open(output_path, 'wb') as out:
+                for i in range(n_chunks):
+                    with open(os.path.join(parts_dir, f"part-{i:05d}.csv"), 'rb') as part:
+                        shutil.copyfileobj(part, out, 16 * 1024 * 1024)
+            shutil.rmtree(parts_dir)
+
+        elapsed = time.perf_counter() - start
+        print(f"✓ Generated {n_rows:,} rows in {elapsed:.1f}s ({n_rows / elapsed:,.0f} rows/s)")
+        return output_path
+
+
+def _inverse_cdf(rng, quantiles, size):
+    """Sample from an empirical distribution given its evenly spaced quantiles"""
+    quantiles = np.asarray(quantiles)
+    return np.interp(rng.random(size), np.linspace(0, 1, len(quantiles)), quantiles)
+
+
+def _choice(rng, distribution, size):
+    return np.asarray(distribution['values'])[
+        rng.choice(len(distribution['values']), size, p=_normalized(distribution['probs']))]
+
+
+def _normalized(probs):
+    probs = np.asarray(probs, dtype=float)
+    return probs / probs.sum()
+
+
+def _sample_points(rng, clusters, size):
+    cluster = rng.choice(len(clusters['weights']), size, p=_normalized(clusters['weights']))
+    centers, spreads = np.asarray(clusters['centers']), np.asarray(clusters['spreads'])
+    points = centers[cluster] + rng.standard_normal((size, 2)) * spreads[cluster]
+    return points[:, 0], points[:, 1]
+
+
+def _generate_frame(model, dirty_rates, n, rng):
+    """Vectorized sampling of one chunk of raw trips"""
+    # Pickup time: days weighted by their weekday's demand, then hour given weekday
+    dow_hour = np.asarray(model['dow_hour_weights'])
+    start = np.datetime64(model['date_start'], 's')
+    start_dow = (start.astype('datetime64[D]').astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    day_dow = (start_dow + np.arange(model['date_days'])) % 7
+    day_weights = dow_hour.sum(1)[day_dow] / np.bincount(day_dow, minlength=7)[day_dow]
+    day = rng.choice(model['date_days'], n, p=_normalized(day_weights))
+
+    hour_cdf = np.cumsum(dow_hour / dow_hour.sum(1, keepdims=True), axis=1)
+    hour = np.minimum((hour_cdf[day_dow[day]] < rng.random(n)[:, None]).sum(1), 23)
+    pickup_seconds = day * 86400 + hour * 3600 + rng.integers(0, 3600, n)
+
+    # Distance, duration (via speed) and fare
+    distance = np.round(np.exp(_inverse_cdf(rng, model['log_distance_quantiles'], n)), 2)
+    speed = _inverse_cdf(rng, model['speed_quantiles'], n)
+    duration_seconds = np.maximum(distance / speed * 3600, 60).astype(np.int64)
+
+    intercept, slope = model['fare_fit']
+    fare = intercept + slope * distance + _inverse_cdf(rng, model['fare_residual_quantiles'], n)
+    fare = np.round(np.maximum(fare, 2.5) * 2) / 2  # meter ticks in $0.50 steps
+
+    columns = {c: _choice(rng, model['categorical'][c], n) for c in CATEGORICAL_COLUMNS}
+
+    # Tips: per-payment tip probability, tip percentage from the fitted quantiles
+    tip_rate = np.zeros(n)
+    for payment, rate in model['tip_rate_by_payment'].items():
+        tip_rate[columns['payment_type'] == int(payment)] = rate
+    tipped = rng.random(n) < tip_rate
+    tip = np.where(tipped, np.round(fare * _inverse_cdf(rng, model['tip_pct_quantiles'], n), 2), 0.0)
+
+    tolls = np.zeros(n)
+    has_toll = rng.random(n) < model['toll_rate']
+    if has_toll.any() and model['toll_values']['values']:
+        tolls[has_toll] = _choice(rng, model['toll_values'], int(has_toll.sum()))
+
+    pickup_lat, pickup_lon = np.round(_sample_points(rng, model['pickup_clusters'], n), 6)
+    dropoff_lat, dropoff_lon = np.round(_sample_points(rng, model['dropoff_clusters'], n), 6)
+
+    passenger_count = columns['passenger_count'].astype(float)
+    dropoff_seconds = pickup_seconds + duration_seconds
+
+    # Dirty data, matching what the cleaning step is expected to catch
+    rates = dirty_rates or {}
+    passenger_count[rng.random(n) < rates.get('missing_passenger_count', 0)] = np.nan
+    distance[rng.random(n) < rates.get('zero_distance', 0)] = 0.0
+    fare = np.where(rng.random(n) < rates.get('negative_fare', 0), -fare, fare)
+    bad_time = rng.random(n) < rates.get('invalid_timestamps', 0)
+    dropoff_seconds[bad_time] = pickup_seconds[bad_time] - duration_seconds[bad_time]
+    zero_coords = rng.random(n) < rates.get('zero_coordinates', 0)
+    pickup_lat[zero_coords] = pickup_lon[zero_coords] = 0.0
+
+    total = np.round(fare + columns['extra'] + columns['mta_tax'] + tip + tolls +
+                     columns['improvement_surcharge'], 2)
+
+    return pd.DataFrame({
+        'VendorID': columns['VendorID'],
+        'tpep_pickup_datetime': start + pickup_seconds,
+        'tpep_dropoff_datetime': start + dropoff_seconds,
+        'passenger_count': passenger_count,
+        'trip_distance': distance,
+        'pickup_longitude': pickup_lon,
+        'pickup_latitude': pickup_lat,
+        'RateCodeID': columns['RateCodeID'],
+        'store_and_fwd_flag': columns['store_and_fwd_flag'],
+        'dropoff_longitude': dropoff_lon,
+        'dropoff_latitude': dropoff_lat,
+        'payment_type': columns['payment_type'],
+        'fare_amount': fare,
+        'extra': columns['extra'],
+        'mta_tax': columns['mta_tax'],
+        'tip_amount': tip,
+        'tolls_amount': tolls,
+        'improvement_surcharge': columns['improvement_surcharge'],
+        'total_amount': total,
+    })
+
+
+def _write_chunk(task):
+    """Worker: generate one chunk and write it as a CSV or Parquet part"""
+    model, dirty_rates, rows, seed, path, fmt, header = task
+    df = _generate_frame(model, dirty_rates, rows, np.random.default_rng(seed))
+
+    if fmt == 'parquet':
+        # Same string timestamps as the CSV source so RAW_TRIP_SCHEMA readers work unchanged
+        for column in ('tpep_pickup_datetime', 'tpep_dropoff_datetime'):
+            df[column] = df[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+        df.to_parquet(path, index=False)
+    elif PYARROW_AVAILABLE:
+        # Arrow quotes header names, so write the header line ourselves
+        with open(path, 'wb') as f:
+            if header:
+                f.write((','.join(df.columns) + '\n').encode())
+            pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), f,
+                             pa_csv.WriteOptions(include_header=False, quoting_style='none'))
+    else:
+        df.to_csv(path, index=False, header=header, date_format='%Y-%m-%d %H:%M:%S')
+    return rows
+
+
+# USAGE EXAMPLE
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic yellow_tripdata trips")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--output', default='synthetic_tripdata.csv')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default=None)
+    parser.add_argument('--sample', default='cleaned_taxi_data_10k.csv')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--clean', action='store_true', help="Disable dirty-data injection")
+    args = parser.parse_args()
+
+    generator = SyntheticTripGenerator(dirty_rates={} if args.clean else None)
+    generator.fit(args.sample)
+    generator.write(args.rows, args.output, fmt=args.format, workers=args.workers, seed=args.seed)
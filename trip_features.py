@@ -0,0 +1,71 @@
+"""
+Shared Trip Feature Engineering
+One vectorized implementation of the derived trip features, used by the pandas
+pipeline (MobilityDataAnalyzer) and by Spark as a mapInPandas stage over Arrow batches
+"""
+
+import numpy as np
+import pandas as pd
+from zone_lookup import lookup_zones
+
+PEAK_HOURS = [7, 8, 9, 17, 18, 19]
+
+DAY_NAMES = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
+                     dtype=object)
+MONTH_NAMES = np.array(['January', 'February', 'March', 'April', 'May', 'June', 'July',
+                        'August', 'September', 'October', 'November', 'December'], dtype=object)
+
+# Derived columns in output order (zones are optional: Spark joins them instead)
+FEATURE_COLUMNS = [
+    'hour_of_day', 'day_of_week', 'day_name', 'month', 'month_name', 'quarter', 'year', 'date',
+    'trip_duration_min', 'tip_percentage', 'revenue_per_mile', 'is_peak_hour', 'is_weekend',
+    'time_of_day'
+]
+ZONE_COLUMNS = ['pickup_zone', 'dropoff_zone']
+
+
+def add_trip_features(df, include_zones=True):
+    """Add time, revenue, indicator and zone features to a batch of cleaned trips"""
+    df = df.copy()
+    pickup = pd.to_datetime(df['tpep_pickup_datetime'])
+    dropoff = pd.to_datetime(df['tpep_dropoff_datetime'])
+
+    # Time-based features (0=Monday, 6=Sunday)
+    hour = pickup.dt.hour.to_numpy()
+    day_of_week = pickup.dt.dayofweek.to_numpy()
+    month = pickup.dt.month.to_numpy()
+
+    df['hour_of_day'] = hour
+    df['day_of_week'] = day_of_week
+    df['day_name'] = DAY_NAMES[day_of_week]
+    df['month'] = month
+    df['month_name'] = MONTH_NAMES[month - 1]
+    df['quarter'] = (month - 1) // 3 + 1
+    df['year'] = pickup.dt.year.to_numpy()
+    df['date'] = pickup.dt.date
+
+    # Analytical features
+    df['trip_duration_min'] = (dropoff - pickup).dt.total_seconds().to_numpy() / 60
+    df['tip_percentage'] = (df['tip_amount'] / df['fare_amount'] * 100).round(2).clip(0, 100)
+    df['revenue_per_mile'] = (df['total_amount'] / df['trip_distance']).round(2)
+
+    # Indicator features
+    df['is_peak_hour'] = np.isin(hour, PEAK_HOURS).astype(int)
+    df['is_weekend'] = (day_of_week >= 5).astype(int)
+    df['time_of_day'] = np.select(
+        [(hour >= 6) & (hour < 12), (hour >= 12) & (hour < 17), (hour >= 17) & (hour < 21)],
+        ['Morning', 'Afternoon', 'Evening'],
+        default='Night'
+    ).astype(object)
+
+    if include_zones:
+        df['pickup_zone'] = lookup_zones(df['pickup_latitude'], df['pickup_longitude'])
+        df['dropoff_zone'] = lookup_zones(df['dropoff_latitude'], df['dropoff_longitude'])
+
+    return df
+
+
+def add_trip_features_batches(batches):
+    """mapInPandas entry point: features per Arrow batch, zones left to the Spark join"""
+    for batch in batches:
+        yield add_trip_features(batch, include_zones=False)
@@ -0,0 +1,102 @@
+"""
+NYC Zone Dimension
+Gridded lookup table mapping discretized lat/long cells to named zones,
+shared by the pandas pipeline (NumPy array lookup) and Spark (broadcast join)
+"""
+
+import numpy as np
+
+# Grid covering the five boroughs and the three airports
+GRID_LAT_MIN, GRID_LAT_MAX = 40.49, 40.92
+GRID_LON_MIN, GRID_LON_MAX = -74.27, -73.68
+GRID_CELL_DEG = 0.005  # ~550m x 420m cells
+
+N_LAT_CELLS = int(round((GRID_LAT_MAX - GRID_LAT_MIN) / GRID_CELL_DEG))
+N_LON_CELLS = int(round((GRID_LON_MAX - GRID_LON_MIN) / GRID_CELL_DEG))
+
+# Zone id 0 is the fallback for cells outside every zone and for invalid coordinates
+ZONE_NAMES = [
+    'Other',
+    'Staten Island',
+    'Brooklyn',
+    'Queens',
+    'Bronx',
+    'Lower Manhattan',
+    'Midtown',
+    'Upper Manhattan',
+    'Harlem & Washington Heights',
+    'LaGuardia Airport',
+    'JFK Airport',
+    'Newark Airport',
+]
+
+# (zone, lat_min, lat_max, lon_min, lon_max); painted in order, later boxes win.
+# Queens' box reaches west over Brooklyn (it must cover Astoria and the
+# Rockaways), so Brooklyn is painted after it and keeps the overlap
+ZONE_BOXES = [
+    ('Staten Island', 40.49, 40.65, -74.26, -74.05),
+    ('Queens', 40.54, 40.80, -73.96, -73.70),
+    ('Brooklyn', 40.57, 40.74, -74.05, -73.86),
+    ('Bronx', 40.80, 40.92, -73.93, -73.76),
+    ('Lower Manhattan', 40.70, 40.75, -74.02, -73.97),
+    ('Midtown', 40.75, 40.78, -74.01, -73.955),
+    ('Upper Manhattan', 40.78, 40.80, -73.99, -73.93),
+    ('Harlem & Washington Heights', 40.80, 40.88, -73.97, -73.91),
+    ('LaGuardia Airport', 40.76, 40.79, -73.89, -73.855),
+    ('JFK Airport', 40.62, 40.67, -73.83, -73.74),
+    ('Newark Airport', 40.67, 40.71, -74.19, -74.15),
+]
+
+_zone_grid = None
+
+
+def build_zone_grid():
+    """Zone id for every grid cell, shape (N_LAT_CELLS, N_LON_CELLS)"""
+    global _zone_grid
+    if _zone_grid is None:
+        lat_centers = GRID_LAT_MIN + (np.arange(N_LAT_CELLS) + 0.5) * GRID_CELL_DEG
+        lon_centers = GRID_LON_MIN + (np.arange(N_LON_CELLS) + 0.5) * GRID_CELL_DEG
+        lat_grid, lon_grid = np.meshgrid(lat_centers, lon_centers, indexing='ij')
+
+        grid = np.zeros((N_LAT_CELLS, N_LON_CELLS), dtype=np.int8)
+        for zone, lat_min, lat_max, lon_min, lon_max in ZONE_BOXES:
+            inside = (lat_grid >= lat_min) & (lat_grid < lat_max) & \
+                     (lon_grid >= lon_min) & (lon_grid < lon_max)
+            grid[inside] = ZONE_NAMES.index(zone)
+        _zone_grid = grid
+    return _zone_grid
+
+
+def cell_ids(latitude, longitude):
+    """Flattened grid cell id per point (-1 outside the grid or missing)"""
+    lat = np.asarray(latitude, dtype=np.float64)
+    lon = np.asarray(longitude, dtype=np.float64)
+
+    # Same arithmetic as the Spark expression so both engines agree on boundaries
+    lat_idx = np.floor((lat - GRID_LAT_MIN) / GRID_CELL_DEG)
+    lon_idx = np.floor((lon - GRID_LON_MIN) / GRID_CELL_DEG)
+    valid = (lat_idx >= 0) & (lat_idx < N_LAT_CELLS) & (lon_idx >= 0) & (lon_idx < N_LON_CELLS)
+
+    cells = np.full(lat.shape, -1, dtype=np.int64)
+    cells[valid] = lat_idx[valid].astype(np.int64) * N_LON_CELLS + lon_idx[valid].astype(np.int64)
+    return cells
+
+
+def lookup_zone_ids(latitude, longitude):
+    """Zone id per point via a single array index (O(1) per row)"""
+    cells = cell_ids(latitude, longitude)
+    flat_grid = build_zone_grid().ravel()
+    return np.where(cells >= 0, flat_grid[np.clip(cells, 0, None)], 0).astype(np.int8)
+
+
+def lookup_zones(latitude, longitude):
+    """Zone name per point"""
+    return np.asarray(ZONE_NAMES, dtype=object)[lookup_zone_ids(latitude, longitude)]
+
+
+def zone_dimension_rows():
+    """(cell_id, zone) rows for every cell inside a named zone (the rest map to 'Other')"""
+    flat_grid = build_zone_grid().ravel()
+    named = np.nonzero(flat_grid)[0]
+    return [(int(cell), ZONE_NAMES[flat_grid[cell]]) for cell in named]
+